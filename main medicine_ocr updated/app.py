@@ -1,18 +1,50 @@
-from flask import Flask, request, render_template, jsonify, redirect, url_for, session, flash
-from google.cloud import vision
-import re, os
+from flask import Flask, request, render_template, jsonify, redirect, url_for, session, flash, Response, stream_with_context
+import re, os, sys, shutil
+from pathlib import Path
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import object_session
+from sqlalchemy.schema import CreateIndex
+import sqlite3
+from datetime import date, datetime, timedelta
+import calendar
 import io
-from google.cloud.vision_v1 import types
 import logging
+import functools
+import threading
+import queue
+import time
+import random
+import tempfile
+import subprocess
+import contextlib
+import importlib.util
 import base64
 import json
+import traceback
+import difflib
+from bisect import bisect_right
+import hashlib
+import secrets
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed, wait, FIRST_COMPLETED
+from PIL import Image, ImageEnhance, ImageFilter
+import numpy as np
+try:
+    import cv2
+except ImportError:
+    cv2 = None
 
-# Set up logging first
-logging.basicConfig(level=logging.INFO)
+# Set up logging first; LOG_LEVEL=DEBUG brings back the per-step upload/OCR logs
+# getLevelName maps a known name to its number and returns a string for anything else
+LOG_LEVEL = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+logging.basicConfig(level=LOG_LEVEL if isinstance(LOG_LEVEL, int) else logging.INFO)
 logger = logging.getLogger(__name__)
+if not isinstance(LOG_LEVEL, int):
+    logger.warning(f"Unknown LOG_LEVEL {os.environ['LOG_LEVEL']!r}, logging at INFO")
 
 # API Key Configuration
 # Set your Gemini API key as environment variable: 
@@ -23,210 +55,424 @@ logger = logging.getLogger(__name__)
 # Get a FREE API key from: https://aistudio.google.com/app/apikey
 GEMINI_API_KEY_FALLBACK = ""  # Leave empty - set via environment variable
 
-# Try to import AI libraries
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+# Check which AI libraries are installed without importing them; the SDKs are
+# heavy (gRPC/protobuf) so they are only imported on first use via the getters below
+GEMINI_AVAILABLE = importlib.util.find_spec('google.generativeai') is not None
+if not GEMINI_AVAILABLE:
     logger.warning("google-generativeai not available. Install with: pip install google-generativeai")
 
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+OPENAI_AVAILABLE = importlib.util.find_spec('openai') is not None
+if not OPENAI_AVAILABLE:
     logger.warning("openai not available. Install with: pip install openai")
 
-# Try to import Tesseract OCR (FREE - no API key needed!)
+# Optional: rapidfuzz does the fuzzy medicine-name matching in C; difflib is used without it
+RAPIDFUZZ_AVAILABLE = importlib.util.find_spec('rapidfuzz') is not None
+
+# Keep each tesseract process single-threaded; OpenMP inside tesseract fights
+# with the parallel passes on OCR_POOL and is slower overall
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+def find_tesseract_binary():
+    """Path of the tesseract executable: PATH first, then this platform's usual install locations"""
+    if sys.platform == 'win32':
+        tesseract_paths = [
+            r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+            r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
+            r'C:\Tesseract-OCR\tesseract.exe',
+            r'C:\Users\Public\Tesseract-OCR\tesseract.exe',
+            os.path.expanduser(r'~\AppData\Local\Tesseract-OCR\tesseract.exe'),
+            os.path.expanduser(r'~\Tesseract-OCR\tesseract.exe'),
+        ]
+    else:
+        tesseract_paths = [
+            '/usr/bin/tesseract',
+            '/usr/local/bin/tesseract',
+            '/opt/homebrew/bin/tesseract',
+        ]
+    return shutil.which('tesseract') or next((p for p in tesseract_paths if os.path.exists(p)), None)
+
+
+# Check for Tesseract OCR (FREE - no API key needed!)
 TESSERACT_AVAILABLE = False
 TESSERACT_PATH = None
-try:
-    import pytesseract
-    from PIL import Image as PILImage
-    # Set Tesseract path for Windows - check multiple locations
-    tesseract_paths = [
-        r'C:\Program Files\Tesseract-OCR\tesseract.exe',
-        r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe',
-        r'C:\Tesseract-OCR\tesseract.exe',
-        r'C:\Users\Public\Tesseract-OCR\tesseract.exe',
-        os.path.expanduser(r'~\AppData\Local\Tesseract-OCR\tesseract.exe'),
-        os.path.expanduser(r'~\Tesseract-OCR\tesseract.exe'),
-        # Linux/Mac paths
-        '/usr/bin/tesseract',
-        '/usr/local/bin/tesseract',
-        '/opt/homebrew/bin/tesseract',
-    ]
-    for path in tesseract_paths:
-        if os.path.exists(path):
-            pytesseract.pytesseract.tesseract_cmd = path
-            TESSERACT_PATH = path
-            TESSERACT_AVAILABLE = True
-            print(f"[STARTUP] ✅ Tesseract found at: {path}")
-            logger.info(f"Tesseract OCR found at: {path}")
-            break
+# Optional: tesserocr binds libtesseract in-process, avoiding a subprocess and model load per call
+TESSEROCR_AVAILABLE = importlib.util.find_spec('tesserocr') is not None
+if importlib.util.find_spec('pytesseract') is not None:
+    TESSERACT_PATH = find_tesseract_binary()
+    if TESSERACT_PATH:
+        TESSERACT_AVAILABLE = True
+        print(f"[STARTUP] ✅ Tesseract found at: {TESSERACT_PATH}")
+        logger.info(f"Tesseract OCR found at: {TESSERACT_PATH}")
     
-    # Also try without explicit path (if tesseract is in PATH)
-    if not TESSERACT_AVAILABLE:
-        try:
-            # Test if tesseract works without explicit path
-            pytesseract.get_tesseract_version()
-            TESSERACT_AVAILABLE = True
-            TESSERACT_PATH = "tesseract (in PATH)"
-            print("[STARTUP] ✅ Tesseract found in system PATH")
-            logger.info("Tesseract OCR found in system PATH")
-        except Exception:
-            pass
+    if not TESSERACT_AVAILABLE and TESSEROCR_AVAILABLE:
+        TESSERACT_AVAILABLE = True
+        print("[STARTUP] ✅ Tesseract binary not found, using tesserocr (libtesseract)")
+        logger.info("Tesseract binary not found, using tesserocr")
     
     if not TESSERACT_AVAILABLE:
         print("[STARTUP] ❌ Tesseract NOT found!")
         print("[STARTUP] Please install Tesseract OCR (FREE):")
         print("[STARTUP] Download from: https://github.com/UB-Mannheim/tesseract/wiki")
-        logger.warning("pytesseract imported but tesseract.exe not found")
-except ImportError as e:
-    print(f"[STARTUP] ❌ pytesseract import failed: {e}")
+        logger.warning("pytesseract installed but tesseract.exe not found")
+elif TESSEROCR_AVAILABLE:
+    TESSERACT_AVAILABLE = True
+    logger.info("pytesseract not installed, using tesserocr")
+else:
+    print("[STARTUP] ❌ pytesseract not installed")
     print("[STARTUP] Run: pip install pytesseract")
-    logger.warning(f"pytesseract not available: {e}")
+    logger.warning("pytesseract not available")
+
+
+@functools.lru_cache(maxsize=1)
+def get_genai():
+    """Import google.generativeai on first use"""
+    import google.generativeai as genai
+    return genai
+
+
+# Fast models used for label OCR and field extraction, in order of preference
+GEMINI_FAST_MODELS = ('models/gemini-2.0-flash', 'models/gemini-2.5-flash')
+
+# Outermost {...} in a model reply that wraps its JSON in prose
+JSON_OBJECT_RE = re.compile(r"\{[\s\S]*\}")
+
+
+def first_json_array(text):
+    """First balanced [...] in a model reply that wraps its JSON array in prose, or None.
+    One linear pass; brackets inside JSON strings don't count."""
+    depth = 0
+    start = -1
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"' and depth:
+            in_string = True
+        elif ch == '[':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == ']' and depth:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+# genai.configure() is process-global, and lru_cache alone lets simultaneous first
+# requests all run the slow init; the Gemini model getters take this lock around the cache
+GEMINI_INIT_LOCK = threading.Lock()
+
+# The model get_gemini_listed_model picks is persisted in GEMINI_MODEL_CACHE (under the app's
+# instance folder) so a restarted worker skips list_models; re-probed once the file is older
+# than GEMINI_MODEL_CACHE_TTL seconds
+GEMINI_MODEL_CACHE_TTL = 24 * 3600
+
+
+def api_key_digest(api_key):
+    """Short hash identifying an API key in caches without storing the key itself"""
+    return hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
+
+
+def locked(lock):
+    """Decorator: call the wrapped function while holding `lock`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with lock:
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@locked(GEMINI_INIT_LOCK)
+@functools.lru_cache(maxsize=4)
+def get_gemini_model(api_key):
+    """Configure Gemini for api_key once and return the first fast model that initializes, or None"""
+    genai = get_genai()
+    genai.configure(api_key=api_key)
+    for name in GEMINI_FAST_MODELS:
+        try:
+            return genai.GenerativeModel(name)
+        except Exception as me:
+            logger.warning(f"Gemini: could not init {name}: {me}")
+    return None
+
+
+@locked(GEMINI_INIT_LOCK)
+@functools.lru_cache(maxsize=4)
+def get_gemini_listed_model(api_key):
+    """Pick the prescription model from list_models() once per API key.
+    Raises when nothing initializes, so failures are retried on the next call."""
+    genai = get_genai()
+    genai.configure(api_key=api_key)
+    # The cache file records which key it was probed for, without storing the key itself
+    key_digest = api_key_digest(api_key)
+    try:
+        if time.time() - GEMINI_MODEL_CACHE.stat().st_mtime < GEMINI_MODEL_CACHE_TTL:
+            cached = json.loads(GEMINI_MODEL_CACHE.read_text())
+            if cached.get('key') == key_digest:
+                logger.info(f"Using cached Gemini model: {cached['name']}")
+                return genai.GenerativeModel(cached['name'])
+    except Exception as e:
+        logger.info(f"Gemini model cache not used: {e}")
+    
+    # Try to find available models - prioritize newer models
+    model = None
+    
+    # First, try to see what models are available
+    try:
+        available_models = [m.name for m in genai.list_models()]
+        logger.info(f"Available models: {available_models[:10]}")
+    
+        # Prioritize flash models (faster) and stable versions
+        preferred_models = [
+            'models/gemini-2.0-flash',
+            'models/gemini-2.5-flash',
+            'models/gemini-2.5-pro',
+            'models/gemini-2.0-flash-001',
+        ]
+    
+        # Try preferred models first
+        for preferred in preferred_models:
+            if preferred in available_models:
+                try:
+                    model = genai.GenerativeModel(preferred)
+                    logger.info(f"Successfully initialized preferred model: {preferred}")
+                    break
+                except Exception as e:
+                    logger.warning(f"Failed to initialize {preferred}: {str(e)}")
+                    continue
+    
+        # If preferred didn't work, try any gemini model
+        if model is None:
+            for available_model in available_models:
+                if 'gemini' in available_model.lower() and 'embedding' not in available_model.lower():
+                    try:
+                        model = genai.GenerativeModel(available_model)
+                        logger.info(f"Successfully initialized model: {available_model}")
+                        break
+                    except Exception as e:
+                        logger.warning(f"Failed to initialize {available_model}: {str(e)}")
+                        continue
+    except Exception as list_error:
+        logger.warning(f"Could not list models: {str(list_error)}")
+        # Fallback to known working models
+        fallback_models = ['models/gemini-2.0-flash', 'models/gemini-2.5-flash']
+        for fallback in fallback_models:
+            try:
+                model = genai.GenerativeModel(fallback)
+                logger.info(f"Successfully initialized fallback model: {fallback}")
+                break
+            except Exception:
+                continue
+    
+    if model is None:
+        raise Exception("Could not initialize any Gemini model. Please check your API key has access to Gemini models.")
+    try:
+        GEMINI_MODEL_CACHE.write_text(json.dumps({'key': key_digest, 'name': model.model_name}))
+    except OSError as e:
+        logger.warning(f"Could not save Gemini model cache: {e}")
+    return model
+
+
+@functools.lru_cache(maxsize=1)
+def get_openai():
+    """Import openai on first use"""
+    import openai
+    return openai
+
+
+@functools.lru_cache(maxsize=1)
+def get_rapidfuzz():
+    """Import rapidfuzz's fuzz and process modules on first use"""
+    from rapidfuzz import fuzz, process
+    return fuzz, process
+
+
+@functools.lru_cache(maxsize=1)
+def get_pytesseract():
+    """Import pytesseract on first use and point it at the detected binary"""
+    import pytesseract
+    if TESSERACT_PATH:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+    return pytesseract
+
+
+@functools.lru_cache(maxsize=1)
+def get_vision():
+    """Import google.cloud.vision on first use"""
+    from google.cloud import vision
+    return vision
+
+# Tesseract runs as a subprocess per call, so independent OCR passes can run in parallel threads
+# Capped at 4: each concurrent pass checks out its own tesserocr API with the eng model loaded
+OCR_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix='ocr')
+
+# Network-bound AI calls (Gemini) that /index overlaps with local OCR; kept off OCR_POOL
+# so a slow API reply never holds up a Tesseract pass
+API_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='api')
+
+# Background prescription jobs (/api/prescription_jobs). Separate pool because a job itself
+# waits on API_POOL/OCR_POOL; threads rather than processes so jobs share the OCR caches
+JOB_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='job')
+
+# Bounded exponential backoff for transient AI API errors (rate limits, timeouts, 5xx):
+# waits ~1s, 2s, 4s (+ up to 1s jitter, capped at 16s) before giving up after 4 attempts
+API_RETRY_ATTEMPTS = 4
+API_RETRY_INITIAL_DELAY = 1
+API_RETRY_MAX_DELAY = 16
+
+
+@functools.lru_cache(maxsize=1)
+def get_transient_api_errors():
+    """Exception types worth retrying; auth/permission errors are deliberately not included"""
+    errors = []
+    if importlib.util.find_spec('google.api_core') is not None:
+        from google.api_core import exceptions as google_exceptions
+        errors += [google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable,
+                   google_exceptions.DeadlineExceeded, google_exceptions.InternalServerError]
+    if OPENAI_AVAILABLE:
+        openai = get_openai()
+        errors += [openai.RateLimitError, openai.APITimeoutError, openai.InternalServerError]
+    return tuple(errors)
+
+
+def call_with_backoff(func, *args, **kwargs):
+    """Call func, retrying transient API errors with exponential backoff and jitter"""
+    transient_errors = get_transient_api_errors()
+    for attempt in range(API_RETRY_ATTEMPTS):
+        try:
+            return func(*args, **kwargs)
+        except transient_errors as e:
+            if attempt == API_RETRY_ATTEMPTS - 1:
+                raise
+            delay = min(API_RETRY_MAX_DELAY, API_RETRY_INITIAL_DELAY * 2 ** attempt + random.uniform(0, 1))
+            logger.warning(f"Transient API error ({type(e).__name__}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
 
 # ─── App & DB Setup ───────────────────────────────────────────────────────────
+BASE_DIR = Path(__file__).resolve().parent
+
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///medicine.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///medicine.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.secret_key = 'supersecretkey'  # Needed for session management
+app.secret_key = os.environ.get('SECRET_KEY', 'supersecretkey')  # Needed for session management
 
+# Uploaded images are read into memory and OCR'd directly; nothing is written here
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Reject oversized uploads while the request body is read, before OCR buffers it
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Private to this app instance, unlike a fixed name in the shared temp directory
+os.makedirs(app.instance_path, exist_ok=True)
+GEMINI_MODEL_CACHE = Path(app.instance_path) / 'gemini_model.json'
+
 db = SQLAlchemy(app)
 
-# Initialize Google Vision client with error handling
-try:
-    credentials_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vision-key.json')
-    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
-    logger.info(f"Setting GOOGLE_APPLICATION_CREDENTIALS to: {credentials_path}")
-    
-    if not os.path.exists(credentials_path):
-        raise FileNotFoundError(f"Credentials file not found at: {credentials_path}")
-        
-    global_vision_client = vision.ImageAnnotatorClient()
-    logger.info("Successfully initialized Google Cloud Vision client")
-except Exception as e:
-    logger.error(f"Failed to initialize Google Cloud Vision client: {str(e)}")
-    raise
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Use WAL and lighter fsync settings for every SQLite connection"""
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-20000")  # ~20MB page cache
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
+    cursor.close()
+
+
+# Google Vision client is created on the first OCR request, not at import
+credentials_path = str(BASE_DIR / 'vision-key.json')
+os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
+logger.info(f"Setting GOOGLE_APPLICATION_CREDENTIALS to: {credentials_path}")
+
+
+@functools.lru_cache(maxsize=1)
+def get_vision_client():
+    """Create the Google Cloud Vision client on first use"""
+    try:
+        if not os.path.exists(credentials_path):
+            raise FileNotFoundError(f"Credentials file not found at: {credentials_path}")
+        client = get_vision().ImageAnnotatorClient()
+        logger.info("Successfully initialized Google Cloud Vision client")
+        return client
+    except Exception as e:
+        logger.error(f"Failed to initialize Google Cloud Vision client: {str(e)}")
+        raise
 
 class Medicine(db.Model):
+    __table_args__ = (db.Index('ix_med_name_exp', 'medicine_name', 'expiry_date'),)
+
     batch_id = db.Column(db.Integer, primary_key=True)
     medicine_name = db.Column(db.String(100), nullable=False)
-    brand = db.Column(db.String(100), nullable=False)
+    brand = db.Column(db.String(100), nullable=False, index=True)
     category = db.Column(db.String(100), nullable=False)
     batch_number = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price_per_unit = db.Column(db.Float, nullable=False)
     manufacture_date = db.Column(db.Date, nullable=False)
-    expiry_date = db.Column(db.Date, nullable=False)
+    expiry_date = db.Column(db.Date, nullable=False, index=True)
+
+# Lets case-insensitive name lookups (lower(name) == ...) be an index probe instead of a scan
+db.Index('ix_med_name_lower', db.func.lower(Medicine.medicine_name))
 
 class MedicineEnquiry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     medicine_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    enquiry_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    enquiry_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     user_name = db.Column(db.String(100), nullable=False)
 
-# Initial medicine data
-initial_medicine_data = [
-    {"batch_id": 1, "medicine_name": "Augmentin", "brand": "GSK", "category": "Tablet", "batch_number": "AUG-GSK-2026", "quantity": 120, "price_per_unit": 32.00, "manufacture_date": "2024-02-15", "expiry_date": "2026-02-15"},
-    {"batch_id": 2, "medicine_name": "Avil", "brand": "Sanofi", "category": "Tablet", "batch_number": "AVIL-SAN-2026", "quantity": 90, "price_per_unit": 5.00, "manufacture_date": "2023-12-10", "expiry_date": "2026-12-10"},
-    {"batch_id": 3, "medicine_name": "Benadryl", "brand": "J&J", "category": "Syrup", "batch_number": "BENA-JJ-2026", "quantity": 60, "price_per_unit": 75.00, "manufacture_date": "2024-04-20", "expiry_date": "2026-04-20"},
-    {"batch_id": 4, "medicine_name": "Brufen", "brand": "Abbott", "category": "Tablet", "batch_number": "BRUF-ABB-2026", "quantity": 85, "price_per_unit": 20.00, "manufacture_date": "2024-03-12", "expiry_date": "2026-03-12"},
-    {"batch_id": 5, "medicine_name": "Brufen", "brand": "Abbott", "category": "Tablet", "batch_number": "BRUF-ABB-2028", "quantity": 60, "price_per_unit": 20.00, "manufacture_date": "2025-06-18", "expiry_date": "2028-06-18"},
-    {"batch_id": 6, "medicine_name": "Calpol", "brand": "GSK", "category": "Tablet", "batch_number": "CALP-GSK-2026", "quantity": 100, "price_per_unit": 18.00, "manufacture_date": "2024-06-15", "expiry_date": "2026-06-15"},
-    {"batch_id": 7, "medicine_name": "Calpol", "brand": "GSK", "category": "Tablet", "batch_number": "CALP-GSK-2027", "quantity": 80, "price_per_unit": 18.00, "manufacture_date": "2025-03-01", "expiry_date": "2027-03-01"},
-    {"batch_id": 8, "medicine_name": "Cetrizine", "brand": "Cipla", "category": "Tablet", "batch_number": "CET-CIP-2026", "quantity": 110, "price_per_unit": 3.00, "manufacture_date": "2024-01-22", "expiry_date": "2026-01-22"},
-    {"batch_id": 9, "medicine_name": "Combiflam", "brand": "Sanofi", "category": "Tablet", "batch_number": "COMB-SAN-2026", "quantity": 150, "price_per_unit": 10.00, "manufacture_date": "2023-03-22", "expiry_date": "2026-03-22"},
-    {"batch_id": 10, "medicine_name": "Combiflam", "brand": "Sanofi", "category": "Tablet", "batch_number": "COMB-SAN-2027", "quantity": 120, "price_per_unit": 10.00, "manufacture_date": "2024-02-10", "expiry_date": "2027-02-10"},
-    {"batch_id": 11, "medicine_name": "Dolo 650", "brand": "Micro Labs", "category": "Tablet", "batch_number": "DL650-2038", "quantity": 100, "price_per_unit": 25.00, "manufacture_date": "2023-06-27", "expiry_date": "2038-06-27"},
-    {"batch_id": 12, "medicine_name": "Dolo 650", "brand": "Micro Labs", "category": "Tablet", "batch_number": "DL650-2027", "quantity": 75, "price_per_unit": 25.00, "manufacture_date": "2022-07-23", "expiry_date": "2027-07-23"},
-    {"batch_id": 13, "medicine_name": "Domstal", "brand": "Torrent", "category": "Tablet", "batch_number": "DOMS-TOR-2027", "quantity": 130, "price_per_unit": 17.00, "manufacture_date": "2024-01-10", "expiry_date": "2027-01-10"},
-    {"batch_id": 14, "medicine_name": "Domstal", "brand": "Torrent", "category": "Tablet", "batch_number": "DOMS-TOR-2026", "quantity": 110, "price_per_unit": 17.00, "manufacture_date": "2023-06-20", "expiry_date": "2026-06-20"},
-    {"batch_id": 15, "medicine_name": "Electral", "brand": "FDC", "category": "Powder", "batch_number": "ELEC-FDC-2025", "quantity": 50, "price_per_unit": 12.00, "manufacture_date": "2023-12-01", "expiry_date": "2025-12-01"},
-    {"batch_id": 16, "medicine_name": "Electral", "brand": "FDC", "category": "Powder", "batch_number": "ELEC-FDC-2026", "quantity": 70, "price_per_unit": 12.00, "manufacture_date": "2024-04-14", "expiry_date": "2026-04-14"},
-    {"batch_id": 17, "medicine_name": "Eno", "brand": "GSK", "category": "Powder", "batch_number": "ENO-GSK-2025", "quantity": 100, "price_per_unit": 7.00, "manufacture_date": "2023-09-01", "expiry_date": "2025-09-01"},
-    {"batch_id": 18, "medicine_name": "Fepanil", "brand": "Sun Pharma", "category": "Tablet", "batch_number": "FEP-SUN-2026", "quantity": 120, "price_per_unit": 9.00, "manufacture_date": "2024-03-15", "expiry_date": "2026-03-15"},
-    {"batch_id": 19, "medicine_name": "Flexon", "brand": "Aristo", "category": "Tablet", "batch_number": "FLEX-ARI-2026", "quantity": 100, "price_per_unit": 11.00, "manufacture_date": "2024-02-10", "expiry_date": "2026-02-10"},
-    {"batch_id": 20, "medicine_name": "Gaviscon", "brand": "Reckitt", "category": "Suspension", "batch_number": "GAVI-REC-2026", "quantity": 70, "price_per_unit": 30.00, "manufacture_date": "2024-05-05", "expiry_date": "2026-05-05"},
-    {"batch_id": 21, "medicine_name": "Gelusil", "brand": "Pfizer", "category": "Suspension", "batch_number": "GELU-PFZ-2026", "quantity": 75, "price_per_unit": 30.00, "manufacture_date": "2023-06-20", "expiry_date": "2026-06-20"},
-    {"batch_id": 22, "medicine_name": "Gelusil", "brand": "Pfizer", "category": "Suspension", "batch_number": "GELU-PFZ-2027", "quantity": 55, "price_per_unit": 30.00, "manufacture_date": "2024-05-10", "expiry_date": "2027-05-10"},
-    {"batch_id": 23, "medicine_name": "Honitus", "brand": "Dabur", "category": "Syrup", "batch_number": "HONI-DAB-2026", "quantity": 80, "price_per_unit": 90.00, "manufacture_date": "2024-02-25", "expiry_date": "2026-02-25"},
-    {"batch_id": 24, "medicine_name": "Hifenac", "brand": "Intas", "category": "Tablet", "batch_number": "HIFE-INT-2026", "quantity": 90, "price_per_unit": 18.00, "manufacture_date": "2024-01-30", "expiry_date": "2026-01-30"},
-    {"batch_id": 25, "medicine_name": "Ibugesic", "brand": "Cipla", "category": "Tablet", "batch_number": "IBU-CIP-2026", "quantity": 100, "price_per_unit": 10.00, "manufacture_date": "2024-06-10", "expiry_date": "2026-06-10"},
-    {"batch_id": 26, "medicine_name": "Iodex", "brand": "GSK", "category": "Ointment", "batch_number": "IOD-GSK-2026", "quantity": 60, "price_per_unit": 40.00, "manufacture_date": "2024-03-12", "expiry_date": "2026-03-12"},
-    {"batch_id": 27, "medicine_name": "Jiffy", "brand": "Cadila", "category": "Tablet", "batch_number": "JIFF-CAD-2026", "quantity": 70, "price_per_unit": 8.00, "manufacture_date": "2024-04-06", "expiry_date": "2026-04-06"},
-    {"batch_id": 28, "medicine_name": "Junior Lanzol", "brand": "Cipla", "category": "Tablet", "batch_number": "JLAN-CIP-2026", "quantity": 60, "price_per_unit": 14.00, "manufacture_date": "2024-02-12", "expiry_date": "2026-02-12"},
-    {"batch_id": 29, "medicine_name": "Ketanov", "brand": "Sun Pharma", "category": "Tablet", "batch_number": "KETA-SUN-2026", "quantity": 85, "price_per_unit": 22.00, "manufacture_date": "2024-01-18", "expiry_date": "2026-01-18"},
-    {"batch_id": 30, "medicine_name": "Ketorol", "brand": "Dr. Reddy's", "category": "Tablet", "batch_number": "KETO-DRD-2026", "quantity": 90, "price_per_unit": 25.00, "manufacture_date": "2024-03-08", "expiry_date": "2026-03-08"},
-    {"batch_id": 31, "medicine_name": "Limcee", "brand": "Abbott", "category": "Tablet", "batch_number": "LIM-ABB-2026", "quantity": 100, "price_per_unit": 7.00, "manufacture_date": "2024-02-22", "expiry_date": "2026-02-22"},
-    {"batch_id": 32, "medicine_name": "Liv52", "brand": "Himalaya", "category": "Syrup", "batch_number": "LIV52-HIM-2027", "quantity": 60, "price_per_unit": 85.00, "manufacture_date": "2024-02-01", "expiry_date": "2027-02-01"},
-    {"batch_id": 33, "medicine_name": "Liv52", "brand": "Himalaya", "category": "Syrup", "batch_number": "LIV52-HIM-2026", "quantity": 50, "price_per_unit": 85.00, "manufacture_date": "2023-01-18", "expiry_date": "2026-01-18"},
-    {"batch_id": 34, "medicine_name": "Meftal Spas", "brand": "Blue Cross", "category": "Tablet", "batch_number": "MEF-BC-2026", "quantity": 120, "price_per_unit": 15.00, "manufacture_date": "2024-04-11", "expiry_date": "2026-04-11"},
-    {"batch_id": 35, "medicine_name": "Metrogyl", "brand": "JB Chem", "category": "Tablet", "batch_number": "MET-JB-2026", "quantity": 110, "price_per_unit": 12.00, "manufacture_date": "2024-03-05", "expiry_date": "2026-03-20"},
-    {"batch_id": 36, "medicine_name": "Nasivion", "brand": "Bayer", "category": "Drops", "batch_number": "NAS-BAY-2026", "quantity": 75, "price_per_unit": 65.00, "manufacture_date": "2024-05-20", "expiry_date": "2026-05-20"},
-    {"batch_id": 37, "medicine_name": "Norflox", "brand": "Cipla", "category": "Tablet", "batch_number": "NOR-CIP-2026", "quantity": 90, "price_per_unit": 12.00, "manufacture_date": "2024-02-28", "expiry_date": "2026-02-28"},
-    {"batch_id": 38, "medicine_name": "Omez", "brand": "Dr. Reddy's", "category": "Capsule", "batch_number": "OMEZ-DRD-2025", "quantity": 120, "price_per_unit": 12.50, "manufacture_date": "2023-11-15", "expiry_date": "2025-11-15"},
-    {"batch_id": 39, "medicine_name": "Omez", "brand": "Dr. Reddy's", "category": "Capsule", "batch_number": "OMEZ-DRD-2026", "quantity": 90, "price_per_unit": 12.50, "manufacture_date": "2024-01-05", "expiry_date": "2026-01-05"},
-    {"batch_id": 40, "medicine_name": "Ondem", "brand": "Alkem", "category": "Tablet", "batch_number": "OND-ALK-2026", "quantity": 95, "price_per_unit": 14.00, "manufacture_date": "2023-08-18", "expiry_date": "2026-08-18"},
-    {"batch_id": 41, "medicine_name": "Ondem", "brand": "Alkem", "category": "Tablet", "batch_number": "OND-ALK-2027", "quantity": 100, "price_per_unit": 14.00, "manufacture_date": "2024-03-22", "expiry_date": "2027-03-22"},
-    {"batch_id": 42, "medicine_name": "Pantoprazole", "brand": "Zydus", "category": "Tablet", "batch_number": "PANTO-ZYD-2026", "quantity": 110, "price_per_unit": 22.00, "manufacture_date": "2023-10-10", "expiry_date": "2026-10-10"},
-    {"batch_id": 43, "medicine_name": "Pantoprazole", "brand": "Zydus", "category": "Tablet", "batch_number": "PANTO-ZYD-2027", "quantity": 95, "price_per_unit": 22.00, "manufacture_date": "2024-06-06", "expiry_date": "2027-06-06"},
-    {"batch_id": 44, "medicine_name": "Paracetamol", "brand": "Cipla", "category": "Tablet", "batch_number": "PARA-CIPLA-2026", "quantity": 200, "price_per_unit": 15.00, "manufacture_date": "2024-05-12", "expiry_date": "2026-05-12"},
-    {"batch_id": 45, "medicine_name": "Paracetamol", "brand": "Cipla", "category": "Tablet", "batch_number": "PARA-CIPLA-2027", "quantity": 160, "price_per_unit": 15.00, "manufacture_date": "2025-01-20", "expiry_date": "2027-01-20"},
-    {"batch_id": 46, "medicine_name": "Quadriderm", "brand": "MSD", "category": "Cream", "batch_number": "QUAD-MSD-2026", "quantity": 50, "price_per_unit": 60.00, "manufacture_date": "2024-03-25", "expiry_date": "2026-03-25"},
-    {"batch_id": 47, "medicine_name": "Quinidine", "brand": "Sandoz", "category": "Tablet", "batch_number": "QUIN-SAN-2026", "quantity": 40, "price_per_unit": 28.00, "manufacture_date": "2024-04-18", "expiry_date": "2026-04-18"},
-    {"batch_id": 48, "medicine_name": "Rantac", "brand": "JB Chem", "category": "Tablet", "batch_number": "RANT-JB-2026", "quantity": 100, "price_per_unit": 9.00, "manufacture_date": "2024-01-07", "expiry_date": "2026-01-07"},
-    {"batch_id": 49, "medicine_name": "Revital", "brand": "Sun Pharma", "category": "Capsule", "batch_number": "REVI-SUN-2027", "quantity": 80, "price_per_unit": 120.00, "manufacture_date": "2024-04-01", "expiry_date": "2027-04-01"},
-    {"batch_id": 50, "medicine_name": "Revital", "brand": "Sun Pharma", "category": "Capsule", "batch_number": "REVI-SUN-2025", "quantity": 60, "price_per_unit": 120.00, "manufacture_date": "2023-02-01", "expiry_date": "2025-02-01"},
-    {"batch_id": 51, "medicine_name": "Sinarest", "brand": "Centaur", "category": "Tablet", "batch_number": "SINA-CEN-2025", "quantity": 90, "price_per_unit": 8.00, "manufacture_date": "2023-09-05", "expiry_date": "2025-09-05"},
-    {"batch_id": 52, "medicine_name": "Sinarest", "brand": "Centaur", "category": "Tablet", "batch_number": "SINA-CEN-2026", "quantity": 100, "price_per_unit": 8.00, "manufacture_date": "2024-07-01", "expiry_date": "2026-07-01"},
-    {"batch_id": 53, "medicine_name": "Soframycin", "brand": "Sanofi", "category": "Cream", "batch_number": "SOFR-SAN-2026", "quantity": 70, "price_per_unit": 32.00, "manufacture_date": "2023-04-21", "expiry_date": "2026-04-21"},
-    {"batch_id": 54, "medicine_name": "Soframycin", "brand": "Sanofi", "category": "Cream", "batch_number": "SOFR-SAN-2027", "quantity": 50, "price_per_unit": 32.00, "manufacture_date": "2024-05-01", "expiry_date": "2027-05-01"},
-    {"batch_id": 55, "medicine_name": "Strepsils", "brand": "Reckitt", "category": "Lozenges", "batch_number": "STRE-REC-2025", "quantity": 100, "price_per_unit": 5.00, "manufacture_date": "2023-01-01", "expiry_date": "2025-01-01"},
-    {"batch_id": 56, "medicine_name": "Strepsils", "brand": "Reckitt", "category": "Lozenges", "batch_number": "STRE-REC-2027", "quantity": 120, "price_per_unit": 5.00, "manufacture_date": "2024-08-09", "expiry_date": "2027-08-09"},
-    {"batch_id": 57, "medicine_name": "Taxim-O", "brand": "Alkem", "category": "Tablet", "batch_number": "TAX-ALK-2026", "quantity": 85, "price_per_unit": 45.00, "manufacture_date": "2024-05-02", "expiry_date": "2026-05-02"},
-    {"batch_id": 58, "medicine_name": "Thyronorm", "brand": "Abbott", "category": "Tablet", "batch_number": "THYR-ABB-2027", "quantity": 110, "price_per_unit": 18.00, "manufacture_date": "2024-02-19", "expiry_date": "2027-02-19"},
-    {"batch_id": 59, "medicine_name": "Thyronorm", "brand": "Abbott", "category": "Tablet", "batch_number": "THYR-ABB-2026", "quantity": 90, "price_per_unit": 18.00, "manufacture_date": "2023-03-14", "expiry_date": "2026-03-14"},
-    {"batch_id": 60, "medicine_name": "Ulgel", "brand": "Zydus", "category": "Suspension", "batch_number": "ULG-ZYD-2026", "quantity": 70, "price_per_unit": 25.00, "manufacture_date": "2024-04-01", "expiry_date": "2026-04-01"},
-    {"batch_id": 61, "medicine_name": "Unienzyme", "brand": "Torrent", "category": "Tablet", "batch_number": "UNI-TOR-2026", "quantity": 95, "price_per_unit": 13.00, "manufacture_date": "2024-02-18", "expiry_date": "2026-02-18"},
-    {"batch_id": 62, "medicine_name": "Vicks", "brand": "P&G", "category": "Ointment", "batch_number": "VICK-PG-2026", "quantity": 80, "price_per_unit": 56.00, "manufacture_date": "2024-03-14", "expiry_date": "2026-03-14"},
-    {"batch_id": 63, "medicine_name": "Volini", "brand": "Sun Pharma", "category": "Gel", "batch_number": "VOLI-SUN-2025", "quantity": 60, "price_per_unit": 65.00, "manufacture_date": "2023-05-10", "expiry_date": "2025-05-10"},
-    {"batch_id": 64, "medicine_name": "Volini", "brand": "Sun Pharma", "category": "Gel", "batch_number": "VOLI-SUN-2026", "quantity": 50, "price_per_unit": 65.00, "manufacture_date": "2024-06-20", "expiry_date": "2026-06-20"},
-    {"batch_id": 65, "medicine_name": "Wikoryl", "brand": "Alembic", "category": "Tablet", "batch_number": "WIK-ALE-2026", "quantity": 100, "price_per_unit": 8.00, "manufacture_date": "2024-02-28", "expiry_date": "2026-02-28"},
-    {"batch_id": 66, "medicine_name": "Wysolone", "brand": "Pfizer", "category": "Tablet", "batch_number": "WYS-PFZ-2026", "quantity": 90, "price_per_unit": 20.00, "manufacture_date": "2024-01-25", "expiry_date": "2026-01-25"},
-    {"batch_id": 67, "medicine_name": "Xarelto", "brand": "Bayer", "category": "Tablet", "batch_number": "XAR-BAY-2026", "quantity": 60, "price_per_unit": 150.00, "manufacture_date": "2024-01-30", "expiry_date": "2026-01-30"},
-    {"batch_id": 68, "medicine_name": "Xone", "brand": "Alkem", "category": "Injection", "batch_number": "XON-ALK-2026", "quantity": 40, "price_per_unit": 90.00, "manufacture_date": "2024-05-12", "expiry_date": "2026-05-12"},
-    {"batch_id": 69, "medicine_name": "Yogurt Sachets", "brand": "Abbott", "category": "Powder", "batch_number": "YOG-ABB-2026", "quantity": 70, "price_per_unit": 35.00, "manufacture_date": "2024-02-07", "expiry_date": "2026-02-07"},
-    {"batch_id": 70, "medicine_name": "Yondelis", "brand": "Janssen", "category": "Injection", "batch_number": "YON-JAN-2026", "quantity": 30, "price_per_unit": 1200.00, "manufacture_date": "2024-03-20", "expiry_date": "2026-03-20"},
-    {"batch_id": 71, "medicine_name": "Zincovit", "brand": "Apex", "category": "Tablet", "batch_number": "ZINC-APX-2026", "quantity": 110, "price_per_unit": 10.00, "manufacture_date": "2024-06-02", "expiry_date": "2026-06-02"},
-    {"batch_id": 72, "medicine_name": "Zyrtec", "brand": "Dr. Reddy's", "category": "Tablet", "batch_number": "ZYRC-DRD-2025", "quantity": 90, "price_per_unit": 22.00, "manufacture_date": "2023-07-09", "expiry_date": "2025-07-09"},
-    {"batch_id": 73, "medicine_name": "Zyrtec", "brand": "Dr. Reddy's", "category": "Tablet", "batch_number": "ZYRC-DRD-2027", "quantity": 75, "price_per_unit": 22.00, "manufacture_date": "2024-04-15", "expiry_date": "2027-04-15"}
-]
+# Initial medicine data lives in seed_medicines.json and is only read when seeding an empty DB
+SEED_DATA_PATH = BASE_DIR / 'seed_medicines.json'
+
+
+def load_initial_medicine_data():
+    """Load seed medicine rows (dates as 'YYYY-MM-DD' strings)"""
+    with open(SEED_DATA_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
 
 with app.app_context():
     db.create_all()
-    # Check if the database is empty before populating
-    if not Medicine.query.first():
-        for data in initial_medicine_data:
-            data['manufacture_date'] = datetime.strptime(data['manufacture_date'], '%Y-%m-%d').date()
-            data['expiry_date'] = datetime.strptime(data['expiry_date'], '%Y-%m-%d').date()
-            medicine = Medicine(**data)
-            db.session.add(medicine)
+    # create_all() skips tables that already exist, so add any missing indexes explicitly.
+    # IF NOT EXISTS rather than checkfirst: SQLite reflection can't see expression indexes
+    with db.engine.begin() as conn:
+        for index in (*Medicine.__table__.indexes, *MedicineEnquiry.__table__.indexes):
+            conn.execute(CreateIndex(index, if_not_exists=True))
+        # ix_med_name_exp leads with medicine_name, so a separate name index is pure write overhead
+        conn.execute(db.text('DROP INDEX IF EXISTS ix_medicine_medicine_name'))
+    # Check if the database is empty before populating: a bare EXISTS, no row is fetched
+    if not db.session.query(Medicine.query.exists()).scalar():
+        # Insert all seed rows with a single executemany instead of one ORM add per row
+        seed_rows = [
+            {
+                **data,
+                'manufacture_date': date.fromisoformat(data['manufacture_date']),
+                'expiry_date': date.fromisoformat(data['expiry_date']),
+            }
+            for data in load_initial_medicine_data()
+        ]
+        # Via db.session like any bulk write, so mark_bulk_medicine_change sees it once registered
+        db.session.execute(Medicine.__table__.insert(), seed_rows)
         db.session.commit()
 
 # ─── Medicine Database ────────────────────────────────────────────────────────
 MEDICINE_DB = {
     'A': ['Augmentin', 'Avil'],
-    'B': ['Benadryl', 'Brufen', 'Bifilac', 'BIFILAC'],
+    'B': ['Benadryl', 'Brufen', 'Bifilac'],
     'C': ['Cetrizine', 'Combiflam'],
-    'D': ['Dolo 650', 'Dolo-650', 'Domstal', 'Domperidone'],
+    'D': ['Dolo 650', 'Domstal', 'Domperidone'],
     'E': ['Eno', 'Electral'],
     'F': ['Flexon', 'Fepanil'],
     'G': ['Gelusil', 'Gaviscon'],
@@ -240,7 +486,7 @@ MEDICINE_DB = {
     'O': ['Omez', 'Ondem', 'O2', 'Ofloxacin', 'Ornidazole'],
     'P': ['Paracetamol', 'Pantoprazole'],
     'Q': ['Quadriderm', 'Quinidine'],
-    'R': ['Rantac', 'Revital', 'Rabemi-DSR', 'RABEMI-DSR', 'Rabeprazole'],
+    'R': ['Rantac', 'Revital', 'Rabemi-DSR', 'Rabeprazole'],
     'S': ['Sinarest', 'Soframycin'],
     'T': ['Thyronorm', 'Taxim-O'],
     'U': ['Ulgel', 'Unienzyme'],
@@ -251,357 +497,74 @@ MEDICINE_DB = {
     'Z': ['Zyrtec', 'Zincovit']
 }
 
-# Medicine information database
-MEDICINE_INFO = {
-    "Augmentin": {
-        "uses": "Bacterial infections",
-        "side_effects": "Diarrhea, Rash",
-        "dosage": "As directed by physician"
-    },
-    "Avil": {
-        "uses": "Allergy, Cold",
-        "side_effects": "Drowsiness, Dry mouth",
-        "dosage": "1 tablet twice daily"
-    },
-    "Benadryl": {
-        "uses": "Cough, Allergy",
-        "side_effects": "Drowsiness, Dizziness",
-        "dosage": "2 tsp thrice daily"
-    },
-    "Brufen": {
-        "uses": "Pain relief, Fever",
-        "side_effects": "Nausea, Stomach pain",
-        "dosage": "1 tablet every 8 hours"
-    },
-    "Cetrizine": {
-        "uses": "Allergies, Runny nose",
-        "side_effects": "Drowsiness, Dry mouth",
-        "dosage": "1 tablet once daily"
-    },
-    "Combiflam": {
-        "uses": "Pain, Fever",
-        "side_effects": "Stomach upset, Nausea",
-        "dosage": "1 tablet twice daily"
-    },
-    "Dolo 650": {
-        "uses": "Fever, Headache",
-        "side_effects": "Liver damage (overdose)",
-        "dosage": "1 tablet every 6 hours"
-    },
-    "Domstal": {
-        "uses": "Nausea, Vomiting",
-        "side_effects": "Dry mouth, Drowsiness",
-        "dosage": "1 tablet before meals"
-    },
-    "Eno": {
-        "uses": "Acidity, Indigestion",
-        "side_effects": "None common",
-        "dosage": "1 tsp in water as needed"
-    },
-    "Electral": {
-        "uses": "Dehydration, Electrolyte imbalance",
-        "side_effects": "None common",
-        "dosage": "Dissolve 1 packet in 1L water"
-    },
-    "Flexon": {
-        "uses": "Pain relief, Fever",
-        "side_effects": "Nausea, Stomach pain",
-        "dosage": "1 tablet twice daily"
-    },
-    "Fepanil": {
-        "uses": "Fever, Cold",
-        "side_effects": "Liver effects (overdose)",
-        "dosage": "1 tablet every 6 hours"
-    },
-    "Gelusil": {
-        "uses": "Acidity, Gas",
-        "side_effects": "Constipation",
-        "dosage": "2 tsp after meals"
-    },
-    "Gaviscon": {
-        "uses": "Heartburn, Indigestion",
-        "side_effects": "Constipation",
-        "dosage": "2 tsp after meals"
-    },
-    "Honitus": {
-        "uses": "Cough, Cold",
-        "side_effects": "Drowsiness (rare)",
-        "dosage": "2 tsp thrice daily"
-    },
-    "Hifenac": {
-        "uses": "Pain, Inflammation",
-        "side_effects": "Acidity, Nausea",
-        "dosage": "1 tablet after food"
-    },
-    "Ibugesic": {
-        "uses": "Fever, Pain",
-        "side_effects": "Stomach pain, Nausea",
-        "dosage": "1 tablet every 6–8 hours"
-    },
-    "Iodex": {
-        "uses": "Muscle pain",
-        "side_effects": "Skin irritation",
-        "dosage": "Apply externally on affected area"
-    },
-    "Junior Lanzol": {
-        "uses": "Acidity in kids",
-        "side_effects": "Abdominal pain, Diarrhea",
-        "dosage": "As prescribed by pediatrician"
-    },
-    "Jiffy": {
-        "uses": "Fever, Cold",
-        "side_effects": "Drowsiness, Dry mouth",
-        "dosage": "As prescribed"
-    },
-    "Ketorol": {
-        "uses": "Severe pain",
-        "side_effects": "Stomach pain, Drowsiness",
-        "dosage": "As prescribed"
-    },
-    "Ketanov": {
-        "uses": "Post-operative pain",
-        "side_effects": "Nausea, Dizziness",
-        "dosage": "As directed"
-    },
-    "Liv52": {
-        "uses": "Liver health",
-        "side_effects": "None significant",
-        "dosage": "2 tablets daily"
-    },
-    "Limcee": {
-        "uses": "Vitamin C supplement",
-        "side_effects": "None common",
-        "dosage": "1 tablet daily"
-    },
-    "Meftal Spas": {
-        "uses": "Menstrual pain, Spasms",
-        "side_effects": "Dizziness, Nausea",
-        "dosage": "1 tablet as needed"
-    },
-    "Metrogyl": {
-        "uses": "Bacterial infections",
-        "side_effects": "Metallic taste, Nausea",
-        "dosage": "1 tablet twice daily"
-    },
-    "Norflox": {
-        "uses": "UTI, Diarrhea",
-        "side_effects": "Nausea, Headache",
-        "dosage": "1 tablet twice daily"
-    },
-    "Nasivion": {
-        "uses": "Nasal congestion",
-        "side_effects": "Burning sensation",
-        "dosage": "2 drops per nostril"
-    },
-    "Omez": {
-        "uses": "Acidity, Ulcer",
-        "side_effects": "Headache, Nausea",
-        "dosage": "1 capsule before food"
-    },
-    "Ondem": {
-        "uses": "Nausea, Vomiting",
-        "side_effects": "Headache, Constipation",
-        "dosage": "As directed by physician"
-    },
-    "Paracetamol": {
-        "uses": "Fever, Mild pain",
-        "side_effects": "Liver toxicity (overuse)",
-        "dosage": "1 tablet every 6 hours"
-    },
-    "Pantoprazole": {
-        "uses": "GERD, Acidity",
-        "side_effects": "Abdominal pain",
-        "dosage": "1 tablet before breakfast"
-    },
-    "Quadriderm": {
-        "uses": "Skin infections",
-        "side_effects": "Skin irritation",
-        "dosage": "Apply thin layer twice daily"
-    },
-    "Quinidine": {
-        "uses": "Irregular heartbeat",
-        "side_effects": "Dizziness, Nausea",
-        "dosage": "As directed"
-    },
-    "Rantac": {
-        "uses": "Acidity, Ulcers",
-        "side_effects": "Constipation",
-        "dosage": "1 tablet before meals"
-    },
-    "Revital": {
-        "uses": "Energy supplement",
-        "side_effects": "None significant",
-        "dosage": "1 capsule daily"
-    },
-    "Sinarest": {
-        "uses": "Cold, Allergy",
-        "side_effects": "Drowsiness",
-        "dosage": "1 tablet twice daily"
-    },
-    "Soframycin": {
-        "uses": "Wound healing",
-        "side_effects": "Skin irritation",
-        "dosage": "Apply externally"
-    },
-    "Thyronorm": {
-        "uses": "Thyroid hormone deficiency",
-        "side_effects": "Weight loss, Palpitations",
-        "dosage": "1 tablet before breakfast"
-    },
-    "Taxim-O": {
-        "uses": "Bacterial infections",
-        "side_effects": "Nausea, Diarrhea",
-        "dosage": "1 tablet twice daily"
-    },
-    "Ulgel": {
-        "uses": "Acidity, Gas",
-        "side_effects": "Constipation",
-        "dosage": "2 tsp after meals"
-    },
-    "Unienzyme": {
-        "uses": "Indigestion",
-        "side_effects": "None common",
-        "dosage": "1 tablet after meals"
-    },
-    "Volini": {
-        "uses": "Sprains, Back pain",
-        "side_effects": "Skin redness",
-        "dosage": "Apply gently on affected area"
-    },
-    "Vicks": {
-        "uses": "Cough, Congestion",
-        "side_effects": "Skin irritation",
-        "dosage": "Rub on chest/throat"
-    },
-    "Wikoryl": {
-        "uses": "Cold, Cough",
-        "side_effects": "Drowsiness",
-        "dosage": "1 tablet twice daily"
-    },
-    "Wysolone": {
-        "uses": "Inflammation, Allergies",
-        "side_effects": "Weight gain, Mood swings",
-        "dosage": "As directed by doctor"
-    },
-    "Xarelto": {
-        "uses": "Blood thinner",
-        "side_effects": "Bleeding",
-        "dosage": "As prescribed"
-    },
-    "Xone": {
-        "uses": "Bacterial infections",
-        "side_effects": "Diarrhea, Nausea",
-        "dosage": "As prescribed"
-    },
-    "Yondelis": {
-        "uses": "Cancer treatment",
-        "side_effects": "Fatigue, Vomiting",
-        "dosage": "IV under supervision"
-    },
-    "Yogurt Sachets": {
-        "uses": "Probiotic, Digestion",
-        "side_effects": "None common",
-        "dosage": "1 sachet daily"
-    },
-    "Zyrtec": {
-        "uses": "Allergy, Sneezing",
-        "side_effects": "Drowsiness",
-        "dosage": "1 tablet at bedtime"
-    },
-    "Zincovit": {
-        "uses": "Immunity booster",
-        "side_effects": "Mild stomach upset",
-        "dosage": "1 tablet daily"
-    },
-    "Bifilac": {
-        "uses": "Probiotic, Diarrhea, Gut health, Antibiotic-associated diarrhea",
-        "side_effects": "Bloating, Gas (rare)",
-        "dosage": "1 capsule twice daily"
-    },
-    "BIFILAC": {
-        "uses": "Probiotic, Diarrhea, Gut health, Antibiotic-associated diarrhea",
-        "side_effects": "Bloating, Gas (rare)",
-        "dosage": "1 capsule twice daily"
-    },
-    "O2": {
-        "uses": "Bacterial infections (Ofloxacin + Ornidazole combination)",
-        "side_effects": "Nausea, Headache, Dizziness",
-        "dosage": "1 tablet twice daily after meals"
-    },
-    "Dolo-650": {
-        "uses": "Fever, Headache, Body pain",
-        "side_effects": "Liver damage (overdose)",
-        "dosage": "1 tablet every 6 hours"
-    },
-    "Rabemi-DSR": {
-        "uses": "Acidity, GERD, Gastric ulcers (Rabeprazole + Domperidone)",
-        "side_effects": "Headache, Diarrhea, Dry mouth",
-        "dosage": "1 capsule before breakfast"
-    },
-    "RABEMI-DSR": {
-        "uses": "Acidity, GERD, Gastric ulcers (Rabeprazole + Domperidone)",
-        "side_effects": "Headache, Diarrhea, Dry mouth",
-        "dosage": "1 capsule before breakfast"
-    },
-    "Ofloxacin": {
-        "uses": "Bacterial infections, UTI, Respiratory infections",
-        "side_effects": "Nausea, Diarrhea, Headache",
-        "dosage": "As prescribed by physician"
-    },
-    "Ornidazole": {
-        "uses": "Protozoal infections, Amoebiasis, Giardiasis",
-        "side_effects": "Nausea, Metallic taste, Dizziness",
-        "dosage": "As prescribed by physician"
-    },
-    "Rabeprazole": {
-        "uses": "GERD, Peptic ulcer, Acidity",
-        "side_effects": "Headache, Diarrhea",
-        "dosage": "1 tablet before meals"
-    },
-    "Domperidone": {
-        "uses": "Nausea, Vomiting, Bloating",
-        "side_effects": "Dry mouth, Headache",
-        "dosage": "1 tablet before meals"
-    }
-}
-
-# Health conditions and suggested medicines
-HEALTH_CONDITIONS = {
-    'stomach pain': ['Pantoprazole', 'Omez', 'Gelusil', 'Brufen', 'Flexon', 'Ibugesic', 'Meftal Spas'],
-    'fever': ['Paracetamol', 'Dolo 650', 'Brufen', 'Flexon', 'Ibugesic', 'Fepanil', 'Jiffy'],
-    'cold': ['Sinarest', 'Cetrizine', 'Benadryl', 'Honitus', 'Jiffy', 'Wikoryl', 'Vicks'],
-    'headache': ['Paracetamol', 'Combiflam'],
-    'allergy': ['Cetrizine', 'Zyrtec', 'Avil', 'Benadryl', 'Sinarest', 'Wysolone'],
-    'acidity': ['Pantoprazole', 'Omez', 'Gelusil', 'Eno', 'Gaviscon', 'Junior Lanzol', 'Rantac', 'Ulgel'],
-    'cough': ['Honitus', 'Benadryl', 'Sinarest', 'Wikoryl', 'Vicks'],
-    'vomiting': ['Domstal', 'Ondem', 'Metrogyl', 'Taxim-O', 'Yondelis'],
-    'skin irritation': ['Iodex', 'Soframycin', 'Quadriderm', 'Vicks', 'Wysolone']
+# Medicine information database and health conditions -> suggested medicines
+MEDICINE_DATA_PATH = BASE_DIR / 'medicine_info.json'
+
+
+def load_medicine_data():
+    """Load MEDICINE_INFO and HEALTH_CONDITIONS from the bundled JSON"""
+    with open(MEDICINE_DATA_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+    # Many entries repeat the same uses/side_effects/dosage text; share one copy
+    for info in data['medicine_info'].values():
+        for field, value in info.items():
+            info[field] = sys.intern(value)
+    return data['medicine_info'], data['health_conditions']
+
+
+MEDICINE_INFO, HEALTH_CONDITIONS = load_medicine_data()
+
+# Query word -> HEALTH_CONDITIONS keys it selects, so lookups are dict hits
+CONDITION_ALIASES = {
+    'tummy': 'stomach pain',
+    'stomachache': 'stomach pain',
+    'gastric': 'acidity',
+    'heartburn': 'acidity',
+    'acid': 'acidity',
+    'temperature': 'fever',
+    'flu': 'cold',
+    'sneezing': 'allergy',
+    'nausea': 'vomiting',
+    'rash': 'skin irritation',
+    'itching': 'skin irritation',
 }
+# Single-word keys and aliases resolve by dict lookup; multi-word keys ('stomach pain') only
+# match as a whole phrase, so 'chest pain' or 'eye irritation' select nothing
+CONDITION_INDEX = {key: key for key in HEALTH_CONDITIONS if ' ' not in key}
+CONDITION_INDEX.update(CONDITION_ALIASES)
+CONDITION_WORD_KEYS = tuple(key for key in HEALTH_CONDITIONS if ' ' not in key)
+CONDITION_PHRASE_KEYS = tuple(key for key in HEALTH_CONDITIONS if ' ' in key)
+CONDITION_TOKEN_RE = re.compile(r'[a-z]+')
+
+# brand_name patterns that can match without any KNOWN_BRAND_STEMS in the text; these are
+# all find_brand_name tries when no known stem occurs
+O2_BRAND_PATTERN = r"(?i)\b(O2|O\s*2)\b"  # O2 tablets
+HEURISTIC_BRAND_PATTERNS = [
+    r"(?i)^([A-Z][A-Za-z0-9\-]+(?:\s*\d+)?)\b",  # Brand at start with optional number
+    r"(?i)\b([A-Z][a-z]+[\s\-]*\d{2,4})\b",  # Brand with number like "Dolo 650"
+    r"(?i)\b([A-Z][a-z]+(?:\s*[&+]\s*[A-Za-z]+)?)\s*(?:Tablet|Capsule|Syrup|Tab|Cap)\b",
+]
 
 # Regex patterns for extracting information from medicine strips
 PATTERNS = {
     'brand_name': [
         # Specific medicine brands from sample images
         r"(?i)\b(BIFILAC|Bifilac)\b",
-        r"(?i)\b(O2|O\s*2)\b",  # O2 tablets
+        O2_BRAND_PATTERN,
         r"(?i)\b(Dolo[\s\-]*650|DOLO[\s\-]*650)\b",
         r"(?i)\b(RABEMI[\s\-]*DSR|Rabemi[\s\-]*DSR)\b",
         # Common Indian medicine brand patterns
         r"(?i)\b(Dolo\s*\d+|Crocin|Pan\s*\d+|Azee\s*\d+|Calpol|Combiflam|Allegra|Montair|Augmentin|Zifi\s*\d+|Shelcal|Becosules|Limcee|Revital|Liv\s*52|Digene|Gelusil|Eno|Hajmola|Pudin\s*Hara)\b",
         r"(?i)\b(Ofloxacin|Ornidazole|Paracetamol|Rabeprazole|Domperidone)\s*(?:Tablets?|Capsules?)?\s*(?:I\.?P\.?)?\b",
-        r"(?i)^([A-Z][A-Za-z0-9\-]+(?:\s*\d+)?)\b",  # Brand at start with optional number
-        r"(?i)\b([A-Z][a-z]+[\s\-]*\d{2,4})\b",  # Brand with number like "Dolo 650"
-        r"(?i)\b([A-Z][a-z]+(?:\s*[&+]\s*[A-Za-z]+)?)\s*(?:Tablet|Capsule|Syrup|Tab|Cap)\b",
+        *HEURISTIC_BRAND_PATTERNS,
     ],
     'generic_name': [
         r"(?i)\b(?:contains|each)\s+(.+?)(?:IP|BP|USP|Ph\.?Eur\.|\)|\n)",
         r"(?i)\b(Paracetamol|Ibuprofen|Amoxicillin|Ciprofloxacin|Metronidazole|Azithromycin|Ofloxacin|Ornidazole|Pantoprazole|Omeprazole|Ranitidine|Cetirizine|Levocetirizine|Montelukast|Atorvastatin|Metformin|Rabeprazole|Domperidone)\b",
     ],
     'dosage': [
+        # Also covers "650mg", "5 mcg" and combined dosages like "200mg + 500mg"
         r"(?i)(\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|IU)(?:\s*[+/&]\s*\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|IU))?)",
-        r"(?i)\b(\d+\s*mg)\b",
-        r"(?i)\b(\d+\s*mcg)\b",
-        r"(?i)(\d+\s*mg\s*[+/&]\s*\d+\s*mg)",  # Combined dosages like "200mg + 500mg"
     ],
     'batch_number': [
         # Various batch number formats on Indian medicine strips
@@ -619,22 +582,18 @@ PATTERNS = {
         r"(?i)MFG\.?\s*(?:DT\.?|DATE|D)?\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4})",  # MFG. DT. JAN.24
         r"(?i)MFD\.?\s*(?:DT\.?|DATE|D)?\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4})",  # MFD JAN 24
         r"(?i)M\.?D\.?\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4})",  # M.D. JAN.24
-        r"(?i)MFG\.?\s*(?:DT\.?|DATE)?\s*[:#.\-]?\s*(\d{1,2}[./-]\d{2,4})",  # MFG 01/24
+        r"(?i)MFG\.?\s*(?:DT\.?|DATE)?\s*[:#.\-]?\s*(\d{1,2}[./-]\d{2,4})",  # MFG 01/24, MFG. 10/2023
         r"(?i)MFD\.?\s*(?:DT\.?|DATE)?\s*[:#.\-]?\s*(\d{1,2}[./-]\d{2,4})",  # MFD 01/2024
         r"(?i)(?:Mfg|Mfd|Manufactured)\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4}|\d{1,2}[./-]\d{2,4})",
-        r"(?i)MFG\.?\s*[:#.\-]?\s*(\d{2}[./-]\d{4})",  # MFG. 10/2023
         r"(?i)(\d{2}/\d{4})\s*(?=.*EXP)",  # Date before EXP mention
     ],
     'expiry': [
         # Expiry date patterns - various Indian formats
-        r"(?i)EXP\.?\s*(?:DT\.?|DATE|D)?\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4})",  # EXP. DT. DEC.26
+        r"(?i)EXP\.?\s*(?:DT\.?|DATE|D)?\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4})",  # EXP. DT. DEC.26, EXP. DEC.26
         r"(?i)E\.?D\.?\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4})",  # E.D. DEC.26
-        r"(?i)EXP\.?\s*(?:DT\.?|DATE)?\s*[:#.\-]?\s*(\d{1,2}[./-]\d{2,4})",  # EXP 12/26
+        r"(?i)EXP\.?\s*(?:DT\.?|DATE)?\s*[:#.\-]?\s*(\d{1,2}[./-]\d{2,4})",  # EXP 12/26, EXP. 09/2025
         r"(?i)(?:Expiry|Exp|Use\s*Before|Best\s*Before)\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4}|\d{1,2}[./-]\d{2,4})",
         r"(?i)(?:Use|Best)\s*(?:Before|By)\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2,4}|\d{1,2}[./-]\d{2,4})",
-        r"(?i)EXP\.?\s*[:#.\-]?\s*(\d{2}[./-]\d{4})",  # EXP. 09/2025
-        r"(?i)EXP\.?\s*[:#.\-]?\s*([A-Z]{3}\.?\s*\d{2})",  # EXP. DEC.26
-        r"(?i)(?:JUL|AUG|SEP|OCT|NOV|DEC|JAN|FEB|MAR|APR|MAY|JUN)\.?\s*\d{4}\s*$",  # Month Year at end
     ],
     'manufacturer': [
         # Indian pharmaceutical companies
@@ -646,10 +605,8 @@ PATTERNS = {
         # MRP patterns - improved for various formats
         r"(?i)M\.?R\.?P\.?\s*[:#]?\s*(?:Rs\.?|₹|INR)?\s*(\d+(?:[.,]\d{1,2})?)",
         r"(?i)(?:Price|MRP)\s*[:#]?\s*(?:Rs\.?|₹|INR)?\s*(\d+(?:[.,]\d{1,2})?)",
-        r"(?i)Rs\.?\s*(\d+(?:[.,]\d{1,2})?)",
+        r"(?i)Rs\.?\s*(\d+(?:[.,]\d{1,2})?)",  # also M.R.P.Rs.140.00, FOR 10 TABS Rs.35
         r"₹\s*(\d+(?:[.,]\d{1,2})?)",
-        r"(?i)M\.R\.P\.Rs\.?\s*(\d+(?:[.,]\d{1,2})?)",  # M.R.P.Rs.140.00
-        r"(?i)FOR\s*\d+\s*(?:TABS?|CAPS?)\s*.*?Rs\.?\s*(\d+(?:[.,]\d{1,2})?)",  # FOR 10 TABS Rs.35
     ],
     'category': [
         r"(?i)\b(?:antibiotic|analgesic|antipyretic|anti-inflammatory|antihistamine|antacid|laxative|antifungal|antiviral|diuretic|hypnotic|sedative|antidepressant|anticoagulant|beta-blocker|statin|insulin|vaccine|hormone|vitamin|probiotic|capsule|tablet)\b"
@@ -659,29 +616,97 @@ PATTERNS = {
     ]
 }
 
+# Compile every field pattern once at import; find_first_match takes these compiled lists.
+# Stdlib re is kept over google-re2: on label-sized OCR text re2's per-call overhead made
+# most fields 1.5-4x slower, and the mfd lookahead pattern is not supported by RE2
+# Date, batch, dosage and MRP patterns only look at ASCII digits/letters, so they
+# use re.ASCII for the cheaper character-class path; name fields stay Unicode
+ASCII_PATTERN_FIELDS = {'dosage', 'batch_number', 'mfd', 'expiry', 'mrp'}
+# Escapes and character classes, stripped to see whether a pattern has a bare "."
+REGEX_ESCAPE_OR_CLASS_RE = re.compile(r'\\.|\[(?:\\.|[^\]])*\]')
+
+
+def pattern_flags(field, pattern):
+    """Flags for one PATTERNS entry: DOTALL only where a bare "." must cross newlines"""
+    flags = re.IGNORECASE
+    if field in ASCII_PATTERN_FIELDS:
+        flags |= re.ASCII
+    if '.' in REGEX_ESCAPE_OR_CLASS_RE.sub('', pattern):
+        flags |= re.DOTALL
+    return flags
+
+
+PATTERNS = {field: [re.compile(p, pattern_flags(field, p)) for p in pats]
+            for field, pats in PATTERNS.items()}
+
+# Lowercase stems of the literal brand_name patterns; if none occurs in the text
+# those regexes cannot match, so only the O2 and heuristic patterns are tried
+KNOWN_BRAND_STEMS = (
+    'bifilac', 'dolo', 'rabemi', 'crocin', 'pan', 'azee', 'calpol', 'combiflam',
+    'allegra', 'montair', 'augmentin', 'zifi', 'shelcal', 'becosules', 'limcee',
+    'revital', 'liv', 'digene', 'gelusil', 'eno', 'hajmola', 'pudin',
+    'ofloxacin', 'ornidazole', 'paracetamol', 'rabeprazole', 'domperidone',
+)
+BRAND_FALLBACK_PATTERNS = [
+    pattern for pattern in PATTERNS['brand_name']
+    if pattern.pattern in (O2_BRAND_PATTERN, *HEURISTIC_BRAND_PATTERNS)
+]
+
+# Case-folded name -> MEDICINE_INFO key, for O(1) case-insensitive lookups
+MEDICINE_LOOKUP = {name.casefold(): name for name in MEDICINE_INFO}
+
+# All MEDICINE_INFO names lowercased and joined by newlines, so a substring query is a
+# C-level str.find over one string; offsets map each hit back to its name (in dict order)
+MEDICINE_INFO_NAMES = list(MEDICINE_INFO)
+MEDICINE_INFO_BLOB = '\n'.join(name.lower() for name in MEDICINE_INFO_NAMES)
+MEDICINE_INFO_OFFSETS = []
+_offset = 0
+for _name in MEDICINE_INFO_NAMES:
+    MEDICINE_INFO_OFFSETS.append(_offset)
+    _offset += len(_name) + 1
+
 # ─── Helper Functions ─────────────────────────────────────────────────────────
-def get_medicine_suggestions(query):
+def get_medicine_suggestions(query, limit=5):
     query = query.lower()
     suggestions = []
-    # Iterate through all medicines in MEDICINE_INFO for partial matches
-    for medicine_name, info in MEDICINE_INFO.items():
-        if query in medicine_name.lower():
-            suggestions.append({
-                'name': medicine_name,
-                'uses': info.get('uses', 'Information not available'),
-                'side_effects': info.get('side_effects', 'Information not available')
-            })
-    return suggestions[:5]  # Return top 5 suggestions
+    if '\n' in query:
+        return suggestions
+    # Walk the partial matches in MEDICINE_INFO order, stopping at the top `limit`
+    pos = MEDICINE_INFO_BLOB.find(query)
+    while pos != -1 and len(suggestions) < limit:
+        index = bisect_right(MEDICINE_INFO_OFFSETS, pos) - 1
+        medicine_name = MEDICINE_INFO_NAMES[index]
+        info = MEDICINE_INFO[medicine_name]
+        suggestions.append({
+            'name': medicine_name,
+            'uses': info.get('uses', 'Information not available'),
+            'side_effects': info.get('side_effects', 'Information not available')
+        })
+        if index + 1 >= len(MEDICINE_INFO_NAMES):
+            break
+        pos = MEDICINE_INFO_BLOB.find(query, MEDICINE_INFO_OFFSETS[index + 1])
+    return suggestions
 
 def get_health_suggestions(condition):
     condition = condition.lower()
     suggested_medicines = []
-    # Iterate through the conditions to find a match
+    # Resolve query words to condition keys via the index; a word with no exact hit may still
+    # contain a key ('headaches', 'coughing')
+    matched = {key for key in CONDITION_PHRASE_KEYS if key in condition}
+    for word in CONDITION_TOKEN_RE.findall(condition):
+        key = CONDITION_INDEX.get(word)
+        if key:
+            matched.add(key)
+        else:
+            matched.update(key for key in CONDITION_WORD_KEYS if key in word)
+    if not matched:
+        # The whole query may be part of a key ('stomach', 'head')
+        matched = {key for key in HEALTH_CONDITIONS if condition in key}
     for key, medicines in HEALTH_CONDITIONS.items():
-        if condition in key or key in condition:
+        if key in matched:
             # If a match is found, retrieve detailed info for each suggested medicine
             for med_name in medicines:
-                medicine_details = MEDICINE_INFO.get(med_name, {
+                medicine_details = MEDICINE_INFO.get(MEDICINE_LOOKUP.get(med_name.casefold()), {
                     'uses': 'Information not available',
                     'side_effects': 'Information not available',
                     'dosage': 'Please consult your doctor'
@@ -690,63 +715,97 @@ def get_health_suggestions(condition):
     return suggested_medicines
 
 # ─── Helper: Normalize vertical text ──────────────────────────────────────────
+# Two or more consecutive single-character lines; the leading literal newline
+# lets the regex engine skip ahead between candidates
+VERTICAL_RUN_RE = re.compile(r'\n[^\W_](?:\n[^\W_])+(?![^\n])')
+
 def normalize_vertical(text):
-    lines = text.splitlines()
-    normalized = []
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        if len(line) == 1 and line.isalnum():
-            run = [line]
-            i += 1
-            while i < len(lines) and len(lines[i].strip()) == 1 and lines[i].strip().isalnum():
-                run.append(lines[i].strip())
-                i += 1
-            normalized.append("".join(run))
-        else:
-            normalized.append(line)
-            i += 1
-    return "\n".join(normalized)
+    stripped = "\n" + "\n".join(map(str.strip, text.splitlines()))
+    return VERTICAL_RUN_RE.sub(lambda m: "\n" + m.group(0).replace("\n", ""), stripped)[1:]
 
 # ─── Helper: Match from list of patterns ──────────────────────────────────────
 def find_first_match(text, patterns):
     for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+        match = pattern.search(text)
         if match:
             if len(match.groups()) > 0:
                 return match.group(1).strip()
     return "Information not available"
 
+def find_brand_name(text, text_lower=None):
+    """brand_name lookup that skips the literal brand regexes when no known stem is present"""
+    lowered = text.lower() if text_lower is None else text_lower
+    if any(stem in lowered for stem in KNOWN_BRAND_STEMS):
+        return find_first_match(text, PATTERNS['brand_name'])
+    return find_first_match(text, BRAND_FALLBACK_PATTERNS)
+
+def scan_fields(text, fields, text_lower=None):
+    """Run find_first_match for each PATTERNS field in `fields`; returns {field: value}"""
+    return {field: find_brand_name(text, text_lower) if field == 'brand_name' else find_first_match(text, PATTERNS[field])
+            for field in fields}
+
+# Fields /index extracts from OCR text; when the regexes find all of
+# REGEX_SUFFICIENT_FIELDS it skips the Gemini image call
+INDEX_FIELDS = ('brand_name', 'dosage', 'batch_number', 'mfd', 'expiry', 'manufacturer', 'mrp')
+REGEX_SUFFICIENT_FIELDS = ('brand_name', 'batch_number', 'mfd', 'expiry', 'mrp')
+
+
+def regex_found_key_fields(found):
+    """True when scan_fields results cover every REGEX_SUFFICIENT_FIELDS entry
+    (find_first_match's 'Information not available' counts as missing)"""
+    return all(found.get(field) not in (None, "Information not available") for field in REGEX_SUFFICIENT_FIELDS)
+
+# Looser batch-number patterns /index tries, in order, when no batch was extracted
+BATCH_FALLBACK_PATTERNS = [
+    re.compile(r"(?i)B\.?\s*No\.?\s*[:#.\-]?\s*([A-Z]?\d{4,}[A-Z0-9]*)"),
+    re.compile(r"(?i)Batch\s*[:#.\-]?\s*([A-Z]?\d{4,}[A-Z0-9]*)"),
+    re.compile(r"\b([A-Z]\d{5,})\b"),
+    re.compile(r'(\d{6,})'),
+]
+
+# First words of generic label text that clean_extracted_value rejects as a brand
+INVALID_BRAND_START_WORDS = frozenset({
+    'each', 'film', 'coated', 'tablet', 'capsule', 'contains', 'information',
+    'store', 'keep', 'protect', 'the', 'this', 'for', 'use',
+})
+
+LEAD_PUNCT_RE = re.compile(r'^[:\-\.\s]+')
+TRAIL_PUNCT_RE = re.compile(r'[:\-\.\s]+$')
+BRAND_GENERIC_TAIL_RE = re.compile(r'\s*(tablets?|capsules?|I\.?P\.?|B\.?P\.?)$', re.IGNORECASE)
+BATCH_ALNUM_RE = re.compile(r'[A-Z0-9]', re.IGNORECASE)
+MRP_NUMBER_RE = re.compile(r'(\d+(?:[.,]\d{1,2})?)')
+
 def clean_extracted_value(value, field_type="text"):
     """Clean and validate extracted values"""
     if not value or value == "Information not available":
         return None
-    
-    value = str(value).strip()
-    
+    return clean_value_string(str(value).strip(), field_type)
+
+@functools.lru_cache(maxsize=1024)
+def clean_value_string(value, field_type):
+    """Cached body of clean_extracted_value; the same short values recur across requests"""
     # Remove common noise
-    value = re.sub(r'^[:\-\.\s]+', '', value)  # Remove leading punctuation
-    value = re.sub(r'[:\-\.\s]+$', '', value)  # Remove trailing punctuation
+    value = LEAD_PUNCT_RE.sub('', value)  # Remove leading punctuation
+    value = TRAIL_PUNCT_RE.sub('', value)  # Remove trailing punctuation
     
     if field_type == "brand":
         # Filter out invalid brand names
-        invalid_starts = ['each', 'film', 'coated', 'tablet', 'capsule', 'contains', 
-                         'information', 'store', 'keep', 'protect', 'the', 'this', 'for', 'use']
-        if value.lower().split()[0] if value.split() else '' in invalid_starts:
+        words = value.lower().split()
+        if not words or words[0] in INVALID_BRAND_START_WORDS:
             return None
         # Remove trailing generic terms
-        value = re.sub(r'\s*(tablets?|capsules?|I\.?P\.?|B\.?P\.?)$', '', value, flags=re.IGNORECASE)
+        value = BRAND_GENERIC_TAIL_RE.sub('', value)
     
     elif field_type == "batch":
         # Batch should be alphanumeric
-        if not re.search(r'[A-Z0-9]', value, re.IGNORECASE):
+        if not BATCH_ALNUM_RE.search(value):
             return None
         # Clean batch number
-        value = re.sub(r'^[:\-\.\s]+', '', value)
+        value = LEAD_PUNCT_RE.sub('', value)
     
     elif field_type == "mrp":
         # Extract just the number
-        match = re.search(r'(\d+(?:[.,]\d{1,2})?)', value)
+        match = MRP_NUMBER_RE.search(value)
         if match:
             value = match.group(1).replace(',', '.')
         else:
@@ -758,6 +817,31 @@ def clean_extracted_value(value, field_type="text"):
     
     return value if value else None
 
+# Month name mapping for label dates
+MONTH_MAP = {
+    'jan': 1, 'january': 1,
+    'feb': 2, 'february': 2,
+    'mar': 3, 'march': 3,
+    'apr': 4, 'april': 4,
+    'may': 5,
+    'jun': 6, 'june': 6,
+    'jul': 7, 'july': 7,
+    'aug': 8, 'august': 8,
+    'sep': 9, 'sept': 9, 'september': 9,
+    'oct': 10, 'october': 10,
+    'nov': 11, 'november': 11,
+    'dec': 12, 'december': 12
+}
+# Canonical "JAN.24" / "DEC 2026" label form, matched on the uppercased string
+MMM_YY_RE = re.compile(r'^([A-Z]{3})\.?\s*(\d{2,4})$', re.ASCII)
+# parse_date_string patterns, tried in order
+LABEL_MONTH_YEAR_RE = re.compile(r"(?i)\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*[.\-/\s]*(\d{2,4})\b", re.ASCII)
+LABEL_MM_YY_RE = re.compile(r"\b(\d{1,2})[./-](\d{2,4})\b", re.ASCII)
+LABEL_YEAR_RE = re.compile(r"\b(20\d{2})\b", re.ASCII)
+LABEL_YY_RE = re.compile(r"\b(\d{2})\b", re.ASCII)
+DOT_DIGIT_RE = re.compile(r'\.(\d)', re.ASCII)
+WHITESPACE_RUN_RE = re.compile(r'\s+')
+
 def parse_date_flexible(date_str):
     """Parse various date formats commonly found on Indian medicine labels. Return date or None."""
     if not date_str:
@@ -769,23 +853,12 @@ def parse_date_flexible(date_str):
         return None
     
     logger.info(f"Parsing date: '{s}'")
-    
-    # Month name mapping
-    month_map = {
-        'jan': 1, 'january': 1,
-        'feb': 2, 'february': 2,
-        'mar': 3, 'march': 3,
-        'apr': 4, 'april': 4,
-        'may': 5,
-        'jun': 6, 'june': 6,
-        'jul': 7, 'july': 7,
-        'aug': 8, 'august': 8,
-        'sep': 9, 'sept': 9, 'september': 9,
-        'oct': 10, 'october': 10,
-        'nov': 11, 'november': 11,
-        'dec': 12, 'december': 12
-    }
-    
+    return parse_date_string(s, datetime.utcnow().year)
+
+@functools.lru_cache(maxsize=4096)
+def parse_date_string(s, current_year):
+    """Cached core of parse_date_flexible; the same label strings recur across passes.
+    current_year bounds the accepted years, and keys the cache so entries don't outlive it"""
     # Helper to convert 2-digit year to 4-digit
     def fix_year(y):
         if y < 100:
@@ -794,15 +867,22 @@ def parse_date_flexible(date_str):
     
     # Helper to validate year range
     def valid_year(y):
-        return 1990 <= y <= datetime.utcnow().year + 20
+        return 1990 <= y <= current_year + 20
+    
+    # Fast path: canonical "JAN.24" / "DEC 2026"
+    m = MMM_YY_RE.match(s.upper())
+    if m and m.group(1).lower() in MONTH_MAP:
+        yyyy = fix_year(int(m.group(2)))
+        if valid_year(yyyy):
+            return datetime(yyyy, MONTH_MAP[m.group(1).lower()], 1).date()
     
     # Pattern 1: "JAN.24", "DEC.26", "JAN 24", "DEC 26", "JAN-24"
-    m = re.search(r"(?i)\b(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*[.\-/\s]*(\d{2,4})\b", s)
+    m = LABEL_MONTH_YEAR_RE.search(s)
     if m:
         try:
             month_str = m.group(1).lower()[:3]
             year_str = m.group(2)
-            mm = month_map.get(month_str, 1)
+            mm = MONTH_MAP.get(month_str, 1)
             yyyy = fix_year(int(year_str))
             if valid_year(yyyy):
                 logger.info(f"Parsed date (pattern 1): {mm}/{yyyy}")
@@ -811,7 +891,7 @@ def parse_date_flexible(date_str):
             logger.warning(f"Date parse error (pattern 1): {e}")
     
     # Pattern 2: "01/24", "12/26", "01/2024", "12/2026" (MM/YY or MM/YYYY)
-    m = re.search(r"\b(\d{1,2})[./-](\d{2,4})\b", s)
+    m = LABEL_MM_YY_RE.search(s)
     if m:
         try:
             mm = int(m.group(1))
@@ -823,7 +903,7 @@ def parse_date_flexible(date_str):
             logger.warning(f"Date parse error (pattern 2): {e}")
     
     # Pattern 3: "2024", "2026" (year only)
-    m = re.search(r"\b(20\d{2})\b", s)
+    m = LABEL_YEAR_RE.search(s)
     if m:
         try:
             yyyy = int(m.group(1))
@@ -834,7 +914,7 @@ def parse_date_flexible(date_str):
             logger.warning(f"Date parse error (pattern 3): {e}")
     
     # Pattern 4: "24", "26" (2-digit year only, assume current decade)
-    m = re.search(r"\b(\d{2})\b", s)
+    m = LABEL_YY_RE.search(s)
     if m:
         try:
             yyyy = fix_year(int(m.group(1)))
@@ -853,8 +933,8 @@ def parse_date_flexible(date_str):
     ]
     
     # Normalize: JAN.24 -> JAN 24
-    s_normalized = re.sub(r'\.(\d)', r' \1', s)
-    s_normalized = re.sub(r'\s+', ' ', s_normalized).strip()
+    s_normalized = DOT_DIGIT_RE.sub(r' \1', s)
+    s_normalized = WHITESPACE_RUN_RE.sub(' ', s_normalized).strip()
     
     for fmt in fmts:
         try:
@@ -869,9 +949,13 @@ def parse_date_flexible(date_str):
         except Exception:
             continue
     
-    logger.warning(f"Could not parse date: '{date_str}'")
+    logger.warning(f"Could not parse date: '{s}'")
     return None
 
+# Loose month / year lookups parse_date_from_gemini falls back to
+GEMINI_MONTH_RE = re.compile(r"(?i)(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)")
+GEMINI_YEAR_RE = re.compile(r"(\d{2,4})")
+
 def parse_date_from_gemini(date_str):
     """Parse date string from Gemini response - handles exact formats like JAN.24, DEC.26"""
     if not date_str:
@@ -886,17 +970,12 @@ def parse_date_from_gemini(date_str):
         return result
     
     # Additional patterns specific to Gemini output
-    month_map = {
-        'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-        'jul': 7, 'aug': 8, 'sep': 9, 'sept': 9, 'oct': 10, 'nov': 11, 'dec': 12
-    }
-    
     # Try to find any month name and any number
-    m = re.search(r"(?i)(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)", s)
+    m = GEMINI_MONTH_RE.search(s)
     if m:
-        month = month_map.get(m.group(1).lower()[:3], 1)
+        month = MONTH_MAP.get(m.group(1).lower()[:3], 1)
         # Find year number
-        y = re.search(r"(\d{2,4})", s)
+        y = GEMINI_YEAR_RE.search(s)
         if y:
             year = int(y.group(1))
             if year < 100:
@@ -906,21 +985,28 @@ def parse_date_from_gemini(date_str):
     
     return None
 
+# One pass for Month YYYY, MM/YYYY, MM-YYYY, and standalone valid years; the
+# alternatives cannot start at the same position, and a year embedded in the
+# first two forms is captured so it is still counted as a standalone year
+DATE_CANDIDATE_RE = re.compile(
+    r"(?i)\b(?:(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\s+(\d{4})"
+    r"|\d{1,2}[./-](\d{2,4})"
+    r"|(?:19|20)\d{2})\b",
+    re.ASCII,
+)
+SHELF_LIFE_RE = re.compile(r"(?i)\b(best\s*before|use\s*before|shelf\s*life)\s*(\d{1,2})\s*months?\b", re.ASCII)
+SHELF_LIFE_FROM_MFG_RE = re.compile(r"(?i)\b(\d{1,2})\s*months?\s*(?:from|after)\s*(?:mfg|manufacture|manufacturing)\b", re.ASCII)
+
 # Collect all plausible dates from text for heuristic reconciliation
 def find_date_candidates(text):
     candidates = []
     if not text:
         return candidates
-    # Patterns: Month YYYY, MM/YYYY, MM-YYYY, and standalone valid years
-    patterns = [
-        r"(?i)\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\s+\d{4}\b",
-        r"\b\d{1,2}[./-]\d{2,4}\b",
-        r"\b(?:19|20)\d{2}\b",
-    ]
     seen = set()
-    for pat in patterns:
-        for m in re.finditer(pat, text):
-            raw = m.group(0).strip()
+    for m in DATE_CANDIDATE_RE.finditer(text):
+        year = m.group(1) or m.group(2)
+        tokens = (m.group(0), year) if year and len(year) == 4 and year[:2] in ('19', '20') else (m.group(0),)
+        for raw in tokens:
             if raw in seen:
                 continue
             seen.add(raw)
@@ -934,24 +1020,22 @@ def find_date_candidates(text):
 def add_months(d, months):
     if not d:
         return None
-    y = d.year + (d.month - 1 + months) // 12
-    m = (d.month - 1 + months) % 12 + 1
-    day = min(d.day, 28)
-    try:
-        return datetime(y, m, day).date()
-    except Exception:
-        return datetime(y, m, 1).date()
+    total = d.month - 1 + months
+    y = d.year + total // 12
+    m = total % 12 + 1
+    # Clamp to the target month's length (Jan 31 + 1 month -> Feb 28/29)
+    return date(y, m, min(d.day, calendar.monthrange(y, m)[1]))
 
 def shelf_life_months(text):
     if not text:
         return None
-    m = re.search(r"(?i)\b(best\s*before|use\s*before|shelf\s*life)\s*(\d{1,2})\s*months?\b", text)
+    m = SHELF_LIFE_RE.search(text)
     if m:
         try:
             return int(m.group(2))
         except Exception:
             return None
-    m = re.search(r"(?i)\b(\d{1,2})\s*months?\s*(?:from|after)\s*(?:mfg|manufacture|manufacturing)\b", text)
+    m = SHELF_LIFE_FROM_MFG_RE.search(text)
     if m:
         try:
             return int(m.group(1))
@@ -960,6 +1044,9 @@ def shelf_life_months(text):
     return None
 
 def reconcile_dates_from_text(full_text, mfd_dt, exp_dt):
+    if mfd_dt and exp_dt and exp_dt >= mfd_dt:
+        # Already consistent; don't rescan the text for date candidates
+        return mfd_dt, exp_dt
     candidates = find_date_candidates(full_text)
     life = shelf_life_months(full_text)
     now = datetime.utcnow().date()
@@ -995,49 +1082,65 @@ def _compile_date_regex():
     month = r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?\s+\d{2,4}"
     mmYY = r"\d{1,2}[./-]\d{2,4}"
     year = r"(?:19|20)\d{2}"
-    return re.compile(rf"\b({month}|{mmYY}|{year})\b", re.IGNORECASE)
+    return re.compile(rf"\b({month}|{mmYY}|{year})\b", re.IGNORECASE | re.ASCII)
 
 DATE_TOKEN_RE = _compile_date_regex()
+# Separate month / year tokens, combined when a label has "JAN 2024"-style dates split by noise
+MONTH_TOKEN_RE = re.compile(r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?\b", re.IGNORECASE | re.ASCII)
+YEAR_TOKEN_RE = re.compile(r"\b(?:19|20)\d{2}\b", re.ASCII)
+
+@functools.lru_cache(maxsize=16)
+def labeled_keyword_regex(keywords):
+    """Case-insensitive alternation of label keywords, e.g. ('mfg', 'mfd')"""
+    return re.compile("|".join(re.escape(k) for k in keywords), re.IGNORECASE)
 
-def find_labeled_date_dt(text, keywords):
+def find_labeled_date_dt(text, keywords, text_lower=None):
     """Find a date token near any of the given keywords within the same or next line.
-    Returns a parsed date or None. Keeps changes local and robust for medicine strips."""
+    Returns a parsed date or None. Keeps changes local and robust for medicine strips.
+    text_lower may be passed when the caller already has text.lower()."""
     if not text:
         return None
-    lines = text.splitlines()
     # Build a case-insensitive search set
     kws = [k.lower() for k in keywords]
-    for i, line in enumerate(lines):
-        low = line.lower()
-        if any(k in low for k in kws):
-            # Avoid picking dates from license numbers like "Mfg Lic No: ... 2012"
-            if "lic" in low or "license" in low:
-                continue
-            scope = line
-            if i + 1 < len(lines):
-                scope = scope + " " + lines[i + 1]
-            # Try to find date token near the keyword
-            m = DATE_TOKEN_RE.search(scope)
-            if m:
-                dt = parse_date_flexible(m.group(0))
-                if dt:
-                    return dt
-            # If not found, try to combine month token and year token within a small window
-            mon_re = re.compile(r"(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?\b", re.IGNORECASE)
-            yr_re = re.compile(r"\b(?:19|20)\d{2}\b")
-            mons = list(mon_re.finditer(scope))
-            yrs = list(yr_re.finditer(scope))
-            if mons and yrs:
-                # pick closest year after a month within 12 chars
-                for mon in mons:
-                    for yr in yrs:
-                        if yr.start() >= mon.end() and (yr.start() - mon.end()) <= 12:
-                            candidate = scope[mon.start():yr.end()]
-                            dt = parse_date_flexible(candidate)
-                            if dt:
-                                return dt
+    # Rejoin on "\n" so every splitlines() boundary is a single character, then
+    # let one regex pass find the keyword lines instead of testing each line
+    norm = "\n".join(text.splitlines())
+    line_end = -1
+    for kw in labeled_keyword_regex(tuple(kws)).finditer(norm):
+        if kw.start() <= line_end:
+            continue  # line already handled
+        line_start = norm.rfind("\n", 0, kw.start()) + 1
+        line_end = norm.find("\n", kw.end())
+        if line_end == -1:
+            line_end = len(norm)
+        line = norm[line_start:line_end]
+        # Avoid picking dates from license numbers like "Mfg Lic No: ... 2012"
+        if "lic" in line.lower():
+            continue
+        scope = line
+        if line_end < len(norm):
+            next_end = norm.find("\n", line_end + 1)
+            scope = scope + " " + norm[line_end + 1:next_end if next_end != -1 else len(norm)]
+        # Try to find date token near the keyword
+        m = DATE_TOKEN_RE.search(scope)
+        if m:
+            dt = parse_date_flexible(m.group(0))
+            if dt:
+                return dt
+        # If not found, try to combine month token and year token within a small window
+        mons = list(MONTH_TOKEN_RE.finditer(scope))
+        yrs = list(YEAR_TOKEN_RE.finditer(scope))
+        if mons and yrs:
+            # pick closest year after a month within 12 chars
+            for mon in mons:
+                for yr in yrs:
+                    if yr.start() >= mon.end() and (yr.start() - mon.end()) <= 12:
+                        candidate = scope[mon.start():yr.end()]
+                        dt = parse_date_flexible(candidate)
+                        if dt:
+                            return dt
     # Fallback: window search after keyword anywhere in text
-    low_text = text.lower()
+    low_text = text.lower() if text_lower is None else text_lower
     for k in kws:
         idx = low_text.find(k)
         if idx != -1:
@@ -1048,10 +1151,8 @@ def find_labeled_date_dt(text, keywords):
                 if dt:
                     return dt
             # Combine month/year as above if needed
-            mon_re = re.compile(r"(?i)(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?\b")
-            yr_re = re.compile(r"\b(?:19|20)\d{2}\b")
-            mons = list(mon_re.finditer(window))
-            yrs = list(yr_re.finditer(window))
+            mons = list(MONTH_TOKEN_RE.finditer(window))
+            yrs = list(YEAR_TOKEN_RE.finditer(window))
             if mons and yrs:
                 for mon in mons:
                     for yr in yrs:
@@ -1063,6 +1164,123 @@ def find_labeled_date_dt(text, keywords):
     return None
 
 # ─── OCR Helpers (Vision with Gemini fallback) ───────────────────────────────
+# Recent OCR results keyed by a hash of the uploaded image, so re-uploads skip OCR
+OCR_CACHE = OrderedDict()
+OCR_CACHE_SIZE = 128
+# Entries hold prescription/label contents, so they are only kept for a short while (seconds)
+OCR_CACHE_TTL = 3600
+OCR_CACHE_LOCK = threading.Lock()
+# Keys being computed right now; a second caller waits for the first instead of repeating the call
+OCR_IN_FLIGHT = {}
+
+
+def image_digest(image_content):
+    """Short stable hash of image bytes for cache keys"""
+    return hashlib.blake2b(image_content, digest_size=16).hexdigest()
+
+
+# Decoded uploads keyed by image_digest, so the OCR backends of one request share a decode
+# without the cache keeping the raw upload bytes alive
+DECODED_IMAGES = OrderedDict()
+DECODED_IMAGES_MAX = 2
+DECODED_IMAGES_LOCK = threading.Lock()
+
+
+def decode_image(image_content):
+    """Decode uploaded image bytes once; use open_image to get a private copy"""
+    key = image_digest(image_content)
+    with DECODED_IMAGES_LOCK:
+        image_pil = DECODED_IMAGES.get(key)
+        if image_pil is not None:
+            DECODED_IMAGES.move_to_end(key)
+            return image_pil
+    buffer = io.BytesIO(image_content)
+    image_pil = Image.open(buffer)
+    image_pil.load()
+    # PIL keeps a reference to the buffer; closing it releases the copy of the upload
+    buffer.close()
+    with DECODED_IMAGES_LOCK:
+        DECODED_IMAGES[key] = image_pil
+        while len(DECODED_IMAGES) > DECODED_IMAGES_MAX:
+            DECODED_IMAGES.popitem(last=False)
+    return image_pil
+
+
+def open_image(image_content):
+    """PIL image for the upload, decoded at most once across the OCR backends"""
+    return decode_image(image_content).copy()
+
+
+def cache_by_image(func):
+    """Memoize func(image_content) in OCR_CACHE (LRU, entries expire after OCR_CACHE_TTL);
+    None results are not cached. Concurrent calls for the same image share one computation."""
+    @functools.wraps(func)
+    def wrapper(image_content):
+        key = (func.__name__, image_digest(image_content))
+        while True:
+            with OCR_CACHE_LOCK:
+                entry = OCR_CACHE.get(key)
+                if entry is not None:
+                    expires_at, result = entry
+                    if expires_at > time.monotonic():
+                        OCR_CACHE.move_to_end(key)
+                        logger.info("%s: using cached result for image %s", func.__name__, key[1])
+                        return list(result) if isinstance(result, list) else result
+                    del OCR_CACHE[key]
+                pending = OCR_IN_FLIGHT.get(key)
+                if pending is None:
+                    pending = OCR_IN_FLIGHT[key] = threading.Event()
+                    break
+            # Another thread is running func for this image; re-check the cache once it is done
+            # (it may have returned None, in which case this thread tries itself)
+            pending.wait()
+        
+        try:
+            result = func(image_content)
+            if result is not None:
+                with OCR_CACHE_LOCK:
+                    OCR_CACHE[key] = (time.monotonic() + OCR_CACHE_TTL,
+                                      list(result) if isinstance(result, list) else result)
+                    while len(OCR_CACHE) > OCR_CACHE_SIZE:
+                        OCR_CACHE.popitem(last=False)
+        finally:
+            with OCR_CACHE_LOCK:
+                del OCR_IN_FLIGHT[key]
+            pending.set()
+        return result
+    return wrapper
+
+
+VISION_MAX_SIDE = 1024
+# Prescription handwriting stays legible at this size; larger photos only add upload bytes and tokens
+GEMINI_PRESCRIPTION_MAX_SIDE = 1600
+
+
+def shrink_for_vision(image_content, max_side=VISION_MAX_SIDE):
+    """Downscale to max_side on the longest edge and re-encode as JPEG before sending to Vision.
+    Returns the original bytes if the image is already small or can't be decoded."""
+    try:
+        image_pil = Image.open(io.BytesIO(image_content))
+        if max(image_pil.size) <= max_side:
+            return image_content
+        image_pil.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image_pil.mode not in ('RGB', 'L'):
+            image_pil = image_pil.convert('RGB')
+        buf = io.BytesIO()
+        image_pil.save(buf, 'JPEG', quality=85, optimize=True)
+        shrunk = buf.getvalue()
+        logger.info("Vision upload shrunk from %d to %d bytes", len(image_content), len(shrunk))
+        return shrunk if len(shrunk) < len(image_content) else image_content
+    except Exception as e:
+        logger.warning(f"Could not shrink image for Vision, sending original: {e}")
+        return image_content
+
+
+def vision_image(image_content):
+    """Build a Vision Image from uploaded bytes, downscaled for a smaller request"""
+    return get_vision().Image(content=shrink_for_vision(image_content))
+
+
 def is_billing_disabled_error(e):
     try:
         msg = str(e)
@@ -1070,93 +1288,33 @@ def is_billing_disabled_error(e):
     except Exception:
         return False
 
-def gemini_extract_text(image_content):
+@cache_by_image
+def gemini_extract_all(image_content):
+    """One Gemini request for both the label transcription and the structured fields.
+    Returns (text, fields) with either part possibly None, or None on failure."""
     try:
         if not GEMINI_AVAILABLE:
             logger.warning("Gemini not available for OCR fallback")
             return None
-
         gemini_api_key = os.environ.get('GEMINI_API_KEY') or GEMINI_API_KEY_FALLBACK
         if not gemini_api_key:
             logger.warning("No GEMINI_API_KEY set for OCR fallback")
             return None
-
-        import google.generativeai as genai
-        genai.configure(api_key=gemini_api_key)
-
-        # Open image
-        from io import BytesIO
-        import PIL.Image
-        try:
-            image_pil = PIL.Image.open(BytesIO(image_content))
-        except Exception as img_err:
-            logger.error(f"Gemini OCR: failed to open image: {img_err}")
-            return None
-
-        # Try preferred models
-        preferred = ['models/gemini-2.0-flash', 'models/gemini-2.5-flash']
-        model = None
-        for name in preferred:
-            try:
-                model = genai.GenerativeModel(name)
-                break
-            except Exception as me:
-                logger.warning(f"Gemini OCR: could not init {name}: {me}")
-                continue
-        if model is None:
-            logger.error("Gemini OCR: no model initialized")
-            return None
-
-        prompt = (
-            "Transcribe ALL visible text from this medicine package/strip label image. "
-            "Include: product name, generic name, batch number (B.No.), MFG date, EXP date, MRP, manufacturer name. "
-            "Return plain text only, preserve the original format and numbers exactly as shown."
-        )
-        try:
-            resp = model.generate_content([prompt, image_pil])
-            text = (resp.text or '').strip()
-            return text if text else None
-        except Exception as api_err:
-            logger.error(f"Gemini OCR: API error: {api_err}")
-            return None
-    except Exception as e:
-        logger.error(f"Gemini OCR unexpected error: {e}")
-        return None
-
-def gemini_extract_fields_from_image(image_content):
-    """Use Gemini to directly extract structured fields from medicine image. Returns dict or None."""
-    try:
-        if not GEMINI_AVAILABLE:
-            return None
-        gemini_api_key = os.environ.get('GEMINI_API_KEY') or GEMINI_API_KEY_FALLBACK
-        if not gemini_api_key:
-            return None
-        
-        import google.generativeai as genai
-        genai.configure(api_key=gemini_api_key)
         
-        from io import BytesIO
-        import PIL.Image
         try:
-            image_pil = PIL.Image.open(BytesIO(image_content))
+            image_pil = open_image(image_content)
         except Exception as img_err:
-            logger.error(f"Gemini field extraction: failed to open image: {img_err}")
+            logger.error(f"Gemini extraction: failed to open image: {img_err}")
             return None
         
-        # Initialize model
-        model = None
-        for name in ['models/gemini-2.0-flash', 'models/gemini-2.5-flash']:
-            try:
-                model = genai.GenerativeModel(name)
-                break
-            except Exception:
-                continue
+        model = get_gemini_model(gemini_api_key)
         if model is None:
+            logger.error("Gemini extraction: no model initialized")
             return None
         
         prompt = """You are an expert pharmacist analyzing Indian medicine strip/blister pack images.
 
-TASK: Extract medicine information from this image with HIGH ACCURACY.
+TASK: Transcribe ALL visible text from this image and extract medicine information with HIGH ACCURACY.
 
 CRITICAL READING INSTRUCTIONS:
 1. Medicine strips have text in MULTIPLE ORIENTATIONS - read ALL directions (horizontal, vertical, upside down)
@@ -1207,9 +1365,12 @@ SPECIFIC MEDICINE PATTERNS TO RECOGNIZE:
 - RABEMI-DSR: Rabeprazole + Domperidone capsules, blue/white, Paalmi/Renewed Life
 
 OUTPUT FORMAT - Return ONLY this JSON (no other text):
-{"brand": "", "dosage": "", "batch_number": "", "manufacture_date": "", "expiry_date": "", "manufacturer": "", "mrp": ""}
+{"raw_text": "", "fields": {"brand": "", "dosage": "", "batch_number": "", "manufacture_date": "", "expiry_date": "", "manufacturer": "", "mrp": ""}}
+
+raw_text: ALL visible text (product name, generic name, B.No., MFG date, EXP date, MRP, manufacturer),
+preserving the original format and numbers exactly as shown, one printed line per line.
 
-REAL EXAMPLES:
+REAL "fields" EXAMPLES:
 {"brand": "BIFILAC", "dosage": "", "batch_number": "ALA306", "manufacture_date": "10/2023", "expiry_date": "09/2025", "manufacturer": "TOA Pharmaceuticals", "mrp": "140.00"}
 {"brand": "O2", "dosage": "200 mg + 500 mg", "batch_number": "E40001", "manufacture_date": "JAN.24", "expiry_date": "DEC.26", "manufacturer": "Meyer Organics", "mrp": "189.00"}
 {"brand": "Dolo-650", "dosage": "650 mg", "batch_number": "D0983759", "manufacture_date": "AUG.2024", "expiry_date": "JUL.2028", "manufacturer": "Micro Labs", "mrp": "35.70"}
@@ -1218,53 +1379,53 @@ REAL EXAMPLES:
 Use "" for fields you cannot find. Return ONLY the JSON."""
 
         try:
-            resp = model.generate_content([prompt, image_pil])
+            resp = call_with_backoff(model.generate_content, [prompt, image_pil])
             text = (resp.text or '').strip()
-            logger.info(f"Gemini direct extraction response: {text[:500]}")
-            
-            # Clean and parse JSON
-            text = text.replace('```json', '').replace('```', '').strip()
-            import json as _json
-            try:
-                data = _json.loads(text)
-                if isinstance(data, dict):
-                    logger.info(f"Gemini extracted fields: {data}")
-                    return data
-            except Exception:
-                # Try to find JSON in response
-                import re as _re
-                m = _re.search(r"\{[\s\S]*\}", text)
-                if m:
-                    try:
-                        data = _json.loads(m.group(0))
-                        if isinstance(data, dict):
-                            return data
-                    except Exception:
-                        pass
-            return None
+            logger.info("Gemini combined extraction response: %.500s", text)
         except Exception as api_err:
-            logger.error(f"Gemini field extraction API error: {api_err}")
+            logger.error(f"Gemini extraction API error: {api_err}")
+            return None
+        if not text:
             return None
+        
+        # Clean and parse JSON
+        cleaned = text.replace('```json', '').replace('```', '').strip()
+        data = None
+        try:
+            data = json.loads(cleaned)
+        except Exception:
+            # Try to find JSON in response
+            m = JSON_OBJECT_RE.search(cleaned)
+            if m:
+                try:
+                    data = json.loads(m.group(0))
+                except Exception:
+                    data = None
+        if not isinstance(data, dict):
+            # Not JSON at all: keep the reply as a plain transcription
+            return cleaned, None
+        
+        raw_text = str(data.get('raw_text') or '').strip() or None
+        fields = data.get('fields')
+        if not isinstance(fields, dict):
+            fields = None
+        logger.info("Gemini extracted fields: %s", fields)
+        return raw_text, fields
     except Exception as e:
-        logger.error(f"Gemini field extraction error: {e}")
+        logger.error(f"Gemini extraction unexpected error: {e}")
         return None
 
-def preprocess_medicine_strip_image(image_pil):
+def preprocess_medicine_strip_image(image_pil, image_content=None):
     """
     Advanced image preprocessing for medicine strip/blister pack images.
     Handles reflective surfaces, multiple text orientations, and small print.
-    Uses OpenCV for better preprocessing when available.
+    Uses OpenCV for better preprocessing when available (returns a uint8 ndarray then).
     """
-    from PIL import Image, ImageEnhance, ImageFilter, ImageOps
-    import numpy as np
-    
     try:
-        # Try to use OpenCV for better preprocessing
-        try:
-            import cv2
-            return preprocess_with_opencv(image_pil)
-        except ImportError:
-            logger.info("OpenCV not available, using PIL preprocessing")
+        # Use OpenCV for better preprocessing when it is installed
+        if cv2 is not None:
+            return preprocess_with_opencv(image_pil, image_content)
+        logger.info("OpenCV not available, using PIL preprocessing")
         
         # Fallback to PIL-based preprocessing
         # Convert to RGB if needed
@@ -1273,7 +1434,7 @@ def preprocess_medicine_strip_image(image_pil):
         
         # Get image dimensions
         width, height = image_pil.size
-        logger.info(f"Preprocessing image: {width}x{height}")
+        logger.info("Preprocessing image: %dx%d", width, height)
         
         # 1. Resize if too small (Tesseract works better with larger images)
         min_dimension = 1500
@@ -1281,7 +1442,7 @@ def preprocess_medicine_strip_image(image_pil):
             scale = max(min_dimension / width, min_dimension / height)
             new_size = (int(width * scale), int(height * scale))
             image_pil = image_pil.resize(new_size, Image.LANCZOS)
-            logger.info(f"Resized to: {new_size}")
+            logger.info("Resized to: %s", new_size)
         
         # 2. Convert to grayscale
         gray = image_pil.convert('L')
@@ -1295,16 +1456,19 @@ def preprocess_medicine_strip_image(image_pil):
         gray = enhancer.enhance(2.0)
         
         # 5. Apply adaptive thresholding using numpy
-        img_array = np.array(gray)
+        img_array = np.asarray(gray)
         
         # Simple adaptive threshold: compare each pixel to local mean
-        from PIL import ImageFilter
         blurred = gray.filter(ImageFilter.GaussianBlur(radius=11))
         blurred_array = np.array(blurred)
         
-        # Threshold: pixel is white if brighter than local average - offset
+        # Threshold: pixel is white if brighter than local average - offset.
+        # Work in uint8 buffers in place (no int64 np.where temporary); the
+        # subtraction wraps exactly as the uint8 expression always has
         offset = 10
-        binary_array = np.where(img_array > blurred_array - offset, 255, 0).astype(np.uint8)
+        np.subtract(blurred_array, offset, out=blurred_array, casting='unsafe')
+        binary_array = np.greater(img_array, blurred_array).view(np.uint8)
+        binary_array *= 255
         binary_img = Image.fromarray(binary_array, mode='L')
         
         # 6. Denoise with median filter
@@ -1320,48 +1484,73 @@ def preprocess_medicine_strip_image(image_pil):
         return image_pil.convert('L') if image_pil.mode != 'L' else image_pil
 
 
-def preprocess_with_opencv(image_pil):
+# Per-thread OpenCV state reused across requests: cv2's CLAHE keeps its LUT and scratch
+# buffers on the object, and the unsharp-mask blur gets a scratch image of the last size used
+OPENCV_LOCAL = threading.local()
+
+# Closing kernel for the binarised strip image
+MORPH_CLOSE_KERNEL = np.ones((2, 2), np.uint8)
+
+
+def get_clahe():
+    """This thread's CLAHE object (clip limit 3, 8x8 tiles), created on first use"""
+    clahe = getattr(OPENCV_LOCAL, 'clahe', None)
+    if clahe is None:
+        clahe = OPENCV_LOCAL.clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    return clahe
+
+
+def get_scratch_image(shape):
+    """This thread's uint8 scratch buffer of `shape`; reallocated only when the size changes"""
+    scratch = getattr(OPENCV_LOCAL, 'scratch', None)
+    if scratch is None or scratch.shape != shape:
+        scratch = OPENCV_LOCAL.scratch = np.empty(shape, np.uint8)
+    return scratch
+
+
+def preprocess_with_opencv(image_pil, image_content=None):
     """
     OpenCV-based preprocessing for medicine strip images.
     Provides better results for reflective/metallic surfaces.
+    Returns the binarised uint8 ndarray, which the OCR passes take as-is.
     """
-    import cv2
-    import numpy as np
-    from PIL import Image
-    
-    # Convert PIL to OpenCV format
-    if image_pil.mode != 'RGB':
-        image_pil = image_pil.convert('RGB')
+    # 1. Decode the upload straight to grayscale; EXIF orientation is ignored
+    # so the result lines up with the PIL image the other passes use
+    gray = None
+    if image_content is not None:
+        gray = cv2.imdecode(np.frombuffer(image_content, np.uint8),
+                            cv2.IMREAD_GRAYSCALE | cv2.IMREAD_IGNORE_ORIENTATION)
+    if gray is None:
+        gray = np.asarray(image_pil.convert('L'))
     
-    img = np.array(image_pil)
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    height, width = gray.shape
+    logger.info("OpenCV preprocessing: %dx%d", width, height)
     
-    height, width = img.shape[:2]
-    logger.info(f"OpenCV preprocessing: {width}x{height}")
-    
-    # 1. Resize if too small
+    # 2. Resize: cap the long side at max_dimension (every filter below scales with
+    # pixel count and Tesseract gains nothing past ~300 DPI), upscale only small images
     min_dimension = 1500
-    if width < min_dimension or height < min_dimension:
-        scale = max(min_dimension / width, min_dimension / height)
-        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
-        logger.info(f"Resized to: {img.shape[1]}x{img.shape[0]}")
-    
-    # 2. Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    max_dimension = 2000
+    if max(width, height) > max_dimension:
+        scale = max_dimension / max(width, height)
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        logger.info("Downscaled to: %dx%d", gray.shape[1], gray.shape[0])
+    elif width < min_dimension and height < min_dimension:
+        scale = min(max(min_dimension / width, min_dimension / height), max_dimension / max(width, height))
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        logger.info("Resized to: %dx%d", gray.shape[1], gray.shape[0])
     
     # 3. Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
     # This is excellent for handling reflective surfaces and uneven lighting
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-    gray = clahe.apply(gray)
+    gray = get_clahe().apply(gray)
     
     # 4. Denoise while preserving edges
     gray = cv2.bilateralFilter(gray, 9, 75, 75)
     
-    # 5. Sharpen the image
-    kernel_sharpen = np.array([[-1, -1, -1],
-                               [-1,  9, -1],
-                               [-1, -1, -1]])
-    gray = cv2.filter2D(gray, -1, kernel_sharpen)
+    # 5. Gentle unsharp mask; the old dense 9/-1 kernel re-injected the noise
+    # bilateralFilter had just removed and adaptiveThreshold amplified it.
+    # Saturating uint8 arithmetic, written back into the bilateral output buffer
+    blurred = cv2.GaussianBlur(gray, (0, 0), 1.0, dst=get_scratch_image(gray.shape))
+    cv2.addWeighted(gray, 1.5, blurred, -0.5, 0, dst=gray)
     
     # 6. Apply adaptive thresholding (better for varying lighting on medicine strips)
     binary = cv2.adaptiveThreshold(
@@ -1370,38 +1559,61 @@ def preprocess_with_opencv(image_pil):
     )
     
     # 7. Morphological operations to clean up
-    kernel = np.ones((2, 2), np.uint8)
-    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    cv2.morphologyEx(binary, cv2.MORPH_CLOSE, MORPH_CLOSE_KERNEL, dst=binary)
     
     # 8. Remove small noise
     binary = cv2.medianBlur(binary, 3)
     
-    # Convert back to PIL
-    result = Image.fromarray(binary)
     logger.info("OpenCV preprocessing complete")
+    return binary
+
+
+def otsu_threshold(histogram):
+    """Otsu's threshold for a 256-bin grayscale histogram (as cv2.THRESH_OTSU picks it)"""
+    hist = np.asarray(histogram, dtype=np.float64)
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    mean_sum = np.cumsum(hist * levels)
+    total, total_sum = weight[-1], mean_sum[-1]
+    background = weight * (total - weight)
+    # Between-class variance (scaled); thresholds with an empty class score 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.where(background > 0, (total_sum * weight - total * mean_sum) ** 2 / background, 0)
+    return int(np.argmax(variance))
+
+
+def binarize_for_ocr(image_pil, max_dimension=2500):
+    """
+    Grayscale + Otsu threshold for prescription OCR, downscaling very large photos.
+    Tesseract recognises clean black-on-white text faster and more accurately.
+    """
+    width, height = image_pil.size
+    if max(width, height) > max_dimension:
+        scale = max_dimension / max(width, height)
+        image_pil = image_pil.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+        logger.info("Downscaled image to: %s", image_pil.size)
     
-    return result
+    gray = image_pil.convert('L')
+    if cv2 is not None:
+        _, binary = cv2.threshold(np.asarray(gray), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        return Image.fromarray(binary)
+    
+    # Without OpenCV, same Otsu threshold computed from the histogram with NumPy
+    threshold = otsu_threshold(gray.histogram())
+    return gray.point(lambda p: 255 if p > threshold else 0)
 
 
 def preprocess_for_rotated_text(image_pil):
     """
     Special preprocessing for detecting rotated/vertical text on medicine strips.
+    Works on grayscale and returns (image, median Hough angle or None); the image is
+    image_pil itself when no correction is needed.
     """
-    import numpy as np
-    from PIL import Image, ImageEnhance
+    if cv2 is None:
+        return image_pil, None
     
     try:
-        import cv2
-        
-        # Convert to OpenCV format
-        if image_pil.mode != 'RGB':
-            image_pil = image_pil.convert('RGB')
-        
-        img = np.array(image_pil)
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = np.asarray(image_pil.convert('L') if image_pil.mode != 'L' else image_pil)
         
         # Apply edge detection to find text regions
         edges = cv2.Canny(gray, 50, 150, apertureSize=3)
@@ -1411,37 +1623,199 @@ def preprocess_for_rotated_text(image_pil):
                                 minLineLength=50, maxLineGap=10)
         
         if lines is not None:
-            # Calculate dominant angle
-            angles = []
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                angle = np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi
-                angles.append(angle)
+            # Calculate dominant angle over all segments at once
+            segments = lines.reshape(-1, 4)
+            angles = np.degrees(np.arctan2(segments[:, 3] - segments[:, 1], segments[:, 2] - segments[:, 0]))
             
-            if angles:
+            if angles.size:
                 # Find the most common angle
                 median_angle = np.median(angles)
                 
                 # If text is significantly rotated, correct it
                 if abs(median_angle) > 5 and abs(median_angle) < 85:
-                    logger.info(f"Detected rotation angle: {median_angle:.1f}°")
+                    logger.info("Detected rotation angle: %.1f°", median_angle)
                     
                     # Rotate image to correct
-                    center = (img.shape[1] // 2, img.shape[0] // 2)
+                    center = (gray.shape[1] // 2, gray.shape[0] // 2)
                     M = cv2.getRotationMatrix2D(center, median_angle, 1.0)
-                    rotated = cv2.warpAffine(img, M, (img.shape[1], img.shape[0]),
+                    rotated = cv2.warpAffine(gray, M, (gray.shape[1], gray.shape[0]),
                                             flags=cv2.INTER_CUBIC,
                                             borderMode=cv2.BORDER_REPLICATE)
                     
-                    return Image.fromarray(cv2.cvtColor(rotated, cv2.COLOR_BGR2RGB))
+                    return Image.fromarray(rotated), median_angle
+                return image_pil, median_angle
         
-        return image_pil
+        return image_pil, None
         
-    except ImportError:
-        return image_pil
     except Exception as e:
         logger.warning(f"Rotation detection failed: {e}")
-        return image_pil
+        return image_pil, None
+
+
+def detect_page_rotation(image):
+    """Counter-clockwise quarter turn (0/90/180/270) that makes the text upright per Tesseract OSD; None if unknown"""
+    try:
+        with tesserocr_api() as api:
+            if api is not None:
+                import tesserocr
+                api.SetPageSegMode(tesserocr.PSM.OSD_ONLY)
+                set_tesserocr_image(api, image)
+                try:
+                    osd = api.DetectOrientationScript()
+                finally:
+                    api.Clear()
+                # orient_deg is the text's counter-clockwise rotation, which is also PIL's rotate() angle
+                return osd['orient_deg'] if osd else None
+        
+        pytesseract = get_pytesseract()
+        osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+        # 'rotate' is the clockwise turn that fixes the page; PIL rotates counter-clockwise
+        return (360 - osd['rotate']) % 360
+    except Exception as e:
+        # Missing osd.traineddata or too little text to decide
+        logger.info("Orientation detection unavailable: %s", e)
+        return None
+
+
+# Mean word confidence (0-100) and length at which the first Tesseract pass is trusted on its own
+HIGH_CONFIDENCE_OCR = 80
+HIGH_CONFIDENCE_MIN_CHARS = 100
+# Known medicines found in the prescription passes so far at which the remaining passes are dropped
+CONFIDENT_PRESCRIPTION_MATCHES = 2
+
+# Loaded tesserocr APIs shared by every thread. PyTessBaseAPI is not reentrant, so a call
+# checks one out and returns it afterwards; new ones are only created when all are busy, so
+# the pool grows to the peak number of concurrent OCR calls and the model is never reloaded
+TESSEROCR_POOL = queue.LifoQueue()
+TESSEROCR_FAILED = threading.Event()
+
+
+@contextlib.contextmanager
+def tesserocr_api():
+    """Check out a tesserocr API for one OCR call; yields None when tesserocr is not installed
+    or libtesseract can't be initialised (callers then use the tesseract binary)"""
+    if not TESSEROCR_AVAILABLE or TESSEROCR_FAILED.is_set():
+        yield None
+        return
+    try:
+        api = TESSEROCR_POOL.get_nowait()
+    except queue.Empty:
+        try:
+            import tesserocr
+            # LSTM only: the same engine pytesseract's --oem 3 resolves to, without loading the legacy model
+            api = tesserocr.PyTessBaseAPI(lang='eng', oem=tesserocr.OEM.LSTM_ONLY)
+        except Exception as e:
+            logger.warning(f"tesserocr init failed, falling back to pytesseract: {e}")
+            TESSEROCR_FAILED.set()
+            yield None
+            return
+    try:
+        yield api
+    finally:
+        TESSEROCR_POOL.put(api)
+
+
+def set_tesserocr_image(api, image):
+    """Hand a PIL image, or a 2-D uint8 ndarray from preprocess_with_opencv, to tesserocr"""
+    if getattr(image, 'ndim', None) == 2:
+        height, width = image.shape
+        api.SetImageBytes(image.tobytes(), width, height, 1, width)
+    else:
+        api.SetImage(image)
+
+
+def tesseract_image_to_string(image, psm=3, whitelist=None):
+    """OCR a PIL image with in-process tesserocr when available, else pytesseract"""
+    with tesserocr_api() as api:
+        if api is not None:
+            api.SetPageSegMode(psm)
+            api.SetVariable('tessedit_char_whitelist', whitelist or '')
+            set_tesserocr_image(api, image)
+            try:
+                return api.GetUTF8Text()
+            finally:
+                api.Clear()  # drop the image and recognition results between passes
+    
+    args = ['--oem', '3', '--psm', str(psm)]
+    if whitelist:
+        args += ['-c', f'tessedit_char_whitelist={whitelist}']
+    return tesseract_cli_to_string(image, args)
+
+
+def tesseract_cli_to_string(image, args):
+    """Run the tesseract binary with the image piped in on stdin and the text read back from stdout,
+    so no temp files are written; image may also be a file path from tesseract_shared_input"""
+    pytesseract = get_pytesseract()
+    if isinstance(image, str):
+        source, data = image, None
+    else:
+        if getattr(image, 'ndim', None) is not None:
+            image = Image.fromarray(image)
+        if image.mode not in ('1', 'L', 'RGB'):
+            image = image.convert('RGB')
+        # Uncompressed BMP: nothing to deflate on our side or inflate on Tesseract's
+        buf = io.BytesIO()
+        image.save(buf, 'BMP')
+        source, data = 'stdin', buf.getvalue()
+    result = subprocess.run([pytesseract.pytesseract.tesseract_cmd, source, 'stdout', *args],
+                            input=data, capture_output=True)
+    if result.returncode:
+        raise pytesseract.TesseractError(result.returncode, result.stderr.decode(errors='replace').strip())
+    return result.stdout.decode('utf-8')
+
+
+def tesseract_image_to_data(image, psm=3, whitelist=None):
+    """Like tesseract_image_to_string but also returns Tesseract's mean word confidence (0-100)"""
+    with tesserocr_api() as api:
+        if api is not None:
+            api.SetPageSegMode(psm)
+            api.SetVariable('tessedit_char_whitelist', whitelist or '')
+            set_tesserocr_image(api, image)
+            try:
+                # MeanTextConf reuses the recognition GetUTF8Text just ran
+                return api.GetUTF8Text(), api.MeanTextConf()
+            finally:
+                api.Clear()
+    
+    config = f'--oem 3 --psm {psm}'
+    if whitelist:
+        config += f' -c tessedit_char_whitelist={whitelist}'
+    pytesseract = get_pytesseract()
+    data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+    # Rebuild the text line by line from the word boxes instead of running a second image_to_string pass
+    lines = {}
+    confs = []
+    for word, conf, *line_key in zip(data['text'], data['conf'], data['block_num'], data['par_num'], data['line_num']):
+        if word.strip() and float(conf) >= 0:
+            lines.setdefault(tuple(line_key), []).append(word)
+            confs.append(float(conf))
+    text = '\n'.join(' '.join(words) for words in lines.values())
+    return text, (sum(confs) / len(confs) if confs else 0)
+
+
+@contextlib.contextmanager
+def tesseract_shared_input(image):
+    """Yield what several passes over the same pixels should OCR: the image itself for tesserocr,
+    else a PNG written once so the tesseract binary doesn't get it re-encoded for every pass"""
+    if TESSEROCR_AVAILABLE and not TESSEROCR_FAILED.is_set():
+        yield image
+        return
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+        image.save(f, 'PNG')
+    try:
+        yield f.name
+    finally:
+        try:
+            os.remove(f.name)
+        except OSError as e:
+            # Never let cleanup discard results the caller already has
+            logger.warning(f"Could not remove Tesseract input {f.name}: {e}")
+
+
+def submit_tesseract_passes(passes):
+    """Submit (label, image, psm, whitelist, ...) passes to OCR_POOL; returns futures in the same order"""
+    return [OCR_POOL.submit(tesseract_image_to_string, image, psm, whitelist)
+            for _, image, psm, whitelist, *_ in passes]
 
 
 def tesseract_extract_text(image_content):
@@ -1451,115 +1825,116 @@ def tesseract_extract_text(image_content):
             logger.warning(f"Tesseract not available (TESSERACT_AVAILABLE={TESSERACT_AVAILABLE})")
             return None
         
-        from io import BytesIO
-        from PIL import Image
-        
-        logger.info(f"Using Tesseract at: {TESSERACT_PATH}")
+        logger.info("Using Tesseract at: %s", TESSERACT_PATH)
         
-        # Open image from bytes
+        # Open image from bytes. Every strategy below derives new images (convert, rotate,
+        # enhance, the OpenCV path decodes the bytes itself), so the shared decode is
+        # read directly instead of paying for open_image's full-frame copy
         try:
-            image_pil = Image.open(BytesIO(image_content))
-            logger.info(f"Image opened: {image_pil.size}, mode: {image_pil.mode}")
+            image_pil = decode_image(image_content)
+            logger.info("Image opened: %s, mode: %s", image_pil.size, image_pil.mode)
         except Exception as img_err:
             logger.error(f"Tesseract OCR: failed to open image: {img_err}")
             return None
         
-        all_texts = []
+        # Build every pass first, then run them concurrently on OCR_POOL
+        # (label, image, psm, whitelist, minimum stripped length to keep the text)
+        passes = []
         
         # Strategy 1: Preprocessed image with custom config for medicine strips
-        logger.info("Running Tesseract OCR with preprocessing...")
         try:
-            preprocessed = preprocess_medicine_strip_image(image_pil)
+            preprocessed = preprocess_medicine_strip_image(image_pil, image_content)
             
-            # Custom Tesseract config for medicine strips
+            # Custom Tesseract settings for medicine strips
             # PSM 6: Assume a single uniform block of text
             # PSM 11: Sparse text - find as much text as possible
             # PSM 3: Fully automatic page segmentation (default)
-            custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789./-:₹Rs '
-            
-            text1 = pytesseract.image_to_string(preprocessed, config=custom_config)
-            if text1.strip():
-                all_texts.append(text1.strip())
-                logger.info(f"Preprocessed OCR: {len(text1)} chars")
+            whitelist = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789./-:₹Rs'
+            passes.append(("Preprocessed", preprocessed, 6, whitelist, 0))
         except Exception as e:
             logger.warning(f"Preprocessed OCR failed: {e}")
         
         # Strategy 2: Original image with sparse text mode (catches rotated text)
-        logger.info("Running Tesseract OCR on original (sparse mode)...")
-        try:
-            if image_pil.mode != 'RGB':
-                image_rgb = image_pil.convert('RGB')
-            else:
-                image_rgb = image_pil
-            
-            # PSM 11: Sparse text - good for medicine strips with scattered text
-            sparse_config = r'--oem 3 --psm 11'
-            text2 = pytesseract.image_to_string(image_rgb, config=sparse_config)
-            if text2.strip():
-                all_texts.append(text2.strip())
-                logger.info(f"Sparse mode OCR: {len(text2)} chars")
-        except Exception as e:
-            logger.warning(f"Sparse mode OCR failed: {e}")
+        # Convert once; the rotation and contrast strategies below all share image_gray
+        image_rgb = image_pil.convert('RGB') if image_pil.mode != 'RGB' else image_pil
+        image_gray = image_pil.convert('L') if image_pil.mode != 'L' else image_pil
+        # PSM 11: Sparse text - good for medicine strips with scattered text
+        passes.append(("Sparse mode", image_rgb, 11, None, 0))
         
         # Strategy 3: Try with different orientations (medicine strips often have vertical text)
-        logger.info("Running Tesseract OCR with rotation detection...")
         try:
-            from PIL import Image
-            
             # First try automatic rotation detection
+            hough_angle = None
             try:
-                auto_rotated = preprocess_for_rotated_text(image_pil)
-                if auto_rotated != image_pil:
-                    text_auto = pytesseract.image_to_string(auto_rotated, config='--oem 3 --psm 6')
-                    if text_auto.strip() and len(text_auto.strip()) > 20:
-                        all_texts.append(text_auto.strip())
-                        logger.info(f"Auto-rotated OCR: {len(text_auto)} chars")
+                auto_rotated, hough_angle = preprocess_for_rotated_text(image_gray)
+                if auto_rotated is not image_gray:
+                    passes.append(("Auto-rotated", auto_rotated, 6, None, 20))
             except Exception as e:
                 logger.warning(f"Auto rotation failed: {e}")
             
-            # Try 90-degree rotations for vertical text
-            for angle in [90, 270]:
-                rotated = image_pil.rotate(angle, expand=True)
-                if rotated.mode != 'RGB':
-                    rotated = rotated.convert('RGB')
-                
-                text_rot = pytesseract.image_to_string(rotated, config='--oem 3 --psm 6')
-                if text_rot.strip() and len(text_rot.strip()) > 20:
-                    all_texts.append(text_rot.strip())
-                    logger.info(f"Rotated {angle}° OCR: {len(text_rot)} chars")
+            # Quarter turns for vertical text: none when the Hough lines are already
+            # horizontal, else the one OSD picks (it runs on OCR_POOL so it reuses
+            # that thread's tesserocr API), or both 90 and 270 when OSD can't tell
+            if hough_angle is not None and min(abs(hough_angle), 180 - abs(hough_angle)) < 10:
+                quarter_turns = []
+            else:
+                osd_angle = OCR_POOL.submit(detect_page_rotation, image_gray).result()
+                quarter_turns = [90, 270] if osd_angle is None else [osd_angle] if osd_angle else []
+            # np.rot90 matches PIL's counter-clockwise rotate(expand=True) but is only a strided
+            # view of the grayscale buffer; tesserocr takes it through SetImageBytes
+            gray_array = np.asarray(image_gray)
+            for angle in quarter_turns:
+                rotated = np.rot90(gray_array, angle // 90)
+                passes.append((f"Rotated {angle}°", rotated, 6, None, 20))
         except Exception as e:
             logger.warning(f"Rotation OCR failed: {e}")
         
         # Strategy 4: High contrast grayscale
-        logger.info("Running Tesseract OCR with high contrast...")
         try:
-            from PIL import ImageEnhance
-            
-            gray = image_pil.convert('L')
-            enhancer = ImageEnhance.Contrast(gray)
+            enhancer = ImageEnhance.Contrast(image_gray)
             high_contrast = enhancer.enhance(3.0)
-            
-            text3 = pytesseract.image_to_string(high_contrast, config='--oem 3 --psm 3')
-            if text3.strip():
-                all_texts.append(text3.strip())
-                logger.info(f"High contrast OCR: {len(text3)} chars")
+            passes.append(("High contrast", high_contrast, 3, None, 0))
         except Exception as e:
             logger.warning(f"High contrast OCR failed: {e}")
         
-        # Combine all extracted texts, removing duplicates
-        if all_texts:
-            # Merge texts, keeping unique lines
-            seen_lines = set()
-            merged_lines = []
-            for text in all_texts:
-                for line in text.split('\n'):
-                    line_clean = line.strip()
-                    if line_clean and line_clean.lower() not in seen_lines:
-                        seen_lines.add(line_clean.lower())
+        logger.info("Running %d Tesseract OCR passes in parallel...", len(passes))
+        # The first pass also reports its confidence so a clean photo can skip the rest
+        _, first_image, first_psm, first_whitelist, _ = passes[0]
+        futures = [OCR_POOL.submit(tesseract_image_to_data, first_image, first_psm, first_whitelist)]
+        futures += submit_tesseract_passes(passes[1:])
+        # Merge each pass's lines as it finishes, keeping the first spelling of every unique line
+        seen_lines = set()
+        merged_lines = []
+        for (label, _, _, _, min_len), future in zip(passes, futures):
+            try:
+                text = future.result()
+            except Exception as e:
+                logger.warning(f"{label} OCR failed: {e}")
+                continue
+            confident = False
+            if future is futures[0]:
+                text, confidence = text
+                confident = confidence >= HIGH_CONFIDENCE_OCR and len(text.strip()) > HIGH_CONFIDENCE_MIN_CHARS
+            text = text.strip()
+            if len(text) <= min_len:
+                continue
+            for line in text.split('\n'):
+                line_clean = line.strip()
+                if line_clean:
+                    key = line_clean.casefold()
+                    if key not in seen_lines:
+                        seen_lines.add(key)
                         merged_lines.append(line_clean)
-            
+            if confident:
+                for pending in futures[1:]:
+                    pending.cancel()
+                logger.info("%s OCR confidence %.0f, skipping remaining passes", label, confidence)
+                break
+            logger.info("%s OCR: %d chars", label, len(text))
+        
+        if merged_lines:
             combined_text = '\n'.join(merged_lines)
-            logger.info(f"Tesseract OCR extracted {len(combined_text)} total characters from {len(merged_lines)} unique lines")
+            logger.info("Tesseract OCR extracted %d total characters from %d unique lines", len(combined_text), len(merged_lines))
             return combined_text
         else:
             logger.warning("Tesseract OCR returned empty text from all strategies")
@@ -1569,9 +1944,10 @@ def tesseract_extract_text(image_content):
         logger.error(f"Tesseract OCR error: {e}")
         return None
 
+@cache_by_image
 def ocr_extract_text(image_content):
     """Try OCR methods in order: Tesseract (free) -> Gemini -> Google Vision"""
-    logger.info(f"=== OCR START === Tesseract={TESSERACT_AVAILABLE}, Gemini={GEMINI_AVAILABLE}")
+    logger.info("=== OCR START === Tesseract=%s, Gemini=%s", TESSERACT_AVAILABLE, GEMINI_AVAILABLE)
     
     # 1. Try Tesseract first (free, offline, no API key needed)
     if TESSERACT_AVAILABLE:
@@ -1590,7 +1966,7 @@ def ocr_extract_text(image_content):
 
     if GEMINI_AVAILABLE and gemini_key_present:
         logger.info("Attempting OCR with Gemini...")
-        text = gemini_extract_text(image_content)
+        text = (gemini_extract_all(image_content) or (None, None))[0]
         if text:
             logger.info("Gemini OCR successful")
             return text
@@ -1599,8 +1975,8 @@ def ocr_extract_text(image_content):
     # 3. Try Google Vision as last resort
     try:
         logger.info("Attempting OCR with Google Vision...")
-        image = vision.Image(content=image_content)
-        response = global_vision_client.text_detection(image=image)
+        image = vision_image(image_content)
+        response = get_vision_client().text_detection(image=image)
         texts = response.text_annotations
         if texts:
             logger.info("Google Vision OCR successful")
@@ -1614,34 +1990,15 @@ def ocr_extract_text(image_content):
 
     # 4. Final fallback to Gemini again (in case it wasn't tried)
     if GEMINI_AVAILABLE and gemini_key_present:
-        text = gemini_extract_text(image_content)
+        text = (gemini_extract_all(image_content) or (None, None))[0]
         if text:
             return text
     
     logger.error("All OCR methods failed")
     return None
 
-def extract_fields_with_gemini_from_text(full_text):
-    """Use Gemini to extract structured fields from OCR text. Returns dict or None."""
-    try:
-        if not GEMINI_AVAILABLE:
-            return None
-        gemini_api_key = os.environ.get('GEMINI_API_KEY') or GEMINI_API_KEY_FALLBACK
-        if not gemini_api_key:
-            return None
-        import google.generativeai as genai
-        genai.configure(api_key=gemini_api_key)
-        # Initialize a fast model
-        model = None
-        for name in ['models/gemini-2.0-flash', 'models/gemini-2.5-flash']:
-            try:
-                model = genai.GenerativeModel(name)
-                break
-            except Exception:
-                continue
-        if model is None:
-            return None
-        prompt = """You are analyzing OCR text from an Indian medicine strip/blister pack.
+# Field extraction prompt for already-OCRed text; {ocr_text} is replaced per request
+GEMINI_TEXT_FIELDS_PROMPT = """You are analyzing OCR text from an Indian medicine strip/blister pack.
 
 Extract these fields from the text:
 
@@ -1669,28 +2026,41 @@ Extract these fields from the text:
 
 OCR TEXT TO ANALYZE:
 \"\"\"
-""" + full_text + """
+{ocr_text}
 \"\"\"
 
 Return ONLY this JSON (no other text):
 {"brand": "", "dosage": "", "batch_number": "", "manufacture_date": "", "expiry_date": "", "manufacturer": "", "mrp": ""}
 
 Use "" for fields not found."""
-        resp = model.generate_content(prompt)
+
+
+def extract_fields_with_gemini_from_text(full_text):
+    """Use Gemini to extract structured fields from OCR text. Returns dict or None."""
+    try:
+        if not GEMINI_AVAILABLE:
+            return None
+        gemini_api_key = os.environ.get('GEMINI_API_KEY') or GEMINI_API_KEY_FALLBACK
+        if not gemini_api_key:
+            return None
+        # Initialize a fast model
+        model = get_gemini_model(gemini_api_key)
+        if model is None:
+            return None
+        prompt = GEMINI_TEXT_FIELDS_PROMPT.replace('{ocr_text}', full_text)
+        resp = call_with_backoff(model.generate_content, prompt)
         text = (resp.text or '').strip()
         text = text.replace('```json', '').replace('```', '').strip()
-        logger.info(f"Gemini text extraction response: {text[:300]}")
-        import json as _json
+        logger.info("Gemini text extraction response: %.300s", text)
         try:
-            data = _json.loads(text)
+            data = json.loads(text)
             if isinstance(data, dict):
                 return data
         except Exception:
-            import re as _re
-            m = _re.search(r"\{[\s\S]*\}", text)
+            m = JSON_OBJECT_RE.search(text)
             if m:
                 try:
-                    data = _json.loads(m.group(0))
+                    data = json.loads(m.group(0))
                     if isinstance(data, dict):
                         return data
                 except Exception:
@@ -1701,6 +2071,13 @@ Use "" for fields not found."""
         return None
 
 # ─── Routes ──────────────────────────────────────────────────────────────────
+@app.errorhandler(413)
+def upload_too_large(e):
+    max_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    if request.path.startswith('/api/'):
+        return jsonify({'error': f'File too large (max {max_mb} MB)'}), 413
+    return render_template('index.html', error_message=f"❌ File too large (max {max_mb} MB)"), 413
+
 @app.route('/', methods=['GET'])
 def landing_page():
     if 'user_type' in session:
@@ -1863,9 +2240,8 @@ def health_advice():
 
         return jsonify({'response': response_message})
 
-    except Exception as e:
-        print(f"Error in /api/health: {e}")
-        # traceback.print_exc() # Uncomment for debugging
+    except Exception:
+        logger.exception("Error in /api/health")
         return jsonify({'response': 'Sorry, I encountered an error. Please try again.'}), 500
 
 @app.route('/api/medicine-info', methods=['POST'])
@@ -1879,11 +2255,9 @@ def medicine_info():
 
         # Search for medicine info case-insensitively
         found_medicine = None
-        for name, info in MEDICINE_INFO.items():
-            if name.lower() == medicine_name.lower():
-                found_medicine = info
-                found_medicine['name'] = name  # Store original name for display
-                break
+        name = MEDICINE_LOOKUP.get(medicine_name.casefold())
+        if name:
+            found_medicine = {**MEDICINE_INFO[name], 'name': name}  # Store original name for display
 
         response_message = ""
         if found_medicine:
@@ -1898,9 +2272,8 @@ def medicine_info():
 
         return jsonify({'response': response_message})
 
-    except Exception as e:
-        print(f"Error in /api/medicine-info: {e}")
-        # traceback.print_exc() # Uncomment for debugging
+    except Exception:
+        logger.exception("Error in /api/medicine-info")
         return jsonify({'response': 'Sorry, I encountered an error. Please try again.'}), 500
 
 @app.route('/api/get_medicine_names')
@@ -1914,7 +2287,11 @@ def check_medicine_availability():
     medicine_name = data.get('medicine_name', '')
     requested_quantity = data.get('quantity', 0)
 
-    medicine = Medicine.query.filter(Medicine.medicine_name.ilike(medicine_name)).first()
+    # Case-insensitive equality on lower(name) is served by ix_med_name_lower; ilike can't use it.
+    # Plain column rows, so the enquiry commit below doesn't expire and reload an ORM object
+    medicine = Medicine.query.with_entities(
+        Medicine.medicine_name, Medicine.quantity, Medicine.price_per_unit
+    ).filter(db.func.lower(Medicine.medicine_name) == medicine_name.lower()).first()
     
     # Store the enquiry in database
     if session.get('user_type') == 'user':
@@ -1939,52 +2316,133 @@ def check_medicine_availability():
 
     return jsonify({'response': response_message})
 
-def check_medicine_availability_in_db(medicine_name):
-    """Helper function to check medicine availability in database"""
-    # Clean the medicine name
-    clean_name = medicine_name.strip()
+# Seconds the stock snapshot and cached lookups may live; commits only clear this process's
+# copy, so writes made by other gunicorn workers or scripts show up after at most this long
+MEDICINE_STOCK_TTL = 300
+
+
+STOCK_DOSAGE_SUFFIX_RE = re.compile(r'[\s\-]*\d+.*$')
+
+# Common spoken/brand names and the stock row they should resolve to
+STOCK_NAME_MAPPINGS = {
+    'paracetamol': 'Paracetamol',
+    'ondem': 'Ondem',
+    'ondansetron': 'Ondem',
+    'dolo': 'Dolo 650',
+    'dolo-650': 'Dolo 650',
+    'dolo 650': 'Dolo 650',
+    'crocin': 'Paracetamol',
+    'calpol': 'Calpol',
+    'pan': 'Pantoprazole',
+    'pan-40': 'Pantoprazole',
+    'pan 40': 'Pantoprazole',
+}
+
+
+# Full-table reads stream from the cursor this many rows at a time
+MEDICINE_FETCH_CHUNK = 500
+
+
+@functools.lru_cache(maxsize=1)
+def load_medicine_index(ttl_bucket=None):
+    """Snapshot of the stock table for find_medicine_stock, loaded with one query:
+    (rows ordered by batch_id as (name_lower, medicine_name, quantity, price_per_unit),
+    {name_lower: first row with that name})"""
+    rows = tuple(
+        (name.lower(), name, quantity, price)
+        for name, quantity, price in db.session.query(
+            Medicine.medicine_name, Medicine.quantity, Medicine.price_per_unit
+        ).order_by(Medicine.batch_id).yield_per(MEDICINE_FETCH_CHUNK)
+    )
+    by_name = {}
+    for row in rows:
+        by_name.setdefault(row[0], row)
+    logger.info(f"Loaded {len(rows)} medicines into the stock index")
+    return rows, by_name
+
+
+@functools.lru_cache(maxsize=512)
+def find_medicine_stock(name_lower, ttl_bucket=None):
+    """Cached stock lookup: (medicine_name, quantity, price_per_unit) for a lowercased name, or None.
+    ttl_bucket only keys the caches (see medicine_stock); committed Medicine changes clear them."""
+    rows, by_name = load_medicine_index(ttl_bucket)
     
-    # Try exact match first (case-insensitive)
-    medicine = Medicine.query.filter(Medicine.medicine_name.ilike(clean_name)).first()
+    # Try the exact name, then its mapped stock name (crocin -> Paracetamol)
+    row = by_name.get(name_lower) or by_name.get(STOCK_NAME_MAPPINGS.get(name_lower, name_lower).lower())
     
-    # If not found, try partial match
-    if not medicine:
-        medicines = Medicine.query.filter(Medicine.medicine_name.ilike(f'%{clean_name}%')).all()
-        if medicines:
-            medicine = medicines[0]  # Take the first match
-    
-    # If still not found, try matching without numbers/dosage
-    if not medicine:
+    # Otherwise partial match, then match without numbers/dosage
+    if row is None:
+        row = next((r for r in rows if name_lower in r[0]), None)
+    if row is None:
         # Remove numbers and common suffixes
-        base_name = re.sub(r'[\s\-]*\d+.*$', '', clean_name).strip()
-        if base_name and base_name != clean_name:
-            medicine = Medicine.query.filter(Medicine.medicine_name.ilike(f'%{base_name}%')).first()
-    
-    # Try common name mappings
-    if not medicine:
-        name_mappings = {
-            'paracetamol': 'Paracetamol',
-            'ondem': 'Ondem',
-            'ondansetron': 'Ondem',
-            'dolo': 'Dolo 650',
-            'dolo-650': 'Dolo 650',
-            'dolo 650': 'Dolo 650',
-            'crocin': 'Paracetamol',
-            'calpol': 'Calpol',
-            'pan': 'Pantoprazole',
-            'pan-40': 'Pantoprazole',
-            'pan 40': 'Pantoprazole',
-        }
-        mapped_name = name_mappings.get(clean_name.lower())
-        if mapped_name:
-            medicine = Medicine.query.filter(Medicine.medicine_name.ilike(mapped_name)).first()
+        base_name = STOCK_DOSAGE_SUFFIX_RE.sub('', name_lower).strip()
+        if base_name and base_name != name_lower:
+            row = next((r for r in rows if base_name in r[0]), None)
     
-    if medicine:
+    return row[1:] if row else None
+
+
+@functools.lru_cache(maxsize=512)
+def last_medicine_price(name_lower, ttl_bucket=None):
+    """price_per_unit of the newest batch with this name (via ix_med_name_lower), or None when
+    unknown or zero; cached like find_medicine_stock"""
+    last_med = Medicine.query.with_entities(Medicine.price_per_unit).filter(
+        db.func.lower(Medicine.medicine_name) == name_lower).order_by(Medicine.batch_id.desc()).first()
+    if last_med and last_med.price_per_unit:
+        return float(last_med.price_per_unit)
+    return None
+
+
+def clear_medicine_stock_cache():
+    """Drop the stock snapshot and cached lookups in this process"""
+    load_medicine_index.cache_clear()
+    find_medicine_stock.cache_clear()
+    last_medicine_price.cache_clear()
+    medicine_listing.cache_clear()
+
+
+@event.listens_for(Medicine, 'after_insert')
+@event.listens_for(Medicine, 'after_update')
+@event.listens_for(Medicine, 'after_delete')
+def mark_medicine_changed(mapper, connection, target):
+    """Note a stock change on the flushing session; the caches are cleared once it commits"""
+    object_session(target).info['medicine_changed'] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def mark_bulk_medicine_change(orm_execute_state):
+    """Bulk INSERT/UPDATE/DELETE statements skip the mapper events above; flag those too"""
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and Medicine.__table__.compare(orm_execute_state.statement.table):
+        orm_execute_state.session.info['medicine_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def clear_stock_cache_after_commit(session):
+    if session.info.pop('medicine_changed', False):
+        clear_medicine_stock_cache()
+
+
+def medicine_stock(name_lower):
+    """find_medicine_stock with entries expiring every MEDICINE_STOCK_TTL seconds"""
+    return find_medicine_stock(name_lower, int(time.monotonic() // MEDICINE_STOCK_TTL))
+
+
+def check_medicine_availability_in_db(medicine_name):
+    """Helper function to check medicine availability in database"""
+    # Clean the medicine name
+    return availability_from_stock(medicine_name, medicine_stock(medicine_name.strip().lower()))
+
+
+def availability_from_stock(medicine_name, stock):
+    """Availability dict for medicine_name from a medicine_stock result (None if not stocked)"""
+    if stock:
+        name, quantity, price = stock
         return {
             'available': True,
-            'name': medicine.medicine_name,
-            'quantity': medicine.quantity,
-            'price': medicine.price_per_unit
+            'name': name,
+            'quantity': quantity,
+            'price': price
         }
     return {
         'available': False,
@@ -1993,8 +2451,9 @@ def check_medicine_availability_in_db(medicine_name):
         'price': 0.0
     }
 
-def extract_medicines_with_gemini(image_content):
-    """Extract medicine names from prescription image using Gemini API"""
+def extract_medicines_with_gemini(image_contents):
+    """Extract medicine names from the prescription page images using one Gemini API request.
+    [] means Gemini read the pages and found no medicines; None means no usable answer."""
     try:
         if not GEMINI_AVAILABLE:
             logger.error("Gemini API not available. Please install google-generativeai")
@@ -2008,75 +2467,26 @@ def extract_medicines_with_gemini(image_content):
         
         logger.info(f"Using Gemini API key (starts with: {gemini_api_key[:10]}...)")
         
-        genai.configure(api_key=gemini_api_key)
-        # Try to find available models - prioritize newer models
-        model = None
-        
-        # First, try to see what models are available
-        try:
-            available_models = [m.name for m in genai.list_models()]
-            logger.info(f"Available models: {available_models[:10]}")
-            
-            # Prioritize flash models (faster) and stable versions
-            preferred_models = [
-                'models/gemini-2.0-flash',
-                'models/gemini-2.5-flash',
-                'models/gemini-2.5-pro',
-                'models/gemini-2.0-flash-001',
-            ]
-            
-            # Try preferred models first
-            for preferred in preferred_models:
-                if preferred in available_models:
-                    try:
-                        model = genai.GenerativeModel(preferred)
-                        logger.info(f"Successfully initialized preferred model: {preferred}")
-                        break
-                    except Exception as e:
-                        logger.warning(f"Failed to initialize {preferred}: {str(e)}")
-                        continue
-            
-            # If preferred didn't work, try any gemini model
-            if model is None:
-                for available_model in available_models:
-                    if 'gemini' in available_model.lower() and 'embedding' not in available_model.lower():
-                        try:
-                            model = genai.GenerativeModel(available_model)
-                            logger.info(f"Successfully initialized model: {available_model}")
-                            break
-                        except Exception as e:
-                            logger.warning(f"Failed to initialize {available_model}: {str(e)}")
-                            continue
-        except Exception as list_error:
-            logger.warning(f"Could not list models: {str(list_error)}")
-            # Fallback to known working models
-            fallback_models = ['models/gemini-2.0-flash', 'models/gemini-2.5-flash']
-            for fallback in fallback_models:
-                try:
-                    model = genai.GenerativeModel(fallback)
-                    logger.info(f"Successfully initialized fallback model: {fallback}")
-                    break
-                except Exception:
-                    continue
-        
-        if model is None:
-            raise Exception("Could not initialize any Gemini model. Please check your API key has access to Gemini models.")
+        model = get_gemini_listed_model(gemini_api_key)
         
         # Use Gemini to directly analyze the image (no need for Vision API - it requires billing)
         # Gemini can process images directly
-        import PIL.Image
-        from io import BytesIO
-        
         try:
-            # Convert image content to PIL Image
-            image_pil = PIL.Image.open(BytesIO(image_content))
-            logger.info(f"Image opened successfully: {image_pil.size}, mode: {image_pil.mode}")
+            # Convert each page to a downscaled RGB PIL Image (sent as JPEG); all pages go into the same request
+            images_pil = []
+            for image_content in image_contents:
+                image_pil = open_image(image_content)
+                image_pil.thumbnail((GEMINI_PRESCRIPTION_MAX_SIDE, GEMINI_PRESCRIPTION_MAX_SIDE), Image.LANCZOS)
+                if image_pil.mode != 'RGB':
+                    image_pil = image_pil.convert('RGB')
+                images_pil.append(image_pil)
+            logger.info(f"Opened {len(images_pil)} image(s): {[image_pil.size for image_pil in images_pil]}")
         except Exception as img_error:
             logger.error(f"Failed to open image: {str(img_error)}")
             raise Exception(f"Could not process image: {str(img_error)}")
         
         # Use Gemini to extract medicine names directly from the image
-        extraction_prompt = """You are analyzing a doctor's prescription image. Your task is to extract ALL medicine names from this prescription.
+        extraction_prompt = """You are analyzing a doctor's prescription image (one or more pages of the same prescription). Your task is to extract ALL medicine names from this prescription.
 
 LOOK FOR:
 - Medicine names written after "Rx:" 
@@ -2091,6 +2501,7 @@ INSTRUCTIONS:
 1. Read ALL text in the image carefully
 2. Identify medicine names (ignore dosage like mg, ml)
 3. Return ONLY the medicine names as a JSON array
+4. If there are several pages, return ONE flat array covering all pages
 
 OUTPUT FORMAT - Return ONLY this JSON array (no other text):
 ["Medicine1", "Medicine2"]
@@ -2101,9 +2512,9 @@ Example outputs:
 
 If you see PARACETAMOL and ONDEM in the image, return: ["Paracetamol", "Ondem"]"""
         
-        logger.info("Sending image directly to Gemini for analysis...")
+        logger.info(f"Sending {len(images_pil)} image(s) directly to Gemini for analysis...")
         try:
-            gemini_response = model.generate_content([extraction_prompt, image_pil])
+            gemini_response = call_with_backoff(model.generate_content, [extraction_prompt, *images_pil])
             response_text = gemini_response.text.strip()
             logger.info(f"Gemini API response received (length: {len(response_text)})")
         except Exception as api_error:
@@ -2118,24 +2529,23 @@ If you see PARACETAMOL and ONDEM in the image, return: ["Paracetamol", "Ondem"]"
             medicines = json.loads(response_text)
             if isinstance(medicines, list):
                 return medicines
-            else:
-                return []
+            logger.error(f"Gemini response is not a JSON array: {response_text}")
+            return None
         except json.JSONDecodeError:
             # Try to extract array from text
-            match = re.search(r'\[.*?\]', response_text, re.DOTALL)
-            if match:
+            array_text = first_json_array(response_text)
+            if array_text:
                 try:
-                    medicines = json.loads(match.group(0))
-                    return medicines if isinstance(medicines, list) else []
+                    medicines = json.loads(array_text)
+                    return medicines if isinstance(medicines, list) else None
                 except:
                     pass
             logger.error(f"Failed to parse Gemini response: {response_text}")
-            return []
+            return None
             
     except Exception as e:
         error_details = str(e)
         logger.error(f"Error extracting medicines with Gemini: {error_details}", exc_info=True)
-        import traceback
         full_traceback = traceback.format_exc()
         logger.error(f"Full traceback:\n{full_traceback}")
         
@@ -2161,14 +2571,15 @@ def extract_medicines_with_chatgpt(image_content):
             logger.warning("OPENAI_API_KEY not found in environment. Please set it.")
             return None
         
+        openai = get_openai()
         openai.api_key = openai_api_key
         
         # Convert image to base64
         image_base64 = base64.b64encode(image_content).decode('utf-8')
         
         # First, use Google Vision API to extract text (as fallback)
-        image = vision.Image(content=image_content)
-        response = global_vision_client.text_detection(image=image)
+        image = vision_image(image_content)
+        response = get_vision_client().text_detection(image=image)
         texts = response.text_annotations
         
         if not texts:
@@ -2180,7 +2591,8 @@ def extract_medicines_with_chatgpt(image_content):
         # Use ChatGPT to extract medicine names
         client = openai.OpenAI(api_key=openai_api_key)
         
-        response = client.chat.completions.create(
+        response = call_with_backoff(
+            client.chat.completions.create,
             model="gpt-4o-mini",  # Using cheaper model, can switch to gpt-4o for better accuracy
             messages=[
                 {
@@ -2221,11 +2633,11 @@ def extract_medicines_with_chatgpt(image_content):
             
             return []
         except json.JSONDecodeError:
-            # Try to extract array from text using regex
-            match = re.search(r'\[.*?\]', response_text, re.DOTALL)
-            if match:
+            # Try to extract array from text
+            array_text = first_json_array(response_text)
+            if array_text:
                 try:
-                    medicines = json.loads(match.group(0))
+                    medicines = json.loads(array_text)
                     return medicines if isinstance(medicines, list) else []
                 except:
                     pass
@@ -2243,20 +2655,16 @@ def extract_medicines_with_tesseract(image_content):
             logger.error("Tesseract OCR not available")
             return None
         
-        from io import BytesIO
-        from PIL import Image, ImageEnhance, ImageFilter
-        
         # Open image
         try:
-            image_pil = Image.open(BytesIO(image_content))
+            image_pil = open_image(image_content)
             logger.info(f"Prescription image opened: {image_pil.size}")
         except Exception as e:
             logger.error(f"Failed to open prescription image: {e}")
             return None
         
-        # Preprocess image for better OCR
-        if image_pil.mode != 'RGB':
-            image_pil = image_pil.convert('RGB')
+        # Work in grayscale from here on: every strategy OCRs the binarized image
+        image_pil = image_pil.convert('L')
         
         # Resize if too small
         width, height = image_pil.size
@@ -2265,151 +2673,250 @@ def extract_medicines_with_tesseract(image_content):
             image_pil = image_pil.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
             logger.info(f"Resized image to: {image_pil.size}")
         
-        all_texts = []
+        # Strategy 1: Binarized grayscale (Otsu threshold)
+        binary = binarize_for_ocr(image_pil)
         
-        # Strategy 1: High contrast grayscale
-        logger.info("Running Tesseract OCR Strategy 1: High contrast...")
-        gray = image_pil.convert('L')
-        enhancer = ImageEnhance.Contrast(gray)
-        gray = enhancer.enhance(2.5)
-        enhancer = ImageEnhance.Sharpness(gray)
-        gray = enhancer.enhance(2.0)
+        with tesseract_shared_input(binary) as ocr_input:
+            passes = [
+                ("Strategy 1 (binarized)", ocr_input, 6, None),
+                # Strategy 2: Different PSM mode (sparse text)
+                ("Strategy 2 (sparse text)", ocr_input, 11, None),
+                # Strategy 3: Auto page segmentation
+                ("Strategy 3 (auto segmentation)", ocr_input, 3, None),
+            ]
+            logger.info(f"Running {len(passes)} Tesseract OCR strategies in parallel...")
+            
+            futures = submit_tesseract_passes(passes)
+            pass_index = {future: i for i, future in enumerate(futures)}
+            # Texts are kept in pass order so the combined text does not depend on which pass finished first
+            all_texts = [None] * len(passes)
+            medicines = []
+            for future in as_completed(futures):
+                i = pass_index[future]
+                text = future.result()
+                if not text.strip():
+                    continue
+                all_texts[i] = text
+                logger.info(f"{passes[i][0]} extracted: {len(text)} chars")
+                # Match on what has arrived so far; enough known medicines means the other passes can be dropped
+                combined_text = '\n'.join(t for t in all_texts if t)
+                medicines = extract_medicine_names_from_text(combined_text)
+                if len(medicines) >= CONFIDENT_PRESCRIPTION_MATCHES:
+                    for pending in futures:
+                        pending.cancel()
+                    logger.info(f"{passes[i][0]} found {len(medicines)} medicines, skipping remaining strategies")
+                    break
+            # cancel() only drops queued passes; ones already running may still be reading the
+            # shared input file, so let them finish before it is removed
+            wait(futures)
         
-        text1 = pytesseract.image_to_string(gray, config='--oem 3 --psm 6')
-        if text1.strip():
-            all_texts.append(text1)
-            logger.info(f"Strategy 1 extracted: {len(text1)} chars")
-        
-        # Strategy 2: Different PSM mode (sparse text)
-        logger.info("Running Tesseract OCR Strategy 2: Sparse text mode...")
-        text2 = pytesseract.image_to_string(gray, config='--oem 3 --psm 11')
-        if text2.strip():
-            all_texts.append(text2)
-            logger.info(f"Strategy 2 extracted: {len(text2)} chars")
-        
-        # Strategy 3: Auto page segmentation
-        logger.info("Running Tesseract OCR Strategy 3: Auto segmentation...")
-        text3 = pytesseract.image_to_string(gray, config='--oem 3 --psm 3')
-        if text3.strip():
-            all_texts.append(text3)
-            logger.info(f"Strategy 3 extracted: {len(text3)} chars")
-        
-        # Strategy 4: Original image (sometimes works better)
-        logger.info("Running Tesseract OCR Strategy 4: Original image...")
-        text4 = pytesseract.image_to_string(image_pil, config='--oem 3 --psm 6')
-        if text4.strip():
-            all_texts.append(text4)
-            logger.info(f"Strategy 4 extracted: {len(text4)} chars")
-        
-        # Combine all extracted texts
-        combined_text = '\n'.join(all_texts)
-        
-        if not combined_text.strip():
+        if not any(all_texts):
             logger.warning("Tesseract returned empty text from all strategies")
             return []
         
         logger.info(f"Tesseract combined text ({len(combined_text)} chars): {combined_text[:800]}...")
-        
-        # Extract medicine names from text using patterns
-        medicines = extract_medicine_names_from_text(combined_text)
         logger.info(f"Extracted {len(medicines)} medicines from prescription: {medicines}")
         return medicines
         
     except Exception as e:
         logger.error(f"Tesseract prescription extraction error: {e}")
-        import traceback
         logger.error(traceback.format_exc())
         return None
 
 
+# Known medicine database for matching - comprehensive list including all from MEDICINE_DB and MEDICINE_INFO
+# (a tuple: read-only; lowercased/normalised once into KNOWN_MEDICINE_LOOKUP below)
+KNOWN_MEDICINES = (
+    # From MEDICINE_DB and MEDICINE_INFO
+    'Augmentin', 'Avil', 'Benadryl', 'Brufen', 'Bifilac',
+    'Cetrizine', 'Cetirizine', 'Combiflam', 'Calpol',
+    'Dolo 650', 'Domstal', 'Domperidone',
+    'Eno', 'Electral',
+    'Flexon', 'Fepanil',
+    'Gelusil', 'Gaviscon',
+    'Honitus', 'Hifenac',
+    'Ibugesic', 'Iodex', 'Ibuprofen',
+    'Junior Lanzol', 'Jiffy',
+    'Ketorol', 'Ketanov',
+    'Liv52', 'Limcee',
+    'Meftal Spas', 'Metrogyl', 'Metronidazole',
+    'Norflox', 'Nasivion',
+    'Omez', 'Ondem', 'O2', 'Ofloxacin', 'Ornidazole', 'Ondansetron',
+    'Paracetamol', 'Pantoprazole',
+    'Quadriderm', 'Quinidine',
+    'Rantac', 'Revital', 'Rabemi-DSR', 'Rabeprazole',
+    'Sinarest', 'Soframycin', 'Strepsils',
+    'Thyronorm', 'Taxim-O',
+    'Ulgel', 'Unienzyme',
+    'Volini', 'Vicks',
+    'Wikoryl', 'Wysolone',
+    'Xarelto', 'Xone',
+    'Yondelis', 'Yogurt Sachets',
+    'Zyrtec', 'Zincovit',
+    # Additional common medicines
+    'Dolo', 'Crocin', 'Azithromycin', 'Azee', 'Zithromax', 'Amoxicillin', 'Mox',
+    'Ciprofloxacin', 'Ciplox', 'Pan', 'Omeprazole', 'Rabemi',
+    'Allegra', 'Montair', 'Montelukast',
+    'Metformin', 'Glycomet', 'Glimepiride', 'Amaryl',
+    'Atorvastatin', 'Atorva', 'Rosuvastatin', 'Crestor',
+    'Amlodipine', 'Amlong', 'Telmisartan', 'Telma',
+    'Flagyl', 'Ranitidine', 'Famotidine', 'Pepcid',
+    'Diclofenac', 'Voveran', 'Aceclofenac', 'Zerodol',
+    'Tramadol', 'Ultracet', 'Gabapentin', 'Gabapin',
+    'Pregabalin', 'Lyrica', 'Pregalin',
+    'Levothyroxine', 'Eltroxin',
+    'Vitamin', 'Calcium', 'Iron', 'Folic', 'B12', 'D3',
+    'Aspirin', 'Ecosprin', 'Clopidogrel', 'Plavix',
+    'Atenolol', 'Metoprolol', 'Propranolol',
+    'Losartan', 'Valsartan', 'Olmesartan',
+    'Hydrochlorothiazide', 'Furosemide', 'Lasix',
+    'Prednisolone', 'Dexamethasone',
+    'Levofloxacin', 'Levoflox', 'Moxifloxacin',
+    'Cefixime', 'Zifi', 'Cefpodoxime', 'Cephalexin',
+    'Doxycycline', 'Tetracycline',
+    'Fluconazole', 'Itraconazole',
+    'Acyclovir', 'Valacyclovir', 'Emeset',
+    'Alprazolam', 'Clonazepam', 'Lorazepam',
+    'Sertraline', 'Escitalopram', 'Fluoxetine',
+)
+
+# Spaces/hyphens inside a name are interchangeable in OCR text ('Dolo-650' == 'Dolo 650')
+NAME_SEPARATOR_RE = re.compile(r'[ \t\-]+')
+
+
+def normalize_medicine_name(name):
+    """Canonical lookup key: lowercase with runs of spaces/hyphens collapsed to one space"""
+    return NAME_SEPARATOR_RE.sub(' ', name.lower()).strip()
+
+
+# Canonical key -> spelling used in KNOWN_MEDICINES (first occurrence wins)
+KNOWN_MEDICINE_LOOKUP = {}
+for _med in KNOWN_MEDICINES:
+    KNOWN_MEDICINE_LOOKUP.setdefault(normalize_medicine_name(_med), _med)
+
+# Single-word names are matched by intersecting with the text's word tokens; the few
+# names with spaces/hyphens ('Dolo 650', 'Rabemi-DSR') still use a substring check
+WORD_TOKEN_RE = re.compile(r'\w+')
+KNOWN_SINGLE_WORD_NAMES = frozenset(sys.intern(n) for n in KNOWN_MEDICINE_LOOKUP if WORD_TOKEN_RE.fullmatch(n))
+KNOWN_MULTI_WORD_NAMES = tuple(n for n in KNOWN_MEDICINE_LOOKUP if n not in KNOWN_SINGLE_WORD_NAMES)
+# Position in KNOWN_MEDICINES, used to report matches in list order
+KNOWN_MEDICINE_RANK = {n: i for i, n in enumerate(KNOWN_MEDICINE_LOOKUP)}
+
+# Words that may be a misread single-word medicine name, and the usual OCR confusions
+# (0/o, @/a, 1/l, 3/e) folded away before comparing them with the known names
+OCR_WORD_RE = re.compile(r'[a-z0-9@]{4,}')
+OCR_CONFUSABLES = str.maketrans('0@13', 'oale')
+# A dosage run into the name ('paracetamol650mg') is dropped before matching
+DOSAGE_TAIL_RE = re.compile(r'\d+(?:mg|mcg|ml|g)?$')
+# Only words and names of 5+ letters are fuzzy-matched: one slip in a shorter name is another
+# word ('pain'/'plan'/'span' vs 'pan', 'dolor' vs 'dolo'), so those only ever match exactly
+FUZZY_MIN_LENGTH = 5
+FUZZY_MEDICINE_NAMES = tuple(n for n in KNOWN_SINGLE_WORD_NAMES if len(n) >= FUZZY_MIN_LENGTH)
+# Candidates for a word of each length: names at most one letter longer or shorter
+FUZZY_NAMES_BY_LENGTH = {
+    length: tuple(n for n in FUZZY_MEDICINE_NAMES if abs(len(n) - length) <= 1)
+    for length in range(FUZZY_MIN_LENGTH, max(map(len, FUZZY_MEDICINE_NAMES)) + 2)
+}
+# Minimum similarity (0-100, rapidfuzz ratio / difflib ratio * 100): about one slip in a 6-letter name
+FUZZY_MEDICINE_CUTOFF = 85
+
+
+@functools.lru_cache(maxsize=4096)
+def closest_known_medicine(word):
+    """Key of the known single-word medicine that an OCR'd lowercase word is a misreading of, or None"""
+    word = DOSAGE_TAIL_RE.sub('', word)
+    if len(word) < 4:
+        return None
+    word = word.translate(OCR_CONFUSABLES)
+    if word in KNOWN_SINGLE_WORD_NAMES:
+        return word
+    candidates = FUZZY_NAMES_BY_LENGTH.get(len(word))
+    if not candidates:
+        return None
+    if RAPIDFUZZ_AVAILABLE:
+        fuzz, process = get_rapidfuzz()
+        match = process.extractOne(word, candidates, scorer=fuzz.ratio, score_cutoff=FUZZY_MEDICINE_CUTOFF)
+        return match[0] if match else None
+    matches = difflib.get_close_matches(word, candidates, n=1, cutoff=FUZZY_MEDICINE_CUTOFF / 100)
+    return matches[0] if matches else None
+
+def name_trie_pattern(keys):
+    """Regex source matching any of `keys` (a space matches an optional space/hyphen), laid out
+    as a trie so each text position follows one branch instead of trying every name in turn.
+    Optional tails are greedy, so a longer name still wins over its prefix ('dolo 650' over 'dolo')."""
+    trie = {}
+    for key in keys:
+        node = trie
+        for i, part in enumerate(key.split(' ')):
+            if i:
+                node = node.setdefault(r'[\s\-]?', {})
+            for ch in part:
+                node = node.setdefault(re.escape(ch), {})
+        node[''] = {}  # a name ends here
+    
+    def build(node):
+        branches = [unit + build(child) for unit, child in node.items() if unit]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:%s)' % '|'.join(branches)
+        return '(?:%s)?' % body if '' in node else body
+    
+    return build(trie)
+
+
+# Compiled once at import: every known name as one trie-shaped pattern (the pure-regex
+# counterpart of an Aho-Corasick automaton) with an optional trailing dosage. The name must not
+# run into other letters ('dolo' in 'dolor'); digits may follow it directly ('Dolo650')
+KNOWN_MEDICINE_RE = re.compile(
+    r'(?<![a-z])((?:%s)(?![a-z])[\s\-]*\d*(?:\s*mg|\s*mcg|\s*ml)?)' % name_trie_pattern(KNOWN_MEDICINE_LOOKUP),
+    re.IGNORECASE,
+)
+# Unknown medicines: a capitalised word followed by a dosage number
+DOSAGE_NAME_RE = re.compile(r'([A-Z][a-zA-Z\-]+)\s*(\d+)\s*(mg|mcg|ml|g)?')
+ALL_CAPS_WORD_RE = re.compile(r'\b([A-Z]{4,})\b')
+
+# Display names for known medicines found anywhere in the text
+STANDARD_MEDICINE_NAMES = {
+    'paracetamol': 'Paracetamol',
+    'ondem': 'Ondem',
+    'ondansetron': 'Ondem',
+    'dolo': 'Dolo 650',
+    'dolo 650': 'Dolo 650',
+    'dolo-650': 'Dolo 650',
+    'calpol': 'Calpol',
+    'combiflam': 'Combiflam',
+    'brufen': 'Brufen',
+    'pantoprazole': 'Pantoprazole',
+    'omez': 'Omez',
+    'cetrizine': 'Cetrizine',
+    'cetirizine': 'Cetrizine',
+    'bifilac': 'Bifilac',
+    'rabemi-dsr': 'Rabemi-DSR',
+    'crocin': 'Paracetamol',
+}
+# Narrower views of the same mapping for per-line matches (first word) and ALL CAPS words
+LINE_MEDICINE_NAMES = {key: STANDARD_MEDICINE_NAMES[key] for key in ('paracetamol', 'ondem', 'dolo', 'calpol')}
+CAPS_MEDICINE_NAMES = {key: STANDARD_MEDICINE_NAMES[key] for key in ('paracetamol', 'ondem', 'bifilac')}
+# Words that DOSAGE_NAME_RE picks up before a number but are not medicine names
+DOSAGE_SKIP_WORDS = frozenset([
+    'the', 'and', 'for', 'with', 'take', 'daily', 'twice', 'once', 'after', 'before', 'food', 'meal',
+    'days', 'week', 'tablet', 'tablets', 'capsule', 'capsules', 'age', 'date', 'oct', 'nov', 'dec',
+    'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep',
+])
+
 def extract_medicine_names_from_text(text):
     """Extract medicine names from OCR text using pattern matching"""
     medicines = []
+    # Base names (first word, lowercased) already found; a later match with the same base is a duplicate
+    seen_bases = set()
     
-    # Common medicine name patterns
-    # Pattern 1: Words starting with capital letter followed by numbers (like Dolo 650, Pan 40)
-    pattern1 = r'\b([A-Z][a-z]+(?:\s*[-]?\s*\d+)?)\b'
-    
-    # Pattern 2: All caps words (like BIFILAC, RABEMI-DSR, PARACETAMOL, ONDEM)
-    pattern2 = r'\b([A-Z]{3,}(?:\s*[-]?\s*[A-Z0-9]+)?)\b'
-    
-    # Pattern 3: Common medicine suffixes
-    medicine_suffixes = ['mg', 'mcg', 'ml', 'tab', 'cap', 'syrup', 'tablet', 'capsule', 'injection']
-    
-    # Known medicine database for matching - comprehensive list including all from MEDICINE_DB and MEDICINE_INFO
-    known_medicines = [
-        # From MEDICINE_DB and MEDICINE_INFO
-        'Augmentin', 'Avil', 'Benadryl', 'Brufen', 'Bifilac', 'BIFILAC',
-        'Cetrizine', 'Cetirizine', 'Combiflam', 'Calpol',
-        'Dolo 650', 'Dolo-650', 'Domstal', 'Domperidone',
-        'Eno', 'Electral',
-        'Flexon', 'Fepanil',
-        'Gelusil', 'Gaviscon',
-        'Honitus', 'Hifenac',
-        'Ibugesic', 'Iodex', 'Ibuprofen',
-        'Junior Lanzol', 'Jiffy',
-        'Ketorol', 'Ketanov',
-        'Liv52', 'Limcee',
-        'Meftal Spas', 'Metrogyl', 'Metronidazole',
-        'Norflox', 'Nasivion',
-        'Omez', 'Ondem', 'ONDEM', 'O2', 'Ofloxacin', 'Ornidazole', 'Ondansetron',
-        'Paracetamol', 'PARACETAMOL', 'Pantoprazole',
-        'Quadriderm', 'Quinidine',
-        'Rantac', 'Revital', 'Rabemi-DSR', 'RABEMI-DSR', 'Rabeprazole',
-        'Sinarest', 'Soframycin', 'Strepsils',
-        'Thyronorm', 'Taxim-O',
-        'Ulgel', 'Unienzyme',
-        'Volini', 'Vicks',
-        'Wikoryl', 'Wysolone',
-        'Xarelto', 'Xone',
-        'Yondelis', 'Yogurt Sachets',
-        'Zyrtec', 'Zincovit',
-        # Additional common medicines
-        'Dolo', 'Crocin', 'Azithromycin', 'Azee', 'Zithromax', 'Amoxicillin', 'Mox',
-        'Ciprofloxacin', 'Ciplox', 'Pan', 'Omeprazole', 'Rabemi',
-        'Allegra', 'Montair', 'Montelukast',
-        'Metformin', 'Glycomet', 'Glimepiride', 'Amaryl',
-        'Atorvastatin', 'Atorva', 'Rosuvastatin', 'Crestor',
-        'Amlodipine', 'Amlong', 'Telmisartan', 'Telma',
-        'Flagyl', 'Ranitidine', 'Famotidine', 'Pepcid',
-        'Diclofenac', 'Voveran', 'Aceclofenac', 'Zerodol',
-        'Tramadol', 'Ultracet', 'Gabapentin', 'Gabapin',
-        'Pregabalin', 'Lyrica', 'Pregalin',
-        'Levothyroxine', 'Eltroxin',
-        'Vitamin', 'Calcium', 'Iron', 'Folic', 'B12', 'D3',
-        'Aspirin', 'Ecosprin', 'Clopidogrel', 'Plavix',
-        'Atenolol', 'Metoprolol', 'Propranolol',
-        'Losartan', 'Valsartan', 'Olmesartan',
-        'Hydrochlorothiazide', 'Furosemide', 'Lasix',
-        'Prednisolone', 'Dexamethasone',
-        'Levofloxacin', 'Levoflox', 'Moxifloxacin',
-        'Cefixime', 'Zifi', 'Cefpodoxime', 'Cephalexin',
-        'Doxycycline', 'Tetracycline',
-        'Fluconazole', 'Itraconazole',
-        'Acyclovir', 'Valacyclovir', 'Emeset',
-        'Alprazolam', 'Clonazepam', 'Lorazepam',
-        'Sertraline', 'Escitalopram', 'Fluoxetine',
-    ]
-    
-    # Standard name mappings
-    standard_names = {
-        'paracetamol': 'Paracetamol',
-        'ondem': 'Ondem',
-        'ondansetron': 'Ondem',
-        'dolo': 'Dolo 650',
-        'dolo 650': 'Dolo 650',
-        'dolo-650': 'Dolo 650',
-        'calpol': 'Calpol',
-        'combiflam': 'Combiflam',
-        'brufen': 'Brufen',
-        'pantoprazole': 'Pantoprazole',
-        'omez': 'Omez',
-        'cetrizine': 'Cetrizine',
-        'cetirizine': 'Cetrizine',
-        'bifilac': 'Bifilac',
-        'rabemi-dsr': 'Rabemi-DSR',
-        'crocin': 'Paracetamol',
-    }
+    def add_medicine(name):
+        base = name.lower().split()[0] if name.split() else name.lower()
+        if base in seen_bases:
+            return False
+        seen_bases.add(base)
+        medicines.append(name)
+        return True
     
     # Convert text to lines for processing
     lines = text.split('\n')
@@ -2417,175 +2924,157 @@ def extract_medicine_names_from_text(text):
     
     logger.info(f"Searching for medicines in text ({len(text)} chars)")
     
-    # PRIORITY 1: Direct search for specific medicine names using regex (handles OCR variations)
-    # Look for PARACETAMOL variations
-    paracetamol_patterns = [
-        r'paracetamol',
-        r'paracetam[o0]l',
-        r'paracetam[o0][l1]',
-        r'p[a@]r[a@]cet[a@]m[o0][l1]',
-        r'parcetamol',
-        r'paracetmol',
-    ]
-    for pattern in paracetamol_patterns:
-        if re.search(pattern, full_text_lower):
-            if 'Paracetamol' not in medicines:
-                medicines.append('Paracetamol')
-                logger.info(f"Found Paracetamol via pattern: {pattern}")
-            break
-    
-    # Look for ONDEM variations
-    ondem_patterns = [
-        r'ondem',
-        r'[o0]ndem',
-        r'[o0]nd[e3]m',
-        r'onderm',
-    ]
-    for pattern in ondem_patterns:
-        if re.search(pattern, full_text_lower):
-            if 'Ondem' not in medicines:
-                medicines.append('Ondem')
-                logger.info(f"Found Ondem via pattern: {pattern}")
-            break
-    
-    # PRIORITY 2: Check for known medicines in the entire text (case-insensitive)
-    for med in known_medicines:
-        med_lower = med.lower()
-        if med_lower in full_text_lower:
-            # Found a known medicine - add the properly capitalized version
-            standard_name = standard_names.get(med_lower, med)
-            if standard_name not in medicines:
-                medicines.append(standard_name)
-                logger.info(f"Found known medicine: {standard_name}")
+    # PRIORITY 1: Check for known medicines in the entire text (case-insensitive)
+    hits = set(WORD_TOKEN_RE.findall(full_text_lower)).intersection(KNOWN_SINGLE_WORD_NAMES)
+    # Words that are close to, but not exactly, a known name (OCR misreads like PARACETAM0L, 0NDEM)
+    for word in set(OCR_WORD_RE.findall(full_text_lower)).difference(hits):
+        med_lower = closest_known_medicine(word)
+        if med_lower and med_lower not in hits:
+            hits.add(med_lower)
+            logger.info(f"Found {KNOWN_MEDICINE_LOOKUP[med_lower]} via fuzzy match: {word}")
+    normalized_text = NAME_SEPARATOR_RE.sub(' ', full_text_lower)
+    hits.update(name for name in KNOWN_MULTI_WORD_NAMES if name in normalized_text)
+    for med_lower in sorted(hits, key=KNOWN_MEDICINE_RANK.get):
+        # Found a known medicine - add the properly capitalized version
+        standard_name = STANDARD_MEDICINE_NAMES.get(med_lower, KNOWN_MEDICINE_LOOKUP[med_lower])
+        if add_medicine(standard_name):
+            logger.info(f"Found known medicine: {standard_name}")
     
     for line in lines:
         line = line.strip()
         if not line:
             continue
         
-        # Check for known medicines in each line
-        for med in known_medicines:
-            if med.lower() in line.lower():
-                # Extract the full medicine name with dosage if present
-                pattern = rf'({re.escape(med)}[\s\-]*\d*(?:\s*mg|\s*mcg|\s*ml)?)'
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                for match in matches:
-                    clean_name = match.strip()
-                    # Normalize the name
-                    clean_name_lower = clean_name.lower().split()[0] if clean_name.split() else clean_name.lower()
-                    standard_names = {
-                        'paracetamol': 'Paracetamol',
-                        'ondem': 'Ondem',
-                        'dolo': 'Dolo 650',
-                        'calpol': 'Calpol',
-                    }
-                    normalized = standard_names.get(clean_name_lower, clean_name)
-                    if normalized and normalized not in medicines:
-                        medicines.append(normalized)
+        # Check for known medicines in each line, extracting the name with dosage if present
+        for match in KNOWN_MEDICINE_RE.findall(line):
+            clean_name = match.strip()
+            # Normalize the name
+            clean_name_lower = clean_name.lower().split()[0] if clean_name.split() else clean_name.lower()
+            normalized = LINE_MEDICINE_NAMES.get(clean_name_lower, clean_name)
+            if normalized:
+                add_medicine(normalized)
         
         # Also try pattern matching for unknown medicines
         # Look for words followed by dosage numbers
-        dosage_pattern = r'([A-Z][a-zA-Z\-]+)\s*(\d+)\s*(mg|mcg|ml|g)?'
-        matches = re.findall(dosage_pattern, line)
-        for match in matches:
-            name = f"{match[0]} {match[1]}"
-            if match[2]:
-                name += f" {match[2]}"
-            if name.strip() and name not in medicines:
-                # Filter out common non-medicine words
-                skip_words = ['the', 'and', 'for', 'with', 'take', 'daily', 'twice', 'once', 'after', 'before', 'food', 'meal', 'days', 'week', 'tablet', 'tablets', 'capsule', 'capsules', 'age', 'date', 'oct', 'nov', 'dec', 'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep']
-                if match[0].lower() not in skip_words:
-                    medicines.append(name.strip())
+        for word, number, unit in DOSAGE_NAME_RE.findall(line):
+            # Filter out common non-medicine words before building the name
+            if word.lower() in DOSAGE_SKIP_WORDS:
+                continue
+            add_medicine(f"{word} {number} {unit}" if unit else f"{word} {number}")
         
         # Also look for ALL CAPS words that might be medicine names (like PARACETAMOL, ONDEM)
-        all_caps_pattern = r'\b([A-Z]{4,})\b'
-        caps_matches = re.findall(all_caps_pattern, line)
+        caps_matches = ALL_CAPS_WORD_RE.findall(line)
         for caps_match in caps_matches:
             caps_lower = caps_match.lower()
             # Check if it's a known medicine
-            for med in known_medicines:
-                if med.lower() == caps_lower:
-                    standard_names = {
-                        'paracetamol': 'Paracetamol',
-                        'ondem': 'Ondem',
-                        'bifilac': 'Bifilac',
-                    }
-                    normalized = standard_names.get(caps_lower, med)
-                    if normalized not in medicines:
-                        medicines.append(normalized)
-                        logger.info(f"Found ALL CAPS medicine: {normalized}")
-                    break
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_medicines = []
-    for med in medicines:
-        med_lower = med.lower().split()[0] if med.split() else med.lower()  # Compare base name
-        if med_lower not in seen:
-            seen.add(med_lower)
-            unique_medicines.append(med)
+            med = KNOWN_MEDICINE_LOOKUP.get(caps_lower)
+            if med:
+                normalized = CAPS_MEDICINE_NAMES.get(caps_lower, med)
+                if add_medicine(normalized):
+                    logger.info(f"Found ALL CAPS medicine: {normalized}")
     
-    logger.info(f"Final extracted medicines: {unique_medicines}")
-    return unique_medicines
+    logger.info(f"Final extracted medicines: {medicines}")
+    return medicines
 
 
-def extract_medicines_from_prescription(image_content):
-    """Extract medicines from prescription - tries multiple methods"""
-    logger.info("=" * 50)
-    logger.info("EXTRACTING MEDICINES FROM PRESCRIPTION")
-    logger.info("=" * 50)
-    
-    # METHOD 1: Try Gemini first (better accuracy for prescription images)
+def prescription_medicines_with_gemini(image_content):
+    """Gemini backend for extract_medicines_from_prescription; None when unavailable or failed"""
     gemini_key = os.environ.get('GEMINI_API_KEY') or GEMINI_API_KEY_FALLBACK
-    if GEMINI_AVAILABLE and gemini_key:
-        logger.info("Trying Gemini API for prescription analysis (best accuracy)...")
-        try:
-            medicines = extract_medicines_with_gemini(image_content)
-            if medicines is not None and len(medicines) > 0:
-                logger.info(f"Successfully extracted {len(medicines)} medicines with Gemini: {medicines}")
-                return medicines
-            elif medicines is not None:
-                logger.info("Gemini found no medicines, trying other methods...")
-        except Exception as e:
-            logger.warning(f"Gemini extraction failed: {e}")
-    else:
+    if not (GEMINI_AVAILABLE and gemini_key):
         logger.info(f"Gemini not available (GEMINI_AVAILABLE={GEMINI_AVAILABLE}, key_set={bool(gemini_key)})")
-    
-    # METHOD 2: Try Google Vision API (uses vision-key.json)
+        return None
+    logger.info("Trying Gemini API for prescription analysis (best accuracy)...")
+    try:
+        medicines = extract_medicines_with_gemini([image_content])
+        if medicines:
+            logger.info(f"Successfully extracted {len(medicines)} medicines with Gemini: {medicines}")
+        elif medicines is not None:
+            logger.info("Gemini read the prescription and found no medicines")
+        return medicines
+    except Exception as e:
+        logger.warning(f"Gemini extraction failed: {e}")
+        return None
+
+
+@cache_by_image
+def prescription_medicines_with_vision(image_content):
+    """Google Vision backend for extract_medicines_from_prescription (uses vision-key.json).
+    Cached per image, so the Vision retry in the upload endpoints does not repeat the request"""
     logger.info("Trying Google Vision API for prescription OCR...")
     try:
-        image = vision.Image(content=image_content)
-        response = global_vision_client.text_detection(image=image)
+        image = vision_image(image_content)
+        response = get_vision_client().text_detection(image=image)
         texts = response.text_annotations
         
-        if texts:
-            full_text = texts[0].description
-            logger.info(f"Google Vision extracted text ({len(full_text)} chars): {full_text[:500]}...")
-            medicines = extract_medicine_names_from_text(full_text)
-            if medicines:
-                logger.info(f"Successfully extracted {len(medicines)} medicines with Google Vision: {medicines}")
-                return medicines
-            else:
-                logger.info("Google Vision found text but no medicines matched")
-        else:
+        if not texts:
             logger.warning("Google Vision returned no text")
+            return None
+        full_text = texts[0].description
+        logger.info(f"Google Vision extracted text ({len(full_text)} chars): {full_text[:500]}...")
+        medicines = extract_medicine_names_from_text(full_text)
+        if medicines:
+            logger.info(f"Successfully extracted {len(medicines)} medicines with Google Vision: {medicines}")
+        else:
+            logger.info("Google Vision found text but no medicines matched")
+        return medicines
     except Exception as e:
         logger.warning(f"Google Vision extraction failed: {e}")
-    
-    # METHOD 3: Try FREE Tesseract OCR (no API key needed!)
-    if TESSERACT_AVAILABLE:
-        logger.info("Using FREE Tesseract OCR for prescription analysis...")
-        try:
-            medicines = extract_medicines_with_tesseract(image_content)
-            if medicines is not None and len(medicines) > 0:
-                logger.info(f"Successfully extracted {len(medicines)} medicines with Tesseract (FREE): {medicines}")
-                return medicines
-            elif medicines is not None:
-                logger.info("Tesseract found no medicines, trying other methods...")
-        except Exception as e:
-            logger.warning(f"Tesseract extraction failed: {e}")
-    else:
+        return None
+
+
+def prescription_medicines_with_tesseract(image_content):
+    """FREE Tesseract backend for extract_medicines_from_prescription (no API key needed)"""
+    if not TESSERACT_AVAILABLE:
         logger.warning("Tesseract not available. Install from: https://github.com/UB-Mannheim/tesseract/wiki")
+        return None
+    logger.info("Using FREE Tesseract OCR for prescription analysis...")
+    try:
+        medicines = extract_medicines_with_tesseract(image_content)
+        if medicines:
+            logger.info(f"Successfully extracted {len(medicines)} medicines with Tesseract (FREE): {medicines}")
+        elif medicines is not None:
+            logger.info("Tesseract found no medicines")
+        return medicines
+    except Exception as e:
+        logger.warning(f"Tesseract extraction failed: {e}")
+        return None
+
+
+# How long a finished Vision/Tesseract result waits for Gemini (the most accurate backend) to answer
+GEMINI_PREFERENCE_WAIT = 2
+
+
+@cache_by_image
+def extract_medicines_from_prescription(image_content):
+    """Extract medicines from prescription - races Gemini, Google Vision and Tesseract, then tries ChatGPT"""
+    logger.debug("Extracting medicines from prescription")
+    
+    # METHODS 1-3: run concurrently (Tesseract's CPU work overlaps the API round trips);
+    # the drivers go on API_POOL since the Tesseract one itself waits on OCR_POOL
+    gemini_future = API_POOL.submit(prescription_medicines_with_gemini, image_content)
+    futures = [
+        gemini_future,
+        API_POOL.submit(prescription_medicines_with_vision, image_content),
+        API_POOL.submit(prescription_medicines_with_tesseract, image_content),
+    ]
+    try:
+        # Prefer Gemini when it answers within the grace period. A valid empty list from it
+        # means it read the image and found nothing, so the other backends aren't waited for
+        medicines = gemini_future.result(timeout=GEMINI_PREFERENCE_WAIT)
+        if medicines is not None:
+            # Only drops backends still queued on API_POOL; running ones finish in the background
+            # and their API calls are still billed
+            for pending in futures:
+                pending.cancel()
+            return medicines
+    except FutureTimeoutError:
+        logger.info("Gemini still running after %ss, accepting the first backend with results", GEMINI_PREFERENCE_WAIT)
+    for future in as_completed(futures):
+        medicines = future.result()
+        if medicines or (future is gemini_future and medicines is not None):
+            for pending in futures:
+                pending.cancel()
+            return medicines
     
     # METHOD 4: Try ChatGPT if API key is available
     openai_key = os.environ.get('OPENAI_API_KEY')
@@ -2607,6 +3096,127 @@ def extract_medicines_from_prescription(image_content):
     logger.error("No OCR method available. Please install Tesseract OCR (FREE): https://github.com/UB-Mannheim/tesseract/wiki")
     return None
 
+def vision_batch_text_detection(images, batch_size=16):
+    """OCR several images with Google Vision batch_annotate_images; one request per batch_size images"""
+    vision = get_vision()
+    client = get_vision_client()
+    feature = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+    texts = []
+    for start in range(0, len(images), batch_size):
+        requests_batch = [
+            vision.AnnotateImageRequest(image=vision_image(content), features=[feature])
+            for content in images[start:start + batch_size]
+        ]
+        response = client.batch_annotate_images(requests=requests_batch)
+        for res in response.responses:
+            if res.error.message:
+                logger.warning(f"Google Vision batch item failed: {res.error.message}")
+            texts.append(res.text_annotations[0].description if res.text_annotations else '')
+    return texts
+
+
+def pages_medicines_with_gemini(images):
+    """Gemini backend for extract_medicines_from_prescription_pages: all pages in one request"""
+    gemini_key = os.environ.get('GEMINI_API_KEY') or GEMINI_API_KEY_FALLBACK
+    if not (GEMINI_AVAILABLE and gemini_key):
+        return None
+    try:
+        medicines = extract_medicines_with_gemini(images)
+        if medicines is not None:
+            # An empty list is Gemini reading every page and finding no medicines
+            logger.info(f"Extracted {len(medicines)} medicines with Gemini: {medicines}")
+        else:
+            logger.info("Gemini gave no usable answer for the pages")
+        return medicines
+    except Exception as e:
+        logger.warning(f"Gemini multi-page extraction failed: {e}")
+        return None
+
+
+def pages_medicines_with_vision(images):
+    """Google Vision backend for extract_medicines_from_prescription_pages: one batch request"""
+    try:
+        full_text = '\n'.join(vision_batch_text_detection(images))
+        if full_text.strip():
+            logger.info(f"Google Vision batch extracted text ({len(full_text)} chars): {full_text[:500]}...")
+            medicines = extract_medicine_names_from_text(full_text)
+            if medicines:
+                return medicines
+            logger.info("Google Vision batch found text but no medicines matched")
+    except Exception as e:
+        logger.warning(f"Google Vision batch extraction failed: {e}")
+    return None
+
+
+def extract_medicines_from_prescription_pages(images):
+    """Extract medicines from a multi-page prescription: races one Gemini request for all pages
+    against one Vision batch, then falls back to the per-image pipeline"""
+    logger.info(f"Extracting medicines from {len(images)} prescription pages")
+    gemini_future = API_POOL.submit(pages_medicines_with_gemini, images)
+    vision_future = API_POOL.submit(pages_medicines_with_vision, images)
+    try:
+        # Same preference as extract_medicines_from_prescription: Gemini's answer, including a
+        # confident empty list, wins if it arrives within the grace period
+        medicines = gemini_future.result(timeout=GEMINI_PREFERENCE_WAIT)
+        if medicines is not None:
+            # A no-op once the Vision batch has started; it then runs (and is billed) to completion
+            vision_future.cancel()
+            return medicines
+    except FutureTimeoutError:
+        logger.info(f"Gemini still running after {GEMINI_PREFERENCE_WAIT}s, accepting the first backend with results")
+    for future in as_completed((gemini_future, vision_future)):
+        medicines = future.result()
+        if medicines or (future is gemini_future and medicines is not None):
+            gemini_future.cancel()
+            vision_future.cancel()
+            return medicines
+    
+    # Fall back to the per-image pipeline and merge results in page order
+    medicines = []
+    found_any = False
+    for image_content in images:
+        page_medicines = extract_medicines_from_prescription(image_content)
+        if page_medicines is None:
+            continue
+        found_any = True
+        for med in page_medicines:
+            if med not in medicines:
+                medicines.append(med)
+    return medicines if found_any else None
+
+def debug_vision_ocr(image_content):
+    """Google Vision fields for /api/debug_prescription"""
+    result = {}
+    try:
+        image = vision_image(image_content)
+        response = get_vision_client().text_detection(image=image)
+        texts = response.text_annotations
+        if texts:
+            result['vision_text'] = texts[0].description[:1000]
+            result['vision_success'] = True
+        else:
+            result['vision_text'] = 'No text detected'
+            result['vision_success'] = False
+    except Exception as e:
+        result['vision_error'] = str(e)
+        result['vision_success'] = False
+    return result
+
+
+def debug_tesseract_ocr(image_content):
+    """Tesseract fields for /api/debug_prescription"""
+    result = {}
+    try:
+        image_pil = open_image(image_content)
+        text = tesseract_image_to_string(image_pil)
+        result['tesseract_text'] = text[:1000] if text else 'No text detected'
+        result['tesseract_success'] = bool(text.strip())
+    except Exception as e:
+        result['tesseract_error'] = str(e)
+        result['tesseract_success'] = False
+    return result
+
+
 @app.route('/api/debug_prescription', methods=['POST'])
 def debug_prescription():
     """Debug endpoint to test prescription OCR"""
@@ -2628,33 +3238,12 @@ def debug_prescription():
             'gemini_key_set': bool(os.environ.get('GEMINI_API_KEY') or GEMINI_API_KEY_FALLBACK),
         }
         
-        # Try Google Vision
-        try:
-            image = vision.Image(content=image_content)
-            response = global_vision_client.text_detection(image=image)
-            texts = response.text_annotations
-            if texts:
-                result['vision_text'] = texts[0].description[:1000]
-                result['vision_success'] = True
-            else:
-                result['vision_text'] = 'No text detected'
-                result['vision_success'] = False
-        except Exception as e:
-            result['vision_error'] = str(e)
-            result['vision_success'] = False
-        
-        # Try Tesseract
-        if TESSERACT_AVAILABLE:
-            try:
-                from io import BytesIO
-                from PIL import Image
-                image_pil = Image.open(BytesIO(image_content))
-                text = pytesseract.image_to_string(image_pil)
-                result['tesseract_text'] = text[:1000] if text else 'No text detected'
-                result['tesseract_success'] = bool(text.strip())
-            except Exception as e:
-                result['tesseract_error'] = str(e)
-                result['tesseract_success'] = False
+        # Google Vision (network) and Tesseract (local CPU) run at the same time
+        vision_future = API_POOL.submit(debug_vision_ocr, image_content)
+        tesseract_future = OCR_POOL.submit(debug_tesseract_ocr, image_content) if TESSERACT_AVAILABLE else None
+        result.update(vision_future.result())
+        if tesseract_future is not None:
+            result.update(tesseract_future.result())
         
         # Try to extract medicines from any text we got
         combined_text = result.get('vision_text', '') + '\n' + result.get('tesseract_text', '')
@@ -2664,10 +3253,98 @@ def debug_prescription():
         
         return jsonify(result)
         
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# Successful /api/test_api_key probes per API key digest: (expires_at, result fields)
+GEMINI_PROBE_CACHE = {}
+GEMINI_PROBE_TTL = 600
+
+
+def probe_gemini_api(gemini_key, refresh=False):
+    """Test generate_content call for /api/test_api_key; returns the result fields.
+    Tries the model the prescription path already uses first (no list_models round trip);
+    refresh=True, or a failed quick test, runs the full list_models probe."""
+    if not refresh:
+        try:
+            model = get_gemini_listed_model(gemini_key)
+            test_response = model.generate_content("Say 'API test successful'")
+            return {
+                'api_test': 'SUCCESS',
+                'api_response': test_response.text[:100] if test_response.text else 'No response',
+                'model_used': model.model_name,
+                'list_models_skipped': True,
+            }
+        except Exception as e:
+            logger.info(f"Quick Gemini probe failed, running the full probe: {e}")
+    
+    result = {}
+    try:
+        genai = get_genai()
+        genai.configure(api_key=gemini_key)
+        
+        # First, try to list available models
+        available_models = []
+        try:
+            available_models = [m.name for m in genai.list_models()]
+            result['available_models'] = available_models[:10]  # First 10 models
+        except Exception as list_error:
+            result['list_models_error'] = str(list_error)
+        
+        # Try available models - prioritize flash models
+        preferred_models = [
+            'models/gemini-2.0-flash',
+            'models/gemini-2.5-flash',
+            'models/gemini-2.5-pro',
+            'models/gemini-2.0-flash-001',
+        ]
+        
+        model_worked = False
+        # First try preferred models from available list
+        for model_name in preferred_models:
+            if model_name in available_models:
+                try:
+                    model = genai.GenerativeModel(model_name)
+                    test_response = model.generate_content("Say 'API test successful'")
+                    result['api_test'] = 'SUCCESS'
+                    result['api_response'] = test_response.text[:100] if test_response.text else 'No response'
+                    result['model_used'] = model_name
+                    model_worked = True
+                    break
+                except Exception as model_error:
+                    result[f'model_{model_name.replace("/", "_")}_error'] = str(model_error)[:200]
+                    continue
+        
+        # If preferred didn't work, try any gemini model
+        if not model_worked:
+            for model_name in available_models:
+                if 'gemini' in model_name.lower() and 'embedding' not in model_name.lower():
+                    try:
+                        model = genai.GenerativeModel(model_name)
+                        test_response = model.generate_content("Say 'API test successful'")
+                        result['api_test'] = 'SUCCESS'
+                        result['api_response'] = test_response.text[:100] if test_response.text else 'No response'
+                        result['model_used'] = model_name
+                        model_worked = True
+                        break
+                    except Exception as model_error:
+                        continue
+        
+        if not model_worked:
+            result['api_test'] = 'FAILED'
+            result['api_error'] = 'All available models failed. Check model_*_error fields above.'
+            result['error_type'] = 'AllModelsFailed'
+            
+    except Exception as e:
+        result['api_test'] = 'FAILED'
+        result['api_error'] = str(e)
+        result['error_type'] = type(e).__name__
+    return result
+
+
 @app.route('/api/test_api_key', methods=['GET'])
 def test_api_key():
     """Test endpoint to check API key configuration"""
@@ -2684,138 +3361,98 @@ def test_api_key():
         'using_fallback': not os.environ.get('GEMINI_API_KEY') and bool(GEMINI_API_KEY_FALLBACK)
     }
     
-    # Try to actually call the API to test if it works
+    # Try to actually call the API to test if it works; a successful probe is reused for
+    # GEMINI_PROBE_TTL seconds so repeated checks skip the test call. ?refresh=1 bypasses
+    # the cache and lists the models the key can use
     if GEMINI_AVAILABLE and gemini_key:
-        try:
-            genai.configure(api_key=gemini_key)
-            
-            # First, try to list available models
-            try:
-                available_models = [m.name for m in genai.list_models()]
-                result['available_models'] = available_models[:10]  # First 10 models
-            except Exception as list_error:
-                result['list_models_error'] = str(list_error)
-            
-            # Try available models - prioritize flash models
-            preferred_models = [
-                'models/gemini-2.0-flash',
-                'models/gemini-2.5-flash',
-                'models/gemini-2.5-pro',
-                'models/gemini-2.0-flash-001',
-            ]
-            
-            model_worked = False
-            # First try preferred models from available list
-            for model_name in preferred_models:
-                if model_name in available_models:
-                    try:
-                        model = genai.GenerativeModel(model_name)
-                        test_response = model.generate_content("Say 'API test successful'")
-                        result['api_test'] = 'SUCCESS'
-                        result['api_response'] = test_response.text[:100] if test_response.text else 'No response'
-                        result['model_used'] = model_name
-                        model_worked = True
-                        break
-                    except Exception as model_error:
-                        result[f'model_{model_name.replace("/", "_")}_error'] = str(model_error)[:200]
-                        continue
-            
-            # If preferred didn't work, try any gemini model
-            if not model_worked:
-                for model_name in available_models:
-                    if 'gemini' in model_name.lower() and 'embedding' not in model_name.lower():
-                        try:
-                            model = genai.GenerativeModel(model_name)
-                            test_response = model.generate_content("Say 'API test successful'")
-                            result['api_test'] = 'SUCCESS'
-                            result['api_response'] = test_response.text[:100] if test_response.text else 'No response'
-                            result['model_used'] = model_name
-                            model_worked = True
-                            break
-                        except Exception as model_error:
-                            continue
-            
-            if not model_worked:
-                result['api_test'] = 'FAILED'
-                result['api_error'] = 'All available models failed. Check model_*_error fields above.'
-                result['error_type'] = 'AllModelsFailed'
-                
-        except Exception as e:
-            result['api_test'] = 'FAILED'
-            result['api_error'] = str(e)
-            result['error_type'] = type(e).__name__
+        refresh = request.args.get('refresh') == '1'
+        key_digest = api_key_digest(gemini_key)
+        cached = GEMINI_PROBE_CACHE.get(key_digest)
+        if cached and cached[0] > time.monotonic() and not refresh:
+            result.update(cached[1])
+            result['cached'] = True
+        else:
+            probe = probe_gemini_api(gemini_key, refresh)
+            if probe.get('api_test') == 'SUCCESS':
+                GEMINI_PROBE_CACHE[key_digest] = (time.monotonic() + GEMINI_PROBE_TTL, probe)
+            result.update(probe)
     
     return jsonify(result)
 
 def extract_medicines_with_vision_api(image_content):
-    """Extract medicine names using Google Vision API OCR"""
-    try:
-        logger.info("Trying Google Vision API for prescription OCR...")
-        image = vision.Image(content=image_content)
-        response = global_vision_client.text_detection(image=image)
-        texts = response.text_annotations
-        
-        if not texts:
-            logger.warning("Google Vision returned no text")
-            return None
-        
-        full_text = texts[0].description
-        logger.info(f"Google Vision extracted text ({len(full_text)} chars): {full_text[:500]}...")
-        
-        # Extract medicine names from the text
-        medicines = extract_medicine_names_from_text(full_text)
-        logger.info(f"Extracted {len(medicines)} medicines from Vision API text: {medicines}")
-        return medicines
-        
-    except Exception as e:
-        logger.error(f"Google Vision API error: {e}")
-        return None
+    """Extract medicine names using Google Vision API OCR; reuses the result of the Vision
+    backend when extract_medicines_from_prescription already ran it on this image"""
+    return prescription_medicines_with_vision(image_content)
+
+
+def prescription_availability(medicines_list):
+    """Availability/price rows for the medicines found on a prescription.
+    All names are resolved against one stock snapshot, and repeated names are looked up once."""
+    results = []
+    stock_by_name = {}
+    ttl_bucket = int(time.monotonic() // MEDICINE_STOCK_TTL)
+    for med_name in medicines_list:
+        name_lower = med_name.strip().lower()
+        if name_lower not in stock_by_name:
+            stock_by_name[name_lower] = find_medicine_stock(name_lower, ttl_bucket)
+        availability = availability_from_stock(med_name, stock_by_name[name_lower])
+        results.append({
+            'name': availability['name'],
+            'available': availability['available'],
+            'quantity': availability['quantity'],
+            'price': availability['price']
+        })
+    return results
 
 
 @app.route('/api/analyze_prescription', methods=['POST'])
 def analyze_prescription():
     """Analyze prescription image and check medicine availability"""
-    logger.info("=" * 50)
-    logger.info("PRESCRIPTION UPLOAD REQUEST RECEIVED")
-    logger.info("=" * 50)
+    logger.debug("Prescription upload request received")
     
     if not session.get('logged_in'):
         logger.warning("Unauthorized request - user not logged in")
         return jsonify({'error': 'Unauthorized'}), 401
     
     try:
-        logger.info("Checking for prescription file...")
+        logger.debug("Checking for prescription file...")
         if 'prescription' not in request.files:
             logger.error("No 'prescription' key in request.files")
             return jsonify({'error': 'No prescription file provided'}), 400
         
-        file = request.files['prescription']
-        logger.info(f"File received: {file.filename if file else 'None'}")
+        # Several 'prescription' files may be sent for a multi-page prescription
+        files = [f for f in request.files.getlist('prescription') if f.filename != '']
+        file = files[0] if files else request.files['prescription']
+        logger.debug("File received: %s (%d file(s))", file.filename if file else None, len(files))
         
         if file.filename == '':
             logger.error("Empty filename")
             return jsonify({'error': 'No file selected'}), 400
         
         # Read image content
-        logger.info("Reading image content...")
+        logger.debug("Reading image content...")
         image_content = file.read()
-        logger.info(f"Image content size: {len(image_content)} bytes")
+        logger.debug("Image content size: %d bytes", len(image_content))
         
         if not image_content:
             logger.error("Empty image content")
             return jsonify({'error': 'Could not read file content'}), 400
         
         # Extract medicines using available methods
-        logger.info("Starting prescription analysis...")
-        medicines_list = extract_medicines_from_prescription(image_content)
-        logger.info(f"Primary extraction result: {medicines_list}")
+        logger.debug("Starting prescription analysis...")
+        extra_pages = [content for content in (f.read() for f in files[1:]) if content]
+        if extra_pages:
+            medicines_list = extract_medicines_from_prescription_pages([image_content] + extra_pages)
+        else:
+            medicines_list = extract_medicines_from_prescription(image_content)
+        logger.debug("Primary extraction result: %s", medicines_list)
         
         # If primary methods failed or returned empty, try Google Vision API
         if not medicines_list:
             logger.info("Primary methods returned empty, trying Google Vision API...")
             try:
                 medicines_list = extract_medicines_with_vision_api(image_content)
-                logger.info(f"Vision API extraction result: {medicines_list}")
+                logger.debug("Vision API extraction result: %s", medicines_list)
             except Exception as ve:
                 logger.warning(f"Vision API failed: {ve}")
         
@@ -2838,23 +3475,16 @@ def analyze_prescription():
             return jsonify({'medicines': []})
         
         # Check availability for each medicine
-        results = []
-        for med_name in medicines_list:
-            availability = check_medicine_availability_in_db(med_name)
-            results.append({
-                'name': availability['name'],
-                'available': availability['available'],
-                'quantity': availability['quantity'],
-                'price': availability['price']
-            })
-        
-        logger.info(f"Returning {len(results)} medicines: {results}")
+        results = prescription_availability(medicines_list)
+        
+        logger.info("Returning %d medicines: %s", len(results), results)
         return jsonify({'medicines': results})
         
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         error_details = str(e)
         logger.error(f"Error analyzing prescription: {error_details}", exc_info=True)
-        import traceback
         full_trace = traceback.format_exc()
         logger.error(f"Full traceback:\n{full_trace}")
         
@@ -2865,38 +3495,215 @@ def analyze_prescription():
         
         return jsonify({'error': user_error}), 500
 
-def post_process_extracted_data(brand, dosage, batch, mfd_date, exp_date, manufacturer, mrp_str, full_text):
+@app.route('/api/analyze_prescription/stream', methods=['POST'])
+def analyze_prescription_stream():
+    """Same as /api/analyze_prescription, but streams progress as Server-Sent Events
+    (progress -> result | error) so the page can update before OCR finishes"""
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    files = [f for f in request.files.getlist('prescription') if f.filename != '']
+    if not files:
+        return jsonify({'error': 'No prescription file provided'}), 400
+    images = [content for content in (f.read() for f in files) if content]
+    if not images:
+        return jsonify({'error': 'Could not read file content'}), 400
+    
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    
+    @stream_with_context
+    def generate():
+        yield sse('progress', {'stage': 'ocr', 'pages': len(images)})
+        try:
+            if len(images) > 1:
+                medicines_list = extract_medicines_from_prescription_pages(images)
+            else:
+                medicines_list = extract_medicines_from_prescription(images[0])
+            if not medicines_list:
+                medicines_list = extract_medicines_with_vision_api(images[0])
+            
+            if medicines_list is None:
+                yield sse('error', {'error': 'Failed to process prescription. Please try with a clearer image.'})
+                return
+            
+            yield sse('progress', {'stage': 'matching', 'found': len(medicines_list)})
+            yield sse('result', {'medicines': prescription_availability(medicines_list)})
+        except Exception as e:
+            logger.error(f"Error streaming prescription analysis: {e}", exc_info=True)
+            yield sse('error', {'error': f'Error processing prescription: {str(e)[:200]}'})
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Background prescription jobs by id: (expires_at, future); finished results are kept
+# for PRESCRIPTION_JOB_TTL seconds after submission so the page can poll for them
+PRESCRIPTION_JOBS = OrderedDict()
+PRESCRIPTION_JOBS_LOCK = threading.Lock()
+PRESCRIPTION_JOB_TTL = 600
+# Jobs queued or running at once; each holds its upload bytes, so more are turned away with 503
+PRESCRIPTION_JOB_LIMIT = 8
+PRESCRIPTION_JOB_SLOTS = threading.BoundedSemaphore(PRESCRIPTION_JOB_LIMIT)
+
+
+def run_prescription_job(images):
+    """JOB_POOL worker: the /api/analyze_prescription pipeline; returns the JSON payload"""
+    with app.app_context():
+        try:
+            if len(images) > 1:
+                medicines_list = extract_medicines_from_prescription_pages(images)
+            else:
+                medicines_list = extract_medicines_from_prescription(images[0])
+            if not medicines_list:
+                medicines_list = extract_medicines_with_vision_api(images[0])
+            if medicines_list is None:
+                return {'error': 'Failed to process prescription. Please try with a clearer image.'}
+            return {'medicines': prescription_availability(medicines_list)}
+        except Exception as e:
+            logger.error(f"Error in background prescription job: {e}", exc_info=True)
+            return {'error': f'Error processing prescription: {str(e)[:200]}'}
+
+
+@app.route('/api/prescription_jobs', methods=['POST'])
+def submit_prescription_job():
+    """Queue a prescription for analysis and return a job id at once; poll
+    /api/prescription_result/<job_id> for the same payload /api/analyze_prescription returns"""
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    files = [f for f in request.files.getlist('prescription') if f.filename != '']
+    if not files:
+        return jsonify({'error': 'No prescription file provided'}), 400
+    images = [content for content in (f.read() for f in files) if content]
+    if not images:
+        return jsonify({'error': 'Could not read file content'}), 400
+    
+    if not PRESCRIPTION_JOB_SLOTS.acquire(blocking=False):
+        logger.warning(f"Prescription job queue full ({PRESCRIPTION_JOB_LIMIT} jobs), rejecting upload")
+        return jsonify({'error': 'Too many prescriptions in progress, please try again shortly'}), 503, {'Retry-After': '10'}
+    future = JOB_POOL.submit(run_prescription_job, images)
+    future.add_done_callback(lambda _: PRESCRIPTION_JOB_SLOTS.release())
+    
+    job_id = secrets.token_urlsafe(16)
+    now = time.monotonic()
+    with PRESCRIPTION_JOBS_LOCK:
+        # Jobs are inserted in time order, so expired ones are at the front
+        while PRESCRIPTION_JOBS and next(iter(PRESCRIPTION_JOBS.values()))[0] <= now:
+            PRESCRIPTION_JOBS.popitem(last=False)
+        PRESCRIPTION_JOBS[job_id] = (now + PRESCRIPTION_JOB_TTL, future)
+    logger.info(f"Queued prescription job {job_id} ({len(images)} page(s))")
+    return jsonify({'job_id': job_id}), 202
+
+
+@app.route('/api/prescription_result/<job_id>')
+def prescription_result(job_id):
+    """Poll a job from /api/prescription_jobs: {'status': 'pending'} until it has finished"""
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    with PRESCRIPTION_JOBS_LOCK:
+        entry = PRESCRIPTION_JOBS.get(job_id)
+    if entry is None or entry[0] <= time.monotonic():
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    future = entry[1]
+    if not future.done():
+        return jsonify({'status': 'pending'})
+    payload = future.result()
+    return jsonify({'status': 'done', **payload}), 500 if 'error' in payload else 200
+
+# Known medicine brand corrections (OCR misreads of the brand, lowercased)
+BRAND_CORRECTIONS = {
+    # BIFILAC variations
+    'bifilac': 'BIFILAC',
+    'bifiiac': 'BIFILAC',
+    'bifllac': 'BIFILAC',
+    'bif1lac': 'BIFILAC',
+    # O2 variations
+    'o2': 'O2',
+    'o 2': 'O2',
+    '02': 'O2',
+    'oz': 'O2',
+    # Dolo-650 variations
+    'dolo 650': 'Dolo-650',
+    'dolo650': 'Dolo-650',
+    'dol0 650': 'Dolo-650',
+    'dolo-65o': 'Dolo-650',
+    # RABEMI-DSR variations
+    'rabemi dsr': 'RABEMI-DSR',
+    'rabemidsr': 'RABEMI-DSR',
+    'rabemi-dsr': 'RABEMI-DSR',
+}
+
+# Manufacturer corrections, applied when the key appears in the lowercased manufacturer
+MANUFACTURER_CORRECTIONS = {
+    'toa': 'TOA Pharmaceuticals',
+    'toa pharma': 'TOA Pharmaceuticals',
+    'meyer': 'Meyer Organics',
+    'meyer organics': 'Meyer Organics',
+    'micro labs': 'Micro Labs',
+    'microlabs': 'Micro Labs',
+    'paalmi': 'Paalmi Pharmaceuticals',
+    'renewed life': 'Renewed Life Sciences',
+}
+
+# Full-text fallbacks, checked in order: (keywords that must all appear, value)
+FULL_TEXT_BRAND_RULES = (
+    (('bifilac',), 'BIFILAC'),
+    (('rabemi', 'dsr'), 'RABEMI-DSR'),
+    (('dolo', '650'), 'Dolo-650'),
+    (('ofloxacin', 'ornidazole'), 'O2'),  # O2 is Ofloxacin + Ornidazole combination
+    (('paracetamol', '650'), 'Dolo-650'),
+    (('rabeprazole', 'domperidone'), 'RABEMI-DSR'),
+)
+
+FULL_TEXT_MANUFACTURER_RULES = (
+    (('toa', 'pharma'), 'TOA Pharmaceuticals'),
+    (('meyer',), 'Meyer Organics'),
+    (('micro labs',), 'Micro Labs'),
+    (('microlabs',), 'Micro Labs'),
+    (('paalmi',), 'Paalmi Pharmaceuticals'),
+    (('renewed life',), 'Renewed Life Sciences'),
+)
+
+
+def first_keyword_match(text_lower, rules):
+    """Value of the first rule whose keywords all occur in text_lower, else None"""
+    for keywords, value in rules:
+        if all(keyword in text_lower for keyword in keywords):
+            return value
+    return None
+
+
+# Generic label text that OCR/Gemini sometimes return in place of a brand name
+INVALID_BRAND_RE = re.compile(
+    r"(?i)(?:each\s|film\s|coated|tablet|capsule|contains|information|store|keep|protect|the\s|this\s|for\s|use\s)"
+)
+
+
+def is_valid_brand(val):
+    """False for empty values and generic descriptions ('Each film coated tablet...')"""
+    val = str(val).strip() if val else ''
+    return bool(val) and not INVALID_BRAND_RE.match(val)
+
+
+# Number and unit in a dosage, re-joined with one space ("200mg" -> "200 mg")
+DOSAGE_UNIT_SPACING_RE = re.compile(r'(\d+)\s*(mg|mcg|g|ml)', re.IGNORECASE)
+
+
+def post_process_extracted_data(brand, dosage, batch, mfd_date, exp_date, manufacturer, mrp_str, full_text,
+                                full_text_lower=None):
     """
     Post-process and validate extracted medicine data.
     Applies specific corrections for known medicine patterns.
     """
-    # Known medicine brand corrections
-    brand_corrections = {
-        # BIFILAC variations
-        'bifilac': 'BIFILAC',
-        'bifiiac': 'BIFILAC',
-        'bifllac': 'BIFILAC',
-        'bif1lac': 'BIFILAC',
-        # O2 variations
-        'o 2': 'O2',
-        '02': 'O2',
-        'oz': 'O2',
-        # Dolo-650 variations
-        'dolo 650': 'Dolo-650',
-        'dolo650': 'Dolo-650',
-        'dol0 650': 'Dolo-650',
-        'dolo-65o': 'Dolo-650',
-        # RABEMI-DSR variations
-        'rabemi dsr': 'RABEMI-DSR',
-        'rabemidsr': 'RABEMI-DSR',
-        'rabemi-dsr': 'RABEMI-DSR',
-    }
+    if full_text and full_text_lower is None:
+        full_text_lower = full_text.lower()
     
     # Try to correct brand name
     if brand:
         brand_lower = brand.lower().strip()
-        if brand_lower in brand_corrections:
-            brand = brand_corrections[brand_lower]
+        if brand_lower in BRAND_CORRECTIONS:
+            brand = BRAND_CORRECTIONS[brand_lower]
         # Check if brand contains known medicine names
         elif 'bifilac' in brand_lower:
             brand = 'BIFILAC'
@@ -2904,72 +3711,53 @@ def post_process_extracted_data(brand, dosage, batch, mfd_date, exp_date, manufa
             brand = 'RABEMI-DSR'
         elif 'dolo' in brand_lower and '650' in brand_lower:
             brand = 'Dolo-650'
-        elif brand_lower in ['o2', 'o 2', '02']:
-            brand = 'O2'
     
     # If brand still not found, try to detect from full text
     if not brand and full_text:
-        text_lower = full_text.lower()
-        if 'bifilac' in text_lower:
-            brand = 'BIFILAC'
-        elif 'rabemi' in text_lower and 'dsr' in text_lower:
-            brand = 'RABEMI-DSR'
-        elif 'dolo' in text_lower and '650' in text_lower:
-            brand = 'Dolo-650'
-        elif 'ofloxacin' in text_lower and 'ornidazole' in text_lower:
-            # O2 is Ofloxacin + Ornidazole combination
-            brand = 'O2'
-        elif 'paracetamol' in text_lower and '650' in text_lower:
-            brand = 'Dolo-650'
-        elif 'rabeprazole' in text_lower and 'domperidone' in text_lower:
-            brand = 'RABEMI-DSR'
+        brand = first_keyword_match(full_text_lower, FULL_TEXT_BRAND_RULES) or brand
     
-    # Manufacturer corrections
-    manufacturer_corrections = {
-        'toa': 'TOA Pharmaceuticals',
-        'toa pharma': 'TOA Pharmaceuticals',
-        'meyer': 'Meyer Organics',
-        'meyer organics': 'Meyer Organics',
-        'micro labs': 'Micro Labs',
-        'microlabs': 'Micro Labs',
-        'paalmi': 'Paalmi Pharmaceuticals',
-        'renewed life': 'Renewed Life Sciences',
-    }
     
     if manufacturer:
         mfr_lower = manufacturer.lower().strip()
-        for key, value in manufacturer_corrections.items():
+        for key, value in MANUFACTURER_CORRECTIONS.items():
             if key in mfr_lower:
                 manufacturer = value
                 break
     
     # Try to detect manufacturer from full text if not found
     if not manufacturer and full_text:
-        text_lower = full_text.lower()
-        if 'toa' in text_lower and 'pharma' in text_lower:
-            manufacturer = 'TOA Pharmaceuticals'
-        elif 'meyer' in text_lower:
-            manufacturer = 'Meyer Organics'
-        elif 'micro labs' in text_lower or 'microlabs' in text_lower:
-            manufacturer = 'Micro Labs'
-        elif 'paalmi' in text_lower:
-            manufacturer = 'Paalmi Pharmaceuticals'
-        elif 'renewed life' in text_lower:
-            manufacturer = 'Renewed Life Sciences'
+        manufacturer = first_keyword_match(full_text_lower, FULL_TEXT_MANUFACTURER_RULES) or manufacturer
     
     # Clean up dosage format
     if dosage:
         dosage = dosage.strip()
         # Standardize format: "200mg + 500mg" -> "200 mg + 500 mg"
-        dosage = re.sub(r'(\d+)\s*(mg|mcg|g|ml)', r'\1 \2', dosage, flags=re.IGNORECASE)
+        dosage = DOSAGE_UNIT_SPACING_RE.sub(r'\1 \2', dosage)
     
     return brand, dosage, batch, mfd_date, exp_date, manufacturer, mrp_str
 
 
+def clean_gemini_fields(gem_direct):
+    """Cleaned /index fields from a Gemini direct-extraction dict, or None when there is none"""
+    if not (gem_direct and isinstance(gem_direct, dict)):
+        return None
+    logger.info("Gemini direct extraction result: %s", gem_direct)
+    brand = clean_extracted_value(gem_direct.get('brand'), 'brand')
+    return {
+        'brand': brand if brand and is_valid_brand(brand) else None,
+        'dosage': clean_extracted_value(gem_direct.get('dosage'), 'text'),
+        'batch': clean_extracted_value(gem_direct.get('batch_number'), 'batch'),
+        'mfd': clean_extracted_value(gem_direct.get('manufacture_date'), 'date'),
+        'exp': clean_extracted_value(gem_direct.get('expiry_date'), 'date'),
+        'manufacturer': clean_extracted_value(gem_direct.get('manufacturer'), 'text'),
+        'mrp': clean_extracted_value(gem_direct.get('mrp'), 'mrp'),
+    }
+
+
 @app.route('/index', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
-        logger.info("POST request received for image upload")
+        logger.debug("POST request received for image upload")
         
         # Check if file is in request
         if 'image' not in request.files:
@@ -2977,7 +3765,7 @@ def index():
             return render_template('index.html', error_message="❌ No file part in request")
         
         file = request.files['image']
-        logger.info(f"File received: {file.filename if file else 'None'}")
+        logger.debug("File received: %s", file.filename if file else None)
         
         if not file or file.filename == '':
             logger.error("No selected file")
@@ -2985,7 +3773,7 @@ def index():
         
         try:
             # Read the image
-            logger.info("Reading image content")
+            logger.debug("Reading image content")
             image_content = file.read()
             if not image_content:
                 logger.error("No content read from file")
@@ -3000,94 +3788,94 @@ def index():
             manufacturer = None
             mrp_str = None
             full_text = ""
+            full_text_lower = ""
             
-            # Filter out invalid brand names (generic descriptions)
-            invalid_brand_patterns = [
-                r"(?i)^each\s", r"(?i)^film\s", r"(?i)^coated", r"(?i)^tablet",
-                r"(?i)^capsule", r"(?i)^contains", r"(?i)^information",
-                r"(?i)^store", r"(?i)^keep", r"(?i)^protect", r"(?i)^the\s",
-                r"(?i)^this\s", r"(?i)^for\s", r"(?i)^use\s"
-            ]
+            # Start the Gemini image request and local OCR together; the OCR driver goes on
+            # API_POOL since Tesseract itself waits on OCR_POOL
+            gemini_future = API_POOL.submit(gemini_extract_all, image_content)
+            logger.debug("Performing OCR (Tesseract=%s, Gemini=%s)", TESSERACT_AVAILABLE, GEMINI_AVAILABLE)
+            ocr_future = API_POOL.submit(ocr_extract_text, image_content)
+            wait((gemini_future, ocr_future), return_when=FIRST_COMPLETED)
             
-            def is_valid_brand(val):
-                if not val or not str(val).strip():
-                    return False
-                val = str(val).strip()
-                for pattern in invalid_brand_patterns:
-                    if re.match(pattern, val):
-                        return False
-                return True
+            gem_text, gem_direct = None, None
+            if gemini_future.done() and not ocr_future.done() and gemini_future.exception() is None:
+                gem_text, gem_direct = gemini_future.result() or (None, None)
+            gem_fields = clean_gemini_fields(gem_direct)
+            found = {}
             
-            # METHOD 1: Try Gemini direct image extraction first (most accurate)
-            logger.info("Attempting Gemini direct image extraction...")
-            try:
-                gem_direct = gemini_extract_fields_from_image(image_content)
-                if gem_direct and isinstance(gem_direct, dict):
-                    logger.info(f"Gemini direct extraction result: {gem_direct}")
-                    
-                    # Clean and validate each field
-                    extracted_brand = clean_extracted_value(gem_direct.get('brand'), 'brand')
-                    if extracted_brand and is_valid_brand(extracted_brand):
-                        brand = extracted_brand
-                    
-                    dosage = clean_extracted_value(gem_direct.get('dosage'), 'text')
-                    batch = clean_extracted_value(gem_direct.get('batch_number'), 'batch')
-                    mfd_date = clean_extracted_value(gem_direct.get('manufacture_date'), 'date')
-                    exp_date = clean_extracted_value(gem_direct.get('expiry_date'), 'date')
-                    manufacturer = clean_extracted_value(gem_direct.get('manufacturer'), 'text')
-                    mrp_str = clean_extracted_value(gem_direct.get('mrp'), 'mrp')
-                    
-                    logger.info(f"Cleaned Gemini data: brand={brand}, batch={batch}, mfd={mfd_date}, exp={exp_date}, mrp={mrp_str}")
-            except Exception as e:
-                logger.warning(f"Gemini direct extraction failed: {e}")
+            if gem_fields and all(gem_fields.values()):
+                # Gemini answered first with every field: OCR + regex could only fill gaps, so
+                # don't wait for it (its text still lands in OCR_CACHE for a re-upload)
+                logger.info("Gemini returned every field before OCR finished, skipping OCR + regex extraction")
+                full_text = gem_text or ""
+                full_text_lower = full_text.lower()
+            else:
+                # METHOD 1: OCR + regex extraction; free, offline and often enough on its own
+                full_text = ocr_future.result()
+                if full_text:
+                    logger.debug("OCR Text extracted: %.200s...", full_text)
+                    full_text = normalize_vertical(full_text)
+                    full_text_lower = full_text.lower()
+                    found = scan_fields(full_text, INDEX_FIELDS, full_text_lower)
+                    if found.get('brand_name') and not is_valid_brand(found['brand_name']):
+                        found['brand_name'] = None
+                
+                # METHOD 2: Gemini direct image extraction (most accurate). An answer that has
+                # already arrived is always used; it is only not waited for when the regexes
+                # found every key field on a clean strip
+                if gem_fields is None:
+                    if regex_found_key_fields(found) and not gemini_future.done():
+                        # The request is already in flight and still runs (and is billed); /index
+                        # just doesn't wait for it, and the reply lands in OCR_CACHE for a re-upload
+                        logger.info("Regex extraction found all key fields, not waiting for Gemini image extraction")
+                    else:
+                        logger.debug("Attempting Gemini direct image extraction...")
+                        try:
+                            # ocr_extract_text's own Gemini fallback shares the same call
+                            gem_fields = clean_gemini_fields((gemini_future.result() or (None, None))[1])
+                        except Exception as e:
+                            logger.warning(f"Gemini direct extraction failed: {e}")
             
-            # METHOD 2: OCR + regex extraction as fallback
-            logger.info(f"Performing OCR (Tesseract={TESSERACT_AVAILABLE}, Gemini={GEMINI_AVAILABLE})")
-            full_text = ocr_extract_text(image_content)
+            if gem_fields:
+                brand = gem_fields['brand']
+                dosage = gem_fields['dosage']
+                batch = gem_fields['batch']
+                mfd_date = gem_fields['mfd']
+                exp_date = gem_fields['exp']
+                manufacturer = gem_fields['manufacturer']
+                mrp_str = gem_fields['mrp']
+                logger.debug("Cleaned Gemini data: brand=%s, batch=%s, mfd=%s, exp=%s, mrp=%s", brand, batch, mfd_date, exp_date, mrp_str)
             
-            if full_text:
-                logger.info(f"OCR Text extracted: {full_text[:200]}...")
-                full_text = normalize_vertical(full_text)
-                
-                # Extract fields using regex if not already found
-                if not brand:
-                    brand = find_first_match(full_text, PATTERNS['brand_name'])
-                    if not is_valid_brand(brand):
-                        brand = None
-                if not dosage:
-                    dosage = find_first_match(full_text, PATTERNS['dosage'])
-                if not batch:
-                    batch = find_first_match(full_text, PATTERNS['batch_number'])
-                if not mfd_date:
-                    mfd_date = find_first_match(full_text, PATTERNS['mfd'])
-                if not exp_date:
-                    exp_date = find_first_match(full_text, PATTERNS['expiry'])
-                if not manufacturer:
-                    manufacturer = find_first_match(full_text, PATTERNS['manufacturer'])
-                if not mrp_str:
-                    mrp_str = find_first_match(full_text, PATTERNS['mrp'])
-                
-                # METHOD 3: Try Gemini text extraction as additional fallback
-                if not brand or not batch or not mfd_date or not exp_date:
-                    try:
-                        gem_fields = extract_fields_with_gemini_from_text(full_text)
-                        if gem_fields and isinstance(gem_fields, dict):
-                            if not brand and is_valid_brand(gem_fields.get('brand')):
-                                brand = gem_fields.get('brand', '').strip()
-                            if not dosage and gem_fields.get('dosage'):
-                                dosage = gem_fields.get('dosage', '').strip()
-                            if not batch and gem_fields.get('batch_number'):
-                                batch = gem_fields.get('batch_number', '').strip()
-                            if not mfd_date and gem_fields.get('manufacture_date'):
-                                mfd_date = gem_fields.get('manufacture_date', '').strip()
-                            if not exp_date and gem_fields.get('expiry_date'):
-                                exp_date = gem_fields.get('expiry_date', '').strip()
-                            if not manufacturer and gem_fields.get('manufacturer'):
-                                manufacturer = gem_fields.get('manufacturer', '').strip()
-                            if not mrp_str and gem_fields.get('mrp'):
-                                mrp_str = gem_fields.get('mrp', '').strip()
-                    except Exception as e:
-                        logger.warning(f"Gemini text extraction failed: {e}")
+            # Regex results fill whatever Gemini did not return
+            brand = brand or found.get('brand_name', brand)
+            dosage = dosage or found.get('dosage', dosage)
+            batch = batch or found.get('batch_number', batch)
+            mfd_date = mfd_date or found.get('mfd', mfd_date)
+            exp_date = exp_date or found.get('expiry', exp_date)
+            manufacturer = manufacturer or found.get('manufacturer', manufacturer)
+            mrp_str = mrp_str or found.get('mrp', mrp_str)
+            
+            # METHOD 3: Try Gemini text extraction as additional fallback
+            if full_text and (not brand or not batch or not mfd_date or not exp_date):
+                try:
+                    gem_fields = extract_fields_with_gemini_from_text(full_text)
+                    if gem_fields and isinstance(gem_fields, dict):
+                        if not brand and is_valid_brand(gem_fields.get('brand')):
+                            brand = gem_fields.get('brand', '').strip()
+                        if not dosage and gem_fields.get('dosage'):
+                            dosage = gem_fields.get('dosage', '').strip()
+                        if not batch and gem_fields.get('batch_number'):
+                            batch = gem_fields.get('batch_number', '').strip()
+                        if not mfd_date and gem_fields.get('manufacture_date'):
+                            mfd_date = gem_fields.get('manufacture_date', '').strip()
+                        if not exp_date and gem_fields.get('expiry_date'):
+                            exp_date = gem_fields.get('expiry_date', '').strip()
+                        if not manufacturer and gem_fields.get('manufacturer'):
+                            manufacturer = gem_fields.get('manufacturer', '').strip()
+                        if not mrp_str and gem_fields.get('mrp'):
+                            mrp_str = gem_fields.get('mrp', '').strip()
+                except Exception as e:
+                    logger.warning(f"Gemini text extraction failed: {e}")
             
             # If still no OCR text and no Gemini results, show error
             if not full_text and not brand:
@@ -3099,34 +3887,29 @@ def index():
                     )
                 )
 
-            logger.info(f"Extracted fields (before post-processing): Brand={brand}, Dosage={dosage}, Batch={batch}, MFD={mfd_date}, EXP={exp_date}, Manufacturer={manufacturer}, MRP={mrp_str}")
+            logger.debug("Extracted fields (before post-processing): Brand=%s, Dosage=%s, Batch=%s, MFD=%s, EXP=%s, Manufacturer=%s, MRP=%s",
+                        brand, dosage, batch, mfd_date, exp_date, manufacturer, mrp_str)
 
             # Apply post-processing to correct and validate extracted data
             brand, dosage, batch, mfd_date, exp_date, manufacturer, mrp_str = post_process_extracted_data(
-                brand, dosage, batch, mfd_date, exp_date, manufacturer, mrp_str, full_text
+                brand, dosage, batch, mfd_date, exp_date, manufacturer, mrp_str, full_text, full_text_lower
             )
             
-            logger.info(f"Extracted fields (after post-processing): Brand={brand}, Dosage={dosage}, Batch={batch}, MFD={mfd_date}, EXP={exp_date}, Manufacturer={manufacturer}, MRP={mrp_str}")
+            logger.info("Extracted fields (after post-processing): Brand=%s, Dosage=%s, Batch=%s, MFD=%s, EXP=%s, Manufacturer=%s, MRP=%s",
+                        brand, dosage, batch, mfd_date, exp_date, manufacturer, mrp_str)
 
             # Fallback batch: look for patterns like E40001 or any alphanumeric batch
             if not batch or batch == "Information not available":
-                batch_patterns = [
-                    r"(?i)B\.?\s*No\.?\s*[:#.\-]?\s*([A-Z]?\d{4,}[A-Z0-9]*)",
-                    r"(?i)Batch\s*[:#.\-]?\s*([A-Z]?\d{4,}[A-Z0-9]*)",
-                    r"\b([A-Z]\d{5,})\b",
-                    r'(\d{6,})',
-                ]
-                for pattern in batch_patterns:
-                    m = re.search(pattern, full_text or "")
+                for pattern in BATCH_FALLBACK_PATTERNS:
+                    m = pattern.search(full_text or "")
                     if m:
                         batch = m.group(1)
                         break
             # Parse MRP robustly
             try:
-                import re as _re
                 mrp_val = 0.0
                 if mrp_str:
-                    m = _re.search(r"(\d+(?:[.,]\d{1,2})?)", str(mrp_str))
+                    m = MRP_NUMBER_RE.search(str(mrp_str))
                     if m:
                         mrp_val = float(m.group(1).replace(',', ''))
             except Exception:
@@ -3136,30 +3919,30 @@ def index():
             mfd_dt = None
             exp_dt = None
             
-            logger.info(f"Parsing dates - MFD: '{mfd_date}', EXP: '{exp_date}'")
+            logger.debug("Parsing dates - MFD: '%s', EXP: '%s'", mfd_date, exp_date)
             
             # First try to parse the extracted date strings (from Gemini or regex)
             if mfd_date and mfd_date != 'Information not available':
                 mfd_dt = parse_date_from_gemini(mfd_date)
-                logger.info(f"Parsed MFD from extracted string: {mfd_dt}")
+                logger.debug("Parsed MFD from extracted string: %s", mfd_dt)
             
             if exp_date and exp_date != 'Information not available':
                 exp_dt = parse_date_from_gemini(exp_date)
-                logger.info(f"Parsed EXP from extracted string: {exp_dt}")
+                logger.debug("Parsed EXP from extracted string: %s", exp_dt)
             
             # Fallback: try to find dates near labels in OCR text
             if not mfd_dt or not exp_dt:
                 try:
                     if not mfd_dt:
-                        labeled_mfd = find_labeled_date_dt(full_text or "", ['mfg', 'mfg.', 'mfd', 'manufactured', 'mfg.dt', 'mfg dt'])
+                        labeled_mfd = find_labeled_date_dt(full_text or "", ['mfg', 'mfg.', 'mfd', 'manufactured', 'mfg.dt', 'mfg dt'], full_text_lower)
                         if labeled_mfd:
                             mfd_dt = labeled_mfd
-                            logger.info(f"Found MFD from labeled search: {mfd_dt}")
+                            logger.debug("Found MFD from labeled search: %s", mfd_dt)
                     if not exp_dt:
-                        labeled_exp = find_labeled_date_dt(full_text or "", ['exp', 'exp.', 'expiry', 'use before', 'best before', 'exp.dt', 'exp dt'])
+                        labeled_exp = find_labeled_date_dt(full_text or "", ['exp', 'exp.', 'expiry', 'use before', 'best before', 'exp.dt', 'exp dt'], full_text_lower)
                         if labeled_exp:
                             exp_dt = labeled_exp
-                            logger.info(f"Found EXP from labeled search: {exp_dt}")
+                            logger.debug("Found EXP from labeled search: %s", exp_dt)
                 except Exception as e:
                     logger.warning(f"Error in labeled date search: {e}")
             
@@ -3180,7 +3963,7 @@ def index():
                 logger.warning(f"EXP ({exp_dt}) is before MFD ({mfd_dt}), swapping")
                 mfd_dt, exp_dt = exp_dt, mfd_dt
             
-            logger.info(f"Final dates - MFD: {mfd_dt}, EXP: {exp_dt}")
+            logger.debug("Final dates - MFD: %s, EXP: %s", mfd_dt, exp_dt)
 
             # Save to DB
             med = Medicine(
@@ -3214,9 +3997,7 @@ def index():
             prev_price = None
             try:
                 if brand:
-                    last_med = Medicine.query.filter(Medicine.medicine_name.ilike(brand)).order_by(Medicine.batch_id.desc()).first()
-                    if last_med and last_med.price_per_unit:
-                        prev_price = float(last_med.price_per_unit)
+                    prev_price = last_medicine_price(brand.lower(), int(time.monotonic() // MEDICINE_STOCK_TTL))
             except Exception:
                 prev_price = None
 
@@ -3246,16 +4027,14 @@ def save_ocr():
         # Price parsing with fallback to last known price for this brand
         mrp_val = 0.0
         if mrp_input:
-            m = re.search(r"(\d+(?:[.,]\d{1,2})?)", mrp_input)
+            m = MRP_NUMBER_RE.search(mrp_input)
             if m:
                 try:
                     mrp_val = float(m.group(1).replace(',', ''))
                 except Exception:
                     mrp_val = 0.0
         if mrp_val == 0.0 and brand:
-            last = Medicine.query.filter(Medicine.medicine_name.ilike(brand)).order_by(Medicine.batch_id.desc()).first()
-            if last and last.price_per_unit:
-                mrp_val = float(last.price_per_unit)
+            mrp_val = last_medicine_price(brand.lower(), int(time.monotonic() // MEDICINE_STOCK_TTL)) or mrp_val
 
         # Dates: parse input flexibly; ensure EXP after MFD
         mfd_dt = parse_date_flexible(mfd_input) if mfd_input else None
@@ -3297,6 +4076,7 @@ def save_ocr():
         flash('Medicine details verified and saved successfully.', 'success')
         return redirect(url_for('medicine_database'))
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error saving verified OCR data: {e}", exc_info=True)
         flash(f'Failed to save: {e}', 'danger')
         return redirect(url_for('index'))
@@ -3318,15 +4098,11 @@ def add_medicine():
             manufacture_date_str = request.form['manufacture_date']
             expiry_date_str = request.form['expiry_date']
 
-            manufacture_date = datetime.strptime(manufacture_date_str, '%Y-%m-%d').date()
-            expiry_date = datetime.strptime(expiry_date_str, '%Y-%m-%d').date()
+            manufacture_date = date.fromisoformat(manufacture_date_str)
+            expiry_date = date.fromisoformat(expiry_date_str)
             
-            # Find the next available batch_id
-            last_medicine = Medicine.query.order_by(Medicine.batch_id.desc()).first()
-            next_batch_id = (last_medicine.batch_id + 1) if last_medicine else 1
-
+            # batch_id is the INTEGER PRIMARY KEY, so SQLite assigns max(batch_id) + 1 itself
             new_medicine = Medicine(
-                batch_id=next_batch_id,
                 medicine_name=medicine_name,
                 brand=brand,
                 category=category,
@@ -3344,62 +4120,59 @@ def add_medicine():
         except ValueError:
             flash('Invalid input for quantity or price. Please enter valid numbers.', 'danger')
         except Exception as e:
+            db.session.rollback()
             flash(f'An error occurred: {str(e)}', 'danger')
 
     return render_template('add_medicine.html')
 
+@functools.lru_cache(maxsize=1)
+def medicine_listing(current_date, ttl_bucket=None):
+    """(rows for /owner/medicines, the 10 soonest-expiring of them) as of current_date.
+    Cached like find_medicine_stock; committed Medicine changes clear it."""
+    six_months_later = current_date + timedelta(days=180)
+    
+    # Soonest expiry first, sorted by SQLite on the expiry_date index (batch_id keeps ties stable);
+    # the rows expiring within six months are then a prefix of the list. The page only reads
+    # the values, so plain rows become dicts instead of tracked ORM objects. Rows are fetched in
+    # chunks of MEDICINE_FETCH_CHUNK, so only the dicts are ever held in full, not the raw result too.
+    # Days left and the six-month flag come back as columns of the same SELECT
+    days_until_expiry = db.cast(
+        db.func.julianday(Medicine.expiry_date) - db.func.julianday(current_date), db.Integer)
+    rows = Medicine.query.with_entities(
+        *Medicine.__table__.columns,
+        days_until_expiry.label('days_until_expiry'),
+        (Medicine.expiry_date <= six_months_later).label('is_expiring_soon'),
+    ).order_by(Medicine.expiry_date, Medicine.batch_id).yield_per(MEDICINE_FETCH_CHUNK)
+    medicines = [dict(row._mapping) for row in rows]
+    # Expiring rows are a prefix of the sorted list, so the alert's 10 soonest are among the first 10
+    expiring_medicines = [
+        {
+            'name': med['medicine_name'],
+            'batch': med['batch_number'],
+            'expiry_date': med['expiry_date'],
+            'days_left': med['days_until_expiry']
+        }
+        for med in medicines[:10] if med['is_expiring_soon']
+    ]
+    logger.debug("Medicine database: %d medicines, alert list %s", len(medicines), expiring_medicines)
+    return medicines, expiring_medicines
+
+
 @app.route('/owner/medicines')
 def medicine_database():
     if 'user_type' not in session or session['user_type'] != 'owner':
         flash('Access denied. Please log in as an owner.', 'danger')
         return redirect(url_for('login_owner'))
 
-    from datetime import datetime, timedelta
-    
-    # Get all medicines
-    medicines = Medicine.query.all()
-    current_date = datetime.utcnow().date()
-    six_months_later = current_date + timedelta(days=180)
-    
-    # Debug logging
-    print(f"Current date: {current_date}")
-    print(f"Six months later: {six_months_later}")
-    
-    expiring_medicines = []
-    
-    # Check each medicine's expiry date
-    for med in medicines:
-        # Convert string date to date object if needed
-        if isinstance(med.expiry_date, str):
-            med.expiry_date = datetime.strptime(med.expiry_date, '%Y-%m-%d').date()
-        
-        days_until_expiry = (med.expiry_date - current_date).days
-        is_expiring_soon = med.expiry_date <= six_months_later
-        
-        # Add attributes to medicine object
-        med.is_expiring_soon = is_expiring_soon
-        med.days_until_expiry = days_until_expiry
-        
-        if is_expiring_soon:
-            expiring_medicines.append({
-                'name': med.medicine_name,
-                'batch': med.batch_number,
-                'expiry_date': med.expiry_date,
-                'days_left': days_until_expiry
-            })
-    
-    # Debug logging
-    print(f"Found {len(expiring_medicines)} medicines expiring within 6 months")
-    for med in expiring_medicines:
-        print(f"- {med['name']} (Batch: {med['batch']}): {med['days_left']} days left (expires {med['expiry_date']})")
-    
-    # Sort medicines by expiry date (soonest first)
-    medicines.sort(key=lambda x: x.expiry_date)
+    medicines, expiring_medicines = medicine_listing(
+        datetime.utcnow().date(), int(time.monotonic() // MEDICINE_STOCK_TTL))
     
     return render_template('medicine_database.html',
                          medicines=medicines,
                          show_alert=len(expiring_medicines) > 0,
-                         expiring_meds=expiring_medicines[:10])  # Show top 10 expiring soon
+                         expiring_meds=expiring_medicines)  # The 10 soonest to expire
+
+ENQUIRIES_PER_PAGE = 50
 
 @app.route('/owner/enquiries')
 def view_enquiries():
@@ -3407,11 +4180,10 @@ def view_enquiries():
         flash('Access denied. Please log in as an owner.', 'danger')
         return redirect(url_for('login_owner'))
 
-    # Ensure the table exists when accessing this page
-    with app.app_context():
-        db.create_all()
-    
-    enquiries = MedicineEnquiry.query.order_by(MedicineEnquiry.enquiry_date.desc()).all()
+    # Newest first, read backwards off the enquiry_date index one page at a time
+    enquiries = MedicineEnquiry.query.order_by(MedicineEnquiry.enquiry_date.desc()).paginate(
+        per_page=ENQUIRIES_PER_PAGE, max_per_page=ENQUIRIES_PER_PAGE
+    )
     return render_template('enquiries.html', enquiries=enquiries)
 
 # ─── Run ───────────────────────────────────────────────────────────────────────
@@ -3429,14 +4201,5 @@ if __name__ == '__main__':
     logger.info(f"OPENAI_API_KEY set: {bool(openai_key)}")
     logger.info("=" * 50)
     
-    with app.app_context():
-        db.create_all()  # This will create all tables including MedicineEnquiry
-        # Check if the database is empty before populating
-        if not Medicine.query.first():
-            for data in initial_medicine_data:
-                data['manufacture_date'] = datetime.strptime(data['manufacture_date'], '%Y-%m-%d').date()
-                data['expiry_date'] = datetime.strptime(data['expiry_date'], '%Y-%m-%d').date()
-                medicine = Medicine(**data)
-                db.session.add(medicine)
-            db.session.commit()
+    # Tables, indexes and seed rows were already created (one bulk insert) at import
     app.run(debug=True)
\ No newline at end of file
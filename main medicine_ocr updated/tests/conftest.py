@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Import the app against a throwaway database, never instance/medicine.db
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'medicine.db')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,26 @@
+import pytest
+
+from app import HEALTH_CONDITIONS, get_health_suggestions
+
+
+def suggested_names(query):
+    return [med['name'] for med in get_health_suggestions(query)]
+
+
+@pytest.mark.parametrize('query', ['chest pain', 'back pain', 'eye irritation'])
+def test_shared_words_do_not_select_other_conditions(query):
+    assert suggested_names(query) == []
+
+
+@pytest.mark.parametrize('query, conditions', [
+    ('headaches and fever', ['fever', 'headache']),
+    ('fever coughing', ['fever', 'cough']),
+    ('stomach', ['stomach pain']),
+    ('stomach pain', ['stomach pain']),
+    ('tummy ache', ['stomach pain']),
+    ('skin rash', ['skin irritation']),
+])
+def test_every_condition_in_the_query_is_suggested(query, conditions):
+    names = suggested_names(query)
+    for condition in conditions:
+        assert set(HEALTH_CONDITIONS[condition]) <= set(names)
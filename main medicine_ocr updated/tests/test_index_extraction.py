@@ -0,0 +1,110 @@
+import io
+import threading
+import time
+
+import pytest
+
+import app as app_module
+from app import INDEX_FIELDS, regex_found_key_fields, scan_fields
+
+CLEAN_STRIP_TEXT = """DOLO 650
+Paracetamol Tablets IP 650 mg
+B.No. DOBS3975
+MFD. 03/2024
+EXP. 02/2027
+M.R.P. Rs. 30.91
+Mfd. by Micro Labs Limited"""
+
+GEMINI_FIELDS = {
+    'brand': 'Calpol 500',
+    'dosage': '500 mg',
+    'batch_number': 'GEM12345',
+    'manufacture_date': '01/2024',
+    'expiry_date': '12/2026',
+    'manufacturer': 'GSK',
+    'mrp': '15.50',
+}
+
+
+@pytest.fixture
+def client():
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['user_type'] = 'owner'
+    return client
+
+
+def post_image(client):
+    return client.post('/index', data={'image': (io.BytesIO(b'image bytes'), 'strip.png')},
+                       content_type='multipart/form-data')
+
+
+def test_regex_covers_clean_strip():
+    assert regex_found_key_fields(scan_fields(CLEAN_STRIP_TEXT, INDEX_FIELDS))
+
+
+def test_not_found_sentinel_counts_as_missing():
+    found = scan_fields('DOLO 650 Tablets', INDEX_FIELDS)
+    assert found['mrp'] == 'Information not available'
+    assert not regex_found_key_fields(found)
+
+
+def test_regex_hit_does_not_wait_for_gemini(client, monkeypatch):
+    release = threading.Event()
+
+    def slow_gemini(image_content):
+        release.wait(5)
+        return None, GEMINI_FIELDS
+
+    monkeypatch.setattr(app_module, 'ocr_extract_text', lambda image_content: CLEAN_STRIP_TEXT)
+    monkeypatch.setattr(app_module, 'gemini_extract_all', slow_gemini)
+    try:
+        response = post_image(client)
+    finally:
+        release.set()
+    assert b'DOBS3975' in response.data
+    assert b'GEM12345' not in response.data
+
+
+def test_regex_miss_uses_gemini(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'ocr_extract_text', lambda image_content: 'DOLO 650 Tablets')
+    monkeypatch.setattr(app_module, 'gemini_extract_all', lambda image_content: (None, GEMINI_FIELDS))
+    assert b'GEM12345' in post_image(client).data
+
+
+def test_complete_gemini_answer_does_not_wait_for_ocr(client, monkeypatch):
+    release = threading.Event()
+
+    def slow_ocr(image_content):
+        release.wait(5)
+        return CLEAN_STRIP_TEXT
+
+    monkeypatch.setattr(app_module, 'ocr_extract_text', slow_ocr)
+    monkeypatch.setattr(app_module, 'gemini_extract_all', lambda image_content: ('CALPOL 500', GEMINI_FIELDS))
+    started = time.monotonic()
+    try:
+        response = post_image(client)
+    finally:
+        release.set()
+    assert time.monotonic() - started < 4
+    assert b'GEM12345' in response.data
+
+
+def test_regex_hit_keeps_gemini_answer_that_already_arrived(client, monkeypatch):
+    gemini_done = threading.Event()
+    partial_fields = {**GEMINI_FIELDS, 'mrp': ''}
+
+    def fast_gemini(image_content):
+        gemini_done.set()
+        return None, partial_fields
+
+    def slow_ocr(image_content):
+        gemini_done.wait(5)
+        time.sleep(0.2)
+        return CLEAN_STRIP_TEXT
+
+    monkeypatch.setattr(app_module, 'ocr_extract_text', slow_ocr)
+    monkeypatch.setattr(app_module, 'gemini_extract_all', fast_gemini)
+    response = post_image(client)
+    assert b'GEM12345' in response.data
+    assert b'30.91' in response.data
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from app import Medicine, app, db, medicine_listing, medicine_stock
+
+
+@pytest.fixture
+def medicine():
+    with app.app_context():
+        med = Medicine(medicine_name='Cachetestol', brand='Cachetestol', category='N/A',
+                       batch_number='CT-1', quantity=5, price_per_unit=2.0,
+                       manufacture_date=date(2025, 1, 1), expiry_date=date(2027, 1, 1))
+        db.session.add(med)
+        db.session.commit()
+        yield med
+        Medicine.query.filter_by(medicine_name='Cachetestol').delete()
+        db.session.commit()
+
+
+def test_orm_change_clears_stock_cache(medicine):
+    assert medicine_stock('cachetestol')[1] == 5
+    medicine.quantity = 6
+    db.session.commit()
+    assert medicine_stock('cachetestol')[1] == 6
+
+
+def test_bulk_update_clears_stock_cache(medicine):
+    assert medicine_stock('cachetestol')[1] == 5
+    db.session.execute(db.update(Medicine).where(Medicine.medicine_name == 'Cachetestol').values(quantity=7))
+    db.session.commit()
+    assert medicine_stock('cachetestol')[1] == 7
+
+
+def test_core_update_clears_stock_cache(medicine):
+    assert medicine_stock('cachetestol')[1] == 5
+    db.session.execute(Medicine.__table__.update().where(Medicine.medicine_name == 'Cachetestol').values(quantity=8))
+    db.session.commit()
+    assert medicine_stock('cachetestol')[1] == 8
+
+
+def listed_quantity(today):
+    medicines, _ = medicine_listing(today)
+    return next(med['quantity'] for med in medicines if med['medicine_name'] == 'Cachetestol')
+
+
+def test_commit_clears_listing_cache(medicine):
+    today = date(2026, 12, 1)
+    assert listed_quantity(today) == 5
+    assert medicine_listing(today) is medicine_listing(today)
+    medicine.quantity = 9
+    db.session.commit()
+    assert listed_quantity(today) == 9
+
+
+def test_listing_flags_expiring_rows(medicine):
+    medicines, expiring = medicine_listing(date(2026, 12, 1))
+    med = next(med for med in medicines if med['medicine_name'] == 'Cachetestol')
+    assert med['days_until_expiry'] == 31
+    assert med['is_expiring_soon'] is True
+    assert all(row['days_left'] <= 180 for row in expiring)
+
+
+def test_name_lookup_uses_composite_index():
+    with app.app_context():
+        plan = db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT * FROM medicine WHERE medicine_name = 'Dolo 650'")).all()
+        indexes = {row[0] for row in db.session.execute(db.text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'medicine'"))}
+    assert 'ix_med_name_exp' in ' '.join(row[-1] for row in plan)
+    assert 'ix_medicine_medicine_name' not in indexes
@@ -0,0 +1,27 @@
+import pytest
+
+from app import closest_known_medicine, extract_medicine_names_from_text
+
+
+@pytest.mark.parametrize('word', ['pain', 'plan', 'span', 'dolor'])
+def test_common_words_are_not_fuzzy_medicines(word):
+    assert closest_known_medicine(word) is None
+
+
+def test_prescription_prose_has_no_spurious_medicines():
+    text = 'Patient complains of back pain. Plan: rest\nC/o abdominal pain, dolor'
+    assert extract_medicine_names_from_text(text) == []
+
+
+@pytest.mark.parametrize('word, expected', [
+    ('paracetam0l', 'paracetamol'),
+    ('0ndem', 'ondem'),
+    ('amoxycilin', 'amoxicillin'),
+])
+def test_ocr_misreads_still_match(word, expected):
+    assert closest_known_medicine(word) == expected
+
+
+def test_known_names_with_dosage():
+    medicines = extract_medicine_names_from_text('Rx\n1. Pan 40\n2. Dolo 650\nTab. Ondem 4mg')
+    assert {'Pan', 'Dolo 650', 'Ondem'} <= set(medicines)